@@ -0,0 +1,194 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import glob
+import json
+import argparse
+import concurrent.futures
+import csdl_cache
+import csdl_creator
+
+# Description index or catalogue, schema cache, $ref resolver, type index and array folding options shared by every task of a worker process; set once by _init_worker
+_worker_csv = None
+_worker_catalogue = None
+_worker_cache = None
+_worker_resolver = None
+_worker_type_index = None
+_worker_fold = (None, None)
+
+
+def collect_inputs(patterns):
+    """Expands directories and glob patterns into a sorted list of JSON files
+
+    :param patterns: Directories, files or glob patterns (``**`` is supported).
+    :type patterns: list
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _dirs, files in os.walk(pattern):
+                found.update(os.path.join(root, f) for f in files if f.endswith('.json'))
+        else:
+            found.update(f for f in glob.glob(pattern, recursive=True) if os.path.isfile(f))
+    return sorted(found)
+
+
+def _init_worker(csv_dict, cache_dir=None, use_cache=False, schema_dir=None, csdl_dir=None, descriptions=None, sample=None, stable_after=None):
+    """Process pool initializer; indexes the description rows once and keeps them resident in the worker"""
+    global _worker_csv, _worker_catalogue, _worker_cache, _worker_resolver, _worker_type_index, _worker_fold
+    _worker_csv = csdl_creator.CsvIndex(csv_dict)
+    _worker_catalogue = None
+    if descriptions:
+        import csdl_descriptions
+        _worker_catalogue = csdl_descriptions.DescriptionCatalogue(descriptions)
+    _worker_cache = csdl_cache.CsdlCache(cache_dir) if use_cache else None
+    _worker_resolver = None
+    if schema_dir:
+        import csdl_refs
+        _worker_resolver = csdl_refs.SchemaResolver(schema_dir)
+    _worker_type_index = None
+    if csdl_dir:
+        import csdl_type_index
+        _worker_type_index = csdl_type_index.TypeIndex.load(csdl_dir, cache_dir)
+    _worker_fold = (sample, stable_after)
+
+
+def generate_file(file_name, output_dir):
+    """Generates the CSDL for a single mockup file
+
+    :returns: Tuple of the input file, the output file and an error message; either output or error is None.
+    """
+    try:
+        with open(file_name) as fle:
+            json_data = json.load(fle)
+        csv_index = _worker_csv
+        if _worker_catalogue is not None:
+            import csdl_descriptions
+            csv_index = csdl_descriptions.schema_descriptions(_worker_catalogue, json_data)
+        output_xml, _cached = csdl_cache.write_schema(json_data, csv_index, output_dir, _worker_cache, resolver=_worker_resolver,
+                                                     type_index=_worker_type_index, sample=_worker_fold[0], stable_after=_worker_fold[1])
+        return file_name, output_xml, None
+    except json.JSONDecodeError as err:
+        return file_name, None, "Unable to parse JSON file supplied: {}".format(err)
+    except Exception as err:
+        return file_name, None, "{}: {}".format(type(err).__name__, err)
+
+
+def _generate_task(task):
+    return generate_file(*task)
+
+
+def run_batch(inputs, output_dir, csv_dict=None, workers=None, cache_dir=None, use_cache=False, schema_dir=None, csdl_dir=None, descriptions=None,
+              sample=None, stable_after=None):
+    """Generates CSDL for many mockups on a process pool
+
+    :param inputs: JSON files to process.
+    :type inputs: list
+    :param output_dir: Directory receiving the generated files; created when missing.
+    :type output_dir: str
+    :param csv_dict: Description rows shared by every input.
+    :type csv_dict: dict
+    :param workers: Number of worker processes; defaults to the CPU count, 1 runs in this process.
+    :type workers: int
+    :param cache_dir: Directory of the schema cache, see csdl_cache.CsdlCache.
+    :type cache_dir: str
+    :param use_cache: Reuse cached schemas for unchanged inputs.
+    :type use_cache: bool
+    :param schema_dir: Directory of JSON schemas to resolve the $ref values of JSON schema inputs
+        against; every worker parses each referenced file once.
+    :type schema_dir: str
+    :param csdl_dir: Directory of published CSDL files to resolve Resource types and link targets
+        against; the bundle is scanned once and every worker loads the persisted index.
+    :type csdl_dir: str
+    :param descriptions: Description catalogue compiled with csdl_descriptions.py; each input is
+        described by the rows of its schema, looked up as needed, instead of by csv_dict.
+    :type descriptions: str
+    :param sample: Number of members of each array to fold into its item shape, see csdl_creator.fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see csdl_creator.fold_items.
+    :type stable_after: int
+    :returns: List of (input, output, error) tuples in input order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    csv_dict = csv_dict if csv_dict is not None else {}
+    workers = workers or os.cpu_count() or 1
+    tasks = [(file_name, output_dir) for file_name in inputs]
+
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(csv_dict, cache_dir, use_cache, schema_dir, csdl_dir, descriptions, sample, stable_after)
+        return [_generate_task(task) for task in tasks]
+
+    # Hand out tasks in chunks so per-task IPC stays small next to the generation itself
+    chunksize = max(1, len(tasks) // (workers * 4))
+    if csdl_dir:
+        import csdl_type_index
+        # Scan the bundle here so the workers only load the persisted index
+        csdl_type_index.TypeIndex.load(csdl_dir, cache_dir)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(csv_dict, cache_dir, use_cache, schema_dir, csdl_dir, descriptions, sample, stable_after)) as pool:
+        return list(pool.map(_generate_task, tasks, chunksize=chunksize))
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Builds CSDL files for every annotated JSON file found in the given directories or glob patterns.')
+
+    argget.add_argument('inputs', type=str, nargs='+', help='directories, files or glob patterns to process')
+    argget.add_argument('--output', type=str, default='.', help='directory to write the generated CSDL files to')
+    argget.add_argument('--csv', type=str, help='csv file of helpful definitions shared by all files')
+    argget.add_argument('--descriptions', type=str, metavar='CATALOGUE', help='description catalogue compiled with csdl_descriptions.py, used instead of --csv')
+    argget.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    argget.add_argument('--cache-dir', type=str, default=None, help='directory of the generated schema cache (default: ~/.cache/redfish-schema-creator)')
+    argget.add_argument('--no-cache', action='store_true', help='always build the schemas instead of reusing cached copies')
+    argget.add_argument('--schema-dir', type=str, help='directory of JSON schemas to resolve the $ref values of JSON schema inputs against')
+    argget.add_argument('--csdl-dir', type=str, help='directory of published CSDL files to resolve Resource types, link targets and included namespaces against')
+    argget.add_argument('--sample', type=int, default=None, help='fold at most about this many evenly spaced members of each array into its item type (default: all)')
+    argget.add_argument('--stable-after', type=int, default=None, help='stop reading an array once this many members in a row added nothing to its item type')
+    argget.add_argument('--watch', action='store_true', help='keep running and regenerate the schemas of changed files and descriptions')
+
+    args = argget.parse_args()
+
+    if args.watch:
+        import csdl_watch
+        if args.workers is not None:
+            argget.error("--workers is not supported with --watch, which regenerates in this process")
+        cache = None if args.no_cache else csdl_cache.CsdlCache(args.cache_dir)
+        resolver = None
+        if args.schema_dir:
+            import csdl_refs
+            resolver = csdl_refs.SchemaResolver(args.schema_dir)
+        type_index = None
+        if args.csdl_dir:
+            import csdl_type_index
+            type_index = csdl_type_index.TypeIndex.load(args.csdl_dir, args.cache_dir)
+        csdl_watch.Watcher(args.inputs, args.output, args.csv, cache, descriptions=args.descriptions, resolver=resolver, type_index=type_index,
+                           sample=args.sample, stable_after=args.stable_after).run()
+        return 0
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        sys.stderr.write("No JSON files found.\n")
+        return 1
+
+    csv_dict = csdl_creator.load_csv(args.csv) if args.csv else {}
+    results = run_batch(inputs, args.output, csv_dict, args.workers, args.cache_dir, not args.no_cache, args.schema_dir, args.csdl_dir, args.descriptions,
+                        args.sample, args.stable_after)
+
+    failures = 0
+    outputs = {}
+    for file_name, output_xml, error in results:
+        if error:
+            failures += 1
+            sys.stderr.write("{}: {}\n".format(file_name, error))
+            continue
+        if output_xml in outputs:
+            sys.stderr.write("{}: overwrote {} generated from {}\n".format(file_name, output_xml, outputs[output_xml]))
+        outputs[output_xml] = file_name
+
+    print("Generated {} of {} files into {}".format(len(results) - failures, len(results), args.output))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,401 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import tracemalloc
+import csdl_creator
+import csdl_serializer
+import xml.etree.ElementTree as etree
+
+
+class _MockupBuilder:
+    """Deterministic generator state for generate_mockup"""
+    def __init__(self, properties, depth, array_width, enum_cardinality, link_density, seed):
+        self.random = random.Random(seed)
+        self.remaining = properties
+        self.depth = depth
+        self.array_width = array_width
+        self.enum_cardinality = enum_cardinality
+        self.link_density = link_density
+        self.paths = []
+        self.counter = 0
+
+    def name(self, prefix):
+        self.counter += 1
+        return "{}{}".format(prefix, self.counter)
+
+    def primitive(self):
+        kind = self.random.randrange(4)
+        if kind == 0:
+            return "Text {}".format(self.random.randrange(1000))
+        if kind == 1:
+            return self.random.randrange(100000)
+        if kind == 2:
+            return self.random.random() * 100
+        return self.random.random() < 0.5
+
+    def enum(self):
+        return " | ".join("Member{}".format(index) for index in range(self.enum_cardinality))
+
+    def fill(self, target, level, path, count):
+        """Adds count properties (and their children, while the budget lasts) to target"""
+        for _index in range(count):
+            if self.remaining <= 0:
+                return
+            self.remaining -= 1
+            roll = self.random.random()
+            if roll < self.link_density:
+                name = self.name("Link")
+                target[name] = {"@odata.id": "/redfish/v1/Bench/{}".format(self.counter)}
+                target[name + "!link"] = "Target{}".format(self.counter % 20)
+            elif level < self.depth and roll < self.link_density + 0.2:
+                name = self.name("Object")
+                target[name] = self.object(level + 1, path + name + "/")
+            elif roll < self.link_density + 0.3:
+                name = self.name("Array")
+                if level < self.depth and self.random.random() < 0.5:
+                    target[name] = [self.object(level + 1, path + name + "/") for _item in range(self.array_width)]
+                else:
+                    target[name] = [self.primitive() for _item in range(self.array_width)]
+            elif roll < self.link_density + 0.45:
+                name = self.name("Enum")
+                target[name] = self.enum()
+            else:
+                name = self.name("Property")
+                target[name] = self.primitive()
+            if self.random.random() < 0.1:
+                target[name + "!description"] = "Description of {}.".format(name)
+            self.paths.append(path + name)
+
+    def object(self, level, path):
+        child = {}
+        self.fill(child, level, path, self.random.randint(2, 8))
+        return child
+
+
+def generate_mockup(properties=1000, depth=3, array_width=4, enum_cardinality=5, link_density=0.05, csv_rows=0, seed=0):
+    """Returns a deterministic synthetic annotated mockup and description rows for benchmarking
+
+    :param properties: Total number of properties across all nesting levels.
+    :param depth: Maximum object nesting depth.
+    :param array_width: Number of members in every array.
+    :param enum_cardinality: Number of members in every enum.
+    :param link_density: Fraction of properties that are ``!link`` navigation properties.
+    :param csv_rows: Number of description rows; rows beyond the generated paths are for unrelated properties.
+    :param seed: Random seed; equal parameters always produce equal output.
+    :returns: Tuple of the mockup and a dictionary of description rows keyed by property path.
+    """
+    builder = _MockupBuilder(properties, depth, array_width, enum_cardinality, link_density, seed)
+    mockup = {"@odata.id": "/redfish/v1/Bench/1", "@odata.type": "#Bench.v1_0_0.Bench"}
+    while builder.remaining > 0:
+        builder.fill(mockup, 0, "", builder.remaining)
+
+    csv_dict = {}
+    for index in range(csv_rows):
+        if index < len(builder.paths):
+            path = builder.paths[index]
+        else:
+            path = "Unrelated{}/Property{}".format(index % 97, index)
+        row = ["Description {}.".format(index), "Long description {}.".format(index)]
+        csv_dict[path] = row + ["Member description {}.".format(member) for member in range(enum_cardinality)]
+    return mockup, csv_dict
+
+
+def measure(function, setup=None, repeat=3):
+    """Times function and measures its peak traced memory
+
+    :param function: Callable taking the value returned by setup, or nothing without setup.
+    :param setup: Optional callable preparing fresh input for every run; not measured.
+    :param repeat: Number of timed runs; the fastest is reported.
+    :returns: Dictionary with the wall time in seconds and the peak allocation in bytes.
+    """
+    def run():
+        if setup is None:
+            start = time.perf_counter()
+            function()
+        else:
+            argument = setup()
+            start = time.perf_counter()
+            function(argument)
+        return time.perf_counter() - start
+
+    elapsed = min(run() for _run in range(repeat))
+
+    argument = setup() if setup is not None else None
+    tracemalloc.start()
+    if setup is None:
+        function()
+    else:
+        function(argument)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": elapsed, "peak_bytes": peak}
+
+
+def _new_csdl(mockup, csv_index):
+    def setup():
+        csdl = csdl_creator.CsdlFile(mockup, csdl_creator.RESOURCE_PROPERTIES, csv=csv_index)
+        csdl.init_csdl()
+        return csdl
+    return setup
+
+
+def bench_database_builder(mockup, csv_index):
+    return measure(lambda: csdl_creator.database_builder(mockup, csv_index))
+
+
+def bench_build_csdl(mockup, csv_index):
+    return measure(lambda csdl: csdl.build_csdl(), setup=_new_csdl(mockup, csv_index))
+
+
+def bench_element_factories(count=10000):
+    """Times count calls of each create_* factory"""
+    names = ["Property{}".format(index) for index in range(count)]
+    members = ["Member{}".format(index) for index in range(5)]
+    return {
+        "create_property": measure(lambda: [csdl_creator.create_property(name, "Edm.String", description="A description.") for name in names]),
+        "create_navigation": measure(lambda: [csdl_creator.create_navigation(name, schema_name="Target") for name in names]),
+        "create_complex_property": measure(lambda: [csdl_creator.create_complex_property(name) for name in names]),
+        "create_enum_property": measure(lambda: [csdl_creator.create_enum_property(name, members) for name in names]),
+    }
+
+
+def _fresh_create_property(property_name, property_type, description=None, longDescription=None):
+    """create_property as it was before the shared annotation prototypes, for comparison"""
+    added_property = etree.Element("Property", attrib={"Name": property_name, "Type": property_type, "Nullable": "false"})
+    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.Permissions", "EnumMember": "OData.Permission/Read"})
+    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.Description", "String": description or "TBD"})
+    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.LongDescription", "String": longDescription or "TBD"})
+    return added_property
+
+
+def bench_entity(count=50000):
+    """Per-property cost of filling one entity with count properties, fresh annotations versus shared prototypes"""
+    names = ["Property{}".format(index) for index in range(count)]
+
+    def build(factory):
+        def run():
+            entity = etree.Element("EntityType", {"Name": "Bench"})
+            for index, name in enumerate(names):
+                entity.append(factory(name, "Edm.String", description="Description." if index % 2 else None))
+            return entity
+        return run
+
+    results = {"properties": count, "fresh": measure(build(_fresh_create_property)), "prototypes": measure(build(csdl_creator.create_property))}
+    for key in ("fresh", "prototypes"):
+        results[key]["seconds_per_property"] = results[key]["seconds"] / count
+        results[key]["bytes_per_property"] = results[key]["peak_bytes"] / count
+    return results
+
+
+def bench_serialize(mockup, csv_index):
+    csdl = _new_csdl(mockup, csv_index)()
+    csdl.build_csdl()
+    return measure(lambda: csdl_serializer.write_csdl(csdl.main_csdl, csdl.name, io.StringIO()))
+
+
+def bench_serializer(properties=1000):
+    """Compares the single pass serializer against the legacy minidom pipeline on one schema"""
+    csdl = csdl_creator.build_csdl_file(generate_mockup(properties)[0])
+
+    def legacy():
+        csdl_serializer.CSDL_HEADER_TEMPLATE.format(csdl.name) + csdl_serializer.legacy_serialize(csdl.main_csdl)
+
+    def streaming():
+        csdl_serializer.write_csdl(csdl.main_csdl, csdl.name, io.StringIO())
+
+    return {"properties": properties, "legacy": measure(legacy, repeat=1), "streaming": measure(streaming, repeat=1)}
+
+
+def _post_all(address, bodies, concurrency):
+    """Posts every body to /generate from concurrency keep-alive clients; returns the elapsed seconds"""
+    import http.client
+    import threading
+
+    def client(share):
+        connection = http.client.HTTPConnection(*address)
+        for body in share:
+            connection.request('POST', '/generate', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError("Server answered {}".format(response.status))
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(bodies[index::concurrency],)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def bench_server(properties=200, requests=500, concurrency=8, workers=None):
+    """Sustained requests per second of a local generation server, for distinct and for repeated mockups"""
+    import threading
+    import csdl_server
+
+    distinct = []
+    for index in range(requests):
+        mockup = generate_mockup(properties, seed=index)[0]
+        distinct.append(json.dumps(mockup).encode())
+    repeated = [distinct[index % concurrency] for index in range(requests)]
+
+    server = csdl_server.GenerationServer(('127.0.0.1', 0), workers, cache_entries=requests)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        address = server.server_address[:2]
+        miss_seconds = _post_all(address, distinct, concurrency)
+        hit_seconds = _post_all(address, repeated, concurrency)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "properties": properties, "requests": requests, "concurrency": concurrency, "workers": server.workers,
+        "miss_requests_per_second": requests / miss_seconds,
+        "hit_requests_per_second": requests / hit_seconds,
+    }
+
+
+def bench_threads(properties=200, documents=200, threads=8):
+    """Documents per second of one SchemaGenerator called from a thread pool, against a single thread"""
+    import concurrent.futures
+    mockups = [generate_mockup(properties, seed=index, csv_rows=properties)[0] for index in range(documents)]
+    generator = csdl_creator.SchemaGenerator(generate_mockup(properties, seed=0, csv_rows=properties)[1])
+
+    start = time.perf_counter()
+    for mockup in mockups:
+        generator.generate(mockup)
+    serial_seconds = time.perf_counter() - start
+
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(generator.generate, mockups))
+        pool_seconds = time.perf_counter() - start
+    return {
+        "properties": properties, "documents": documents, "threads": threads,
+        "serial_documents_per_second": documents / serial_seconds,
+        "pool_documents_per_second": documents / pool_seconds,
+    }
+
+
+def import_time(module='csdl_creator', repeat=3):
+    """Measures the import of module in a fresh interpreter with ``-X importtime``
+
+    Bytecode is compiled into a temporary pycache on a first run, so the measured runs see the
+    warm bytecode an installed tool would.
+
+    :returns: Dictionary with the best cumulative import time of module in microseconds and the
+        names of every module imported with it.
+    """
+    import os
+    import tempfile
+    environment = dict(os.environ)
+    environment.pop('PYTHONDONTWRITEBYTECODE', None)
+    with tempfile.TemporaryDirectory() as pycache:
+        command = [sys.executable, '-X', 'importtime', '-X', 'pycache_prefix=' + pycache, '-c', 'import ' + module]
+        best = None
+        for _run in range(repeat + 1):
+            stderr = subprocess.run(command, capture_output=True, text=True, check=True, env=environment).stderr
+            imported = {}
+            for line in stderr.splitlines():
+                if line.startswith('import time:') and '|' in line:
+                    _self, cumulative, name = line[len('import time:'):].split('|')
+                    if cumulative.strip().isdigit():
+                        imported[name.strip()] = int(cumulative)
+            if _run and (best is None or imported.get(module, 0) < best[0]):
+                best = (imported.get(module, 0), sorted(imported))
+    return {"module": module, "microseconds": best[0], "modules": best[1]}
+
+
+def git_revision():
+    """Returns the current commit of the working tree, None outside of a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(properties=10000, depth=3, array_width=4, enum_cardinality=5, link_density=0.05, csv_rows=10000, seed=0):
+    """Runs every pipeline stage on one synthetic mockup and returns the results"""
+    parameters = {"properties": properties, "depth": depth, "array_width": array_width, "enum_cardinality": enum_cardinality,
+                  "link_density": link_density, "csv_rows": csv_rows, "seed": seed}
+    mockup, csv_dict = generate_mockup(**parameters)
+    csv_index = csdl_creator.CsvIndex(csv_dict)
+    return {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "parameters": parameters,
+        "stages": {
+            "database_builder": bench_database_builder(mockup, csv_index),
+            "build_csdl": bench_build_csdl(mockup, csv_index),
+            "serialize": bench_serialize(mockup, csv_index),
+        },
+        "factories": bench_element_factories(properties),
+    }
+
+
+def compare(results, baseline):
+    """Returns the time and peak memory ratios (current / baseline) of every stage"""
+    ratios = {}
+    for group in ("stages", "factories"):
+        for stage, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(stage)
+            if previous:
+                ratios[stage] = {key: current[key] / previous[key] if previous[key] else None for key in ("seconds", "peak_bytes")}
+    return ratios
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Benchmarks the CSDL generation pipeline on a synthetic mockup and prints the results as JSON.')
+
+    argget.add_argument('--properties', type=int, default=10000, help='total number of properties in the synthetic mockup')
+    argget.add_argument('--depth', type=int, default=3, help='maximum nesting depth of objects')
+    argget.add_argument('--array-width', type=int, default=4, help='number of members in every array')
+    argget.add_argument('--enum-cardinality', type=int, default=5, help='number of members in every enum')
+    argget.add_argument('--link-density', type=float, default=0.05, help='fraction of properties that are links')
+    argget.add_argument('--csv-rows', type=int, default=10000, help='number of description rows')
+    argget.add_argument('--seed', type=int, default=0, help='random seed of the synthetic mockup')
+    argget.add_argument('--serializer', action='store_true', help='also compare the single pass serializer with the legacy minidom pipeline')
+    argget.add_argument('--entity', action='store_true', help='also compare shared annotation prototypes with fresh annotations on a 50k property entity')
+    argget.add_argument('--imports', action='store_true', help='also measure the import time of the library in a fresh interpreter')
+    argget.add_argument('--server', action='store_true', help='also measure the requests per second of a local generation server')
+    argget.add_argument('--threads', type=int, default=0, help='also measure the documents per second of a SchemaGenerator shared by this many threads')
+    argget.add_argument('--output', type=str, help='file to write the results to')
+    argget.add_argument('--compare', type=str, help='results file of an earlier run to compare against')
+
+    args = argget.parse_args()
+
+    results = run_suite(args.properties, args.depth, args.array_width, args.enum_cardinality, args.link_density, args.csv_rows, args.seed)
+    if args.serializer:
+        results["serializer"] = bench_serializer(args.properties)
+    if args.entity:
+        results["entity"] = bench_entity()
+    if args.imports:
+        results["imports"] = import_time()
+    if args.server:
+        results["server"] = bench_server()
+    if args.threads:
+        results["threads"] = bench_threads(threads=args.threads)
+    if args.compare:
+        with open(args.compare) as baseline:
+            results["comparison"] = compare(results, json.load(baseline))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4)
+    print(json.dumps(results, indent=4))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import json
+import shutil
+import hashlib
+import csdl_report
+import csdl_refs
+import csdl_type_index
+import csdl_creator
+import csdl_serializer
+import xml_convenience
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'redfish-schema-creator')
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Eviction trims the cache to this fraction of its budget so it does not run on every store
+EVICTION_LOW_WATER = 0.9
+
+_generator_version = None
+
+
+def generator_version():
+    """Returns a digest of the generator sources; any code change invalidates every cache entry"""
+    global _generator_version
+    if _generator_version is None:
+        digest = hashlib.sha256()
+        for module in (csdl_creator, csdl_serializer, csdl_refs, csdl_type_index, xml_convenience):
+            with open(module.__file__, 'rb') as source:
+                digest.update(source.read())
+        _generator_version = digest.hexdigest()
+    return _generator_version
+
+
+def used_csv_rows(annotated_json, csv_index, path='', sample=None, stable_after=None):
+    """Returns the (path, row) pairs database_builder consults for annotated_json, in visiting order"""
+    rows = []
+    if "$schema" in annotated_json:
+        return rows
+    stack = [(iter(annotated_json.items()), csv_index, path)]
+    while stack:
+        items, csv_index, path = stack[-1]
+        for key, value in items:
+            prop, _sep, annotation = key.partition('!')
+            if '@' in key or not prop:
+                continue
+            node = csv_index.child(prop)
+            if node.row is not None:
+                rows.append((path + prop, node.row))
+            if annotation:
+                continue
+            if isinstance(value, list):
+                members = csdl_creator.fold_items(value, sample, stable_after)
+                value = members[0] if members else None
+            if isinstance(value, dict) and node.children:
+                stack.append((iter(value.items()), node, path + prop + '/'))
+                break
+        else:
+            stack.pop()
+    return rows
+
+
+def cache_key(json_data, csv_index=None, dedupe=False, resolver=None, type_index=None, sample=None, stable_after=None):
+    """Returns the content hash identifying the CSDL generated for json_data
+
+    The key covers the annotated JSON in its original key order (which decides the property
+    order of the output), the description rows actually used, the resource configuration, the
+    output and array folding options, the generator version and, for a JSON schema input, the files of the schema
+    bundle its references are resolved against and the CSDL bundle types are resolved against.
+    """
+    if not isinstance(csv_index, csdl_creator.CsvIndex):
+        csv_index = csdl_creator.CsvIndex(csv_index)
+    digest = hashlib.sha256(generator_version().encode())
+    digest.update(json.dumps([csdl_creator.RESOURCE_TYPES, csdl_creator.RESOURCE_PROPERTIES]).encode())
+    digest.update(json.dumps(json_data, separators=(',', ':')).encode())
+    digest.update(json.dumps(used_csv_rows(json_data, csv_index, sample=sample, stable_after=stable_after)).encode())
+    if dedupe:
+        digest.update(b'dedupe')
+    if sample or stable_after:
+        digest.update(json.dumps(['fold', sample, stable_after]).encode())
+    if resolver is not None and "$schema" in json_data:
+        digest.update(resolver.fingerprint().encode())
+    if type_index is not None:
+        digest.update(type_index.fingerprint.encode())
+    return digest.hexdigest()
+
+
+class CsdlCache:
+    """Content addressed on-disk store of generated CSDL files with size bounded LRU eviction
+
+    Entries are plain files named by their cache key; the modification time of an entry is its
+    last use, so several processes can share one cache directory.
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self._size = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key + '.xml')
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.xml'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def copy_to(self, key, output_file):
+        """Copies the entry for key to output_file; returns False on a miss"""
+        entry = self._entry(key)
+        tmp_file = '{}.{}.tmp'.format(output_file, os.getpid())
+        try:
+            shutil.copyfile(entry, tmp_file)
+            os.utime(entry)
+        except FileNotFoundError:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return False
+        os.replace(tmp_file, output_file)
+        return True
+
+    def get(self, key):
+        """Returns the cached CSDL text for key, None on a miss"""
+        entry = self._entry(key)
+        try:
+            with open(entry) as cached:
+                text = cached.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return text
+
+    def put(self, key, text):
+        """Stores CSDL text under key"""
+        tmp_file = '{}.{}.tmp'.format(self._entry(key), os.getpid())
+        with open(tmp_file, 'w') as cached:
+            cached.write(text)
+        self._commit(key, tmp_file)
+
+    def store(self, key, output_file):
+        """Stores a copy of an already written CSDL file under key"""
+        tmp_file = '{}.{}.tmp'.format(self._entry(key), os.getpid())
+        shutil.copyfile(output_file, tmp_file)
+        self._commit(key, tmp_file)
+
+    def _commit(self, key, tmp_file):
+        size = os.path.getsize(tmp_file)
+        os.replace(tmp_file, self._entry(key))
+        if self._size is None:
+            self._size = sum(size for _mtime, size, _path in self._entries())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is below its low water mark"""
+        entries = sorted(self._entries())
+        total = sum(size for _mtime, size, _path in entries)
+        target = self.max_bytes * EVICTION_LOW_WATER
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+
+def write_schema(json_data, csv_index, output_dir='.', cache=None, report=None, json_schema=False, dedupe=False, resolver=None, type_index=None,
+                 sample=None, stable_after=None):
+    """Writes the CSDL for json_data into output_dir, reusing a cached copy when one exists
+
+    :param json_data: Annotated JSON mockup or JSON schema.
+    :type json_data: dict
+    :param csv_index: Description rows for the document.
+    :type csv_index: dict or CsvIndex
+    :param cache: Optional cache; None always builds the schema.
+    :type cache: CsdlCache
+    :param report: Optional report receiving the stage timings and element counts.
+    :type report: csdl_report.StageReport
+    :param json_schema: Also write the JSON Schema next to the CSDL file; the schema is then always
+        built, since the JSON Schema comes from the same pass, and the cache only receives the CSDL.
+    :type json_schema: bool
+    :param dedupe: Emit structurally identical types once, see CsdlFile.build_csdl.
+    :type dedupe: bool
+    :param resolver: Resolver for the $ref values of a JSON schema input.
+    :type resolver: csdl_refs.SchemaResolver
+    :param type_index: Index of a published CSDL bundle, see CsdlFile.
+    :type type_index: csdl_type_index.TypeIndex
+    :param sample: Number of members of each array to fold into its item shape, see csdl_creator.fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see csdl_creator.fold_items.
+    :type stable_after: int
+    :returns: Tuple of the written CSDL file and whether it came from the cache.
+    """
+    if not isinstance(csv_index, csdl_creator.CsvIndex):
+        csv_index = csdl_creator.CsvIndex(csv_index)
+    output_xml = os.path.join(output_dir, csdl_creator.get_schema_name(json_data) + '.xml')
+    key = None
+    if cache is not None:
+        with (report or csdl_report.NULL_REPORT).stage('cache'):
+            key = cache_key(json_data, csv_index, dedupe, resolver, type_index, sample, stable_after)
+            if not json_schema and cache.copy_to(key, output_xml):
+                return output_xml, True
+
+    # The database is released once the schema is built, and the built tree once it is written
+    if report is None:
+        csdl = csdl_creator.build_csdl_file(json_data, csv_index, json_schema, dedupe, resolver, type_index, sample, stable_after)
+        csdl.release()
+        _write_atomic(output_xml, lambda output_file: csdl_serializer.write_csdl(csdl.main_csdl, csdl.name, output_file))
+    else:
+        with report.stage('database_builder'):
+            csdl = csdl_creator.CsdlFile(json_data, csdl_creator.RESOURCE_PROPERTIES, csv=csv_index, resolver=resolver, type_index=type_index,
+                                         sample=sample, stable_after=stable_after)
+        with report.stage('build_csdl'):
+            csdl.init_csdl()
+            csdl.build_csdl(json_schema, dedupe)
+            csdl.release()
+        report.count_elements(csdl.main_csdl)
+        if dedupe:
+            report.collapsed = list(csdl.collapsed)
+            report.counts['CollapsedTypes'] = len(csdl.collapsed)
+        with report.stage('serialize'):
+            text = csdl_serializer.csdl_to_string(csdl.main_csdl, csdl.name)
+        with report.stage('write'):
+            _write_atomic(output_xml, lambda output_file: output_file.write(text))
+            text = None
+    schema_definition = csdl.json_schema
+    csdl = None
+
+    if json_schema:
+        with (report or csdl_report.NULL_REPORT).stage('json_schema'):
+            _write_atomic(os.path.splitext(output_xml)[0] + '.json', lambda output_file: json.dump(schema_definition, output_file, indent=4, sort_keys=True))
+
+    if cache is not None:
+        cache.store(key, output_xml)
+    return output_xml, False
+
+
+def _write_atomic(output_xml, write):
+    """Calls write with a temporary file that replaces output_xml once complete"""
+    tmp_file = '{}.{}.tmp'.format(output_xml, os.getpid())
+    try:
+        with open(tmp_file, 'w') as output_file:
+            write(output_file)
+        os.replace(tmp_file, output_xml)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -0,0 +1,252 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+import csdl_batch
+import csdl_creator
+import csdl_serializer
+
+# String properties with two to this many distinct values become enums
+DEFAULT_ENUM_THRESHOLD = 8
+
+# ...provided every distinct value was seen at least this many times on average
+ENUM_MIN_SUPPORT = 2
+
+# Description index of a worker process; set once by _init_worker
+_worker_csv = None
+
+JSON_TYPE_NAMES = {str: "string", bool: "boolean", int: "integer", float: "number", dict: "object", list: "array", type(None): "null"}
+
+
+class PropertySummary:
+    """What a corpus has shown about one property, merged across instances
+
+    :ivar instances: Number of parent objects the property appeared in.
+    :ivar types: JSON type names seen, in first-seen order.
+    :ivar is_array: True if the property was an array in any instance.
+    :ivar item_types: JSON type names seen for array members.
+    :ivar values: Distinct string values in first-seen order, None once there are more than the enum threshold.
+    :ivar observations: Number of string values seen.
+    :ivar enum: Members of explicit ``A | B`` enums in annotated instances.
+    :ivar objects: Number of instances in which the property was an object.
+    :ivar children: Summaries of the object members, None if the property was never an object.
+    :ivar template: PropertyNode of the first instance, source of descriptions, links and annotations.
+    """
+    __slots__ = ('instances', 'types', 'is_array', 'item_types', 'values', 'observations', 'enum', 'objects', 'children', 'template')
+
+    def __init__(self, node, enum_threshold):
+        self.instances = 1
+        self.is_array = node.is_array
+        self.item_types = dict.fromkeys(JSON_TYPE_NAMES.get(t, "string") for t in node.item_types or ())
+        self.enum = dict.fromkeys(node.enum) if node.enum is not None else None
+        self.values = {}
+        self.observations = 0
+        if node.children is not None:
+            self.types = {"object": None}
+            self.objects = 1
+            self.children = summarize(node.children, enum_threshold)
+        else:
+            self.types = {JSON_TYPE_NAMES.get(type(node.value), "string"): None} if node.enum is None else {"string": None}
+            self.objects = 0
+            self.children = None
+            if isinstance(node.value, str):
+                self.values[node.value] = None
+                self.observations = 1
+        self.template = node
+        if node.children is not None:
+            # The template only supplies annotations; the children live in the summary
+            self.template = _without_children(node)
+
+    def merge(self, other, enum_threshold):
+        """Folds the summary of another instance (or group of instances) into this one"""
+        self.instances += other.instances
+        self.types.update(other.types)
+        self.is_array = self.is_array or other.is_array
+        self.item_types.update(other.item_types)
+        if other.enum is not None:
+            self.enum = dict(self.enum or {})
+            self.enum.update(other.enum)
+        self.observations += other.observations
+        if self.values is not None:
+            if other.values is None:
+                self.values = None
+            else:
+                self.values.update(other.values)
+                if len(self.values) > enum_threshold:
+                    self.values = None
+        self.objects += other.objects
+        if other.children is not None:
+            if self.children is None:
+                self.children = other.children
+            else:
+                merge_summaries(self.children, other.children, enum_threshold)
+
+
+def _without_children(node):
+    copy = csdl_creator.PropertyNode(node.name)
+    for slot in csdl_creator.PropertyNode.__slots__:
+        setattr(copy, slot, getattr(node, slot))
+    copy.children = None
+    return copy
+
+
+def summarize(database, enum_threshold=DEFAULT_ENUM_THRESHOLD):
+    """Turns the database of one instance into property summaries"""
+    return {name: PropertySummary(node, enum_threshold) for name, node in database.items()}
+
+
+def merge_summaries(into, other, enum_threshold=DEFAULT_ENUM_THRESHOLD):
+    """Merges the property summaries of other into into; new properties keep their first-seen order"""
+    for name, summary in other.items():
+        if name in into:
+            into[name].merge(summary, enum_threshold)
+        else:
+            into[name] = summary
+    return into
+
+
+def _widen(types):
+    """Returns the narrowest JSON type covering every type seen"""
+    types = [t for t in types if t != "null"]
+    if not types:
+        return None
+    if len(types) == 1:
+        return types[0]
+    if set(types) <= {"integer", "number"}:
+        return "number"
+    return "string"
+
+
+def to_database(summaries, parent_instances, enum_threshold=DEFAULT_ENUM_THRESHOLD):
+    """Turns merged property summaries back into a database of PropertyNodes
+
+    :param summaries: Merged summaries of the members of one object.
+    :param parent_instances: Number of instances of that object; members present in all of them are required.
+    """
+    database = {}
+    for name, summary in summaries.items():
+        node = _without_children(summary.template)
+        node.required = summary.instances >= parent_instances
+        node.is_array = summary.is_array
+        node.json_type = None
+        node.value = None
+        node.enum = None
+        if summary.is_array:
+            node.item_types = [_widen(summary.item_types)]
+        if summary.children is not None:
+            node.children = to_database(summary.children, summary.objects, enum_threshold)
+        elif summary.enum is not None:
+            node.enum = list(summary.enum)
+        elif summary.values is not None and len(summary.values) > 1 and _widen(summary.types) == "string" and\
+                summary.observations >= ENUM_MIN_SUPPORT * len(summary.values):
+            node.enum = list(summary.values)
+        elif not node.is_array:
+            node.json_type = _widen(summary.types)
+        node.finish()
+        database[name] = node
+    return database
+
+
+def _init_worker(csv_dict):
+    """Process pool initializer; indexes the description rows once per worker"""
+    global _worker_csv
+    _worker_csv = csdl_creator.CsvIndex(csv_dict)
+
+
+def _summarize_file(task):
+    """Map step: reads one payload and returns its @odata.type, property summaries and error"""
+    file_name, enum_threshold = task
+    try:
+        with open(file_name) as fle:
+            payload = json.load(fle)
+        odata_type = payload.get('@odata.type') if isinstance(payload, dict) else None
+        if not odata_type:
+            return file_name, None, None, "No @odata.type"
+        return file_name, odata_type, summarize(csdl_creator.database_builder(payload, _worker_csv), enum_threshold), None
+    except Exception as err:
+        return file_name, None, None, "{}: {}".format(type(err).__name__, err)
+
+
+def infer_corpus(inputs, csv_dict=None, workers=None, enum_threshold=DEFAULT_ENUM_THRESHOLD):
+    """Infers one database per @odata.type from a corpus of payloads
+
+    Payloads are summarized on a process pool and the summaries are reduced in input order, so
+    the result does not depend on scheduling.
+
+    :param inputs: JSON files of the corpus.
+    :type inputs: list
+    :param csv_dict: Description rows applied to every payload.
+    :type csv_dict: dict
+    :param workers: Number of worker processes; defaults to the CPU count, 1 runs in this process.
+    :type workers: int
+    :param enum_threshold: Maximum number of distinct values of a string property inferred as an enum.
+    :type enum_threshold: int
+    :returns: Tuple of a dictionary of @odata.type to database and a list of (file, error) pairs.
+    """
+    csv_dict = csv_dict if csv_dict is not None else {}
+    workers = workers or os.cpu_count() or 1
+    tasks = [(file_name, enum_threshold) for file_name in inputs]
+
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(csv_dict)
+        results = map(_summarize_file, tasks)
+        return _reduce(results, enum_threshold)
+
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(csv_dict,)) as pool:
+        return _reduce(pool.map(_summarize_file, tasks, chunksize=chunksize), enum_threshold)
+
+
+def _reduce(results, enum_threshold):
+    merged = {}
+    errors = []
+    for file_name, odata_type, summaries, error in results:
+        if error:
+            errors.append((file_name, error))
+            continue
+        count, children = merged.get(odata_type, (0, {}))
+        merged[odata_type] = (count + 1, merge_summaries(children, summaries, enum_threshold))
+    databases = {odata_type: to_database(children, count, enum_threshold) for odata_type, (count, children) in merged.items()}
+    return databases, errors
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Infers one CSDL file per @odata.type from a corpus of captured Redfish payloads.')
+
+    argget.add_argument('inputs', type=str, nargs='+', help='directories, files or glob patterns of the corpus')
+    argget.add_argument('--output', type=str, default='.', help='directory to write the generated CSDL files to')
+    argget.add_argument('--csv', type=str, help='csv file of helpful definitions shared by all types')
+    argget.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    argget.add_argument('--enum-threshold', type=int, default=DEFAULT_ENUM_THRESHOLD, help='maximum number of distinct string values inferred as an enum')
+
+    args = argget.parse_args()
+
+    inputs = csdl_batch.collect_inputs(args.inputs)
+    if not inputs:
+        sys.stderr.write("No JSON files found.\n")
+        return 1
+
+    csv_dict = csdl_creator.load_csv(args.csv) if args.csv else {}
+    databases, errors = infer_corpus(inputs, csv_dict, args.workers, args.enum_threshold)
+    for file_name, error in errors:
+        sys.stderr.write("{}: {}\n".format(file_name, error))
+
+    os.makedirs(args.output, exist_ok=True)
+    for odata_type, database in databases.items():
+        csdl = csdl_creator.CsdlFile.from_database(odata_type, database, csdl_creator.RESOURCE_PROPERTIES)
+        csdl.init_csdl()
+        csdl.build_csdl()
+        with open(os.path.join(args.output, csdl.name + '.xml'), 'w') as output:
+            csdl_serializer.write_csdl(csdl.main_csdl, csdl.name, output)
+
+    print("Inferred {} schemas from {} files into {}".format(len(databases), len(inputs) - len(errors), args.output))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
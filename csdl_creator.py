@@ -4,15 +4,13 @@
 
 import re
 import sys
-import csv
-import json
-import argparse
+import itertools
 import xml_convenience
-import xml.dom.minidom
+import csdl_serializer
 import xml.etree.ElementTree as etree
 # from xml.etree.ElementTree import Element, SubElement, Comment, tostring
 
-REGEX_TYPE = "#([a-zA-z]*.v\\d_\\d_\\d)"
+REGEX_TYPE = "#([a-zA-Z]*.v\\d+_\\d+_\\d+)"
 
 RESOURCE_TYPES = ['Id', 'Description', 'Name', 'UUID', 'Links', 'Oem', 'OemObject', 'ItemOrCollection', 'Item', 'ReferenceableMember', 'Resource', 'ResourceCollection', 'Status', 'State', 'Health', 'ResetType', 'Identifier', 'Location', 'IndicatorLED', 'PowerState']
 
@@ -20,74 +18,398 @@ RESOURCE_PROPERTIES = ['Description', 'Name', 'Id']
 
 RESOURCE_COLLECTION_PROPERTIES = ['Description', 'Name', 'Oem']
 
-CSDL_HEADER_TEMPLATE = """<!---->
-<!--################################################################################       -->
-<!--# Redfish Schema:  {}                                          -->
-<!--#                                                                                      -->
-<!--# For a detailed change log, see the README file contained in the DSP8010 bundle,      -->
-<!--# available at http://www.dmtf.org/standards/redfish                                   -->
-<!--# Copyright 2020 DMTF.                                                                 -->
-<!--# For the full DMTF copyright policy, see http://www.dmtf.org/about/policies/copyright -->
-<!--################################################################################       -->
-<!---->
-"""
-
-def database_builder(annotated_json, csv={}):
-    """Transforms annotated json into a dictionary database
-    
-    :param annotated_json: Annotated json to turn into a dictionary.
-    :type annotated_json: dict
-    :param data_base: The dictionary containing the final database. Pass this as an empty dict.
-    :type data_base: dict
+CSDL_HEADER_TEMPLATE = csdl_serializer.CSDL_HEADER_TEMPLATE
+
+
+def _debug(message, *args):
+    """Logs a debug message without importing logging into library users that never configured it"""
+    logging = sys.modules.get('logging')
+    if logging is not None:
+        logging.getLogger(__name__).debug(message, *args)
+
+
+class CsvIndex:
+    """Path segment index over the description rows of a CSV file
+
+    Each node holds the row for its path and one child per next path segment, so
+    database_builder descends the index in step with the JSON and every lookup is an
+    exact match costing O(depth).
     """
-    data_base = {}
-    for key, value in annotated_json.items():
-        # Use ! to delineate Schema Annotation
-        if '!' in key:
-            prop, annotation = tuple(key.split('!', 1))
+    __slots__ = ('row', 'children')
+
+    def __init__(self, csv_dict=None):
+        self.row = None
+        self.children = {}
+        for path, row in (csv_dict or {}).items():
+            self.insert(path, row)
+
+    def insert(self, path, row):
+        """Adds the row for a ``object/property`` style path"""
+        node = self
+        for segment in path.split('/'):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = CsvIndex()
+            node = child
+        node.row = row
+
+    def child(self, segment):
+        """Returns the index below segment, an empty index if there are no rows for it"""
+        return self.children.get(segment, _EMPTY_CSV_INDEX)
+
+
+_EMPTY_CSV_INDEX = CsvIndex()
+
+
+KIND_PRIMITIVE = 'primitive'
+KIND_ENUM = 'enum'
+KIND_OBJECT = 'object'
+KIND_LINK = 'link'
+KIND_TYPEREF = 'typeref'
+
+# Annotations stored in typed PropertyNode fields; any other annotation goes to PropertyNode.annotations
+NODE_ANNOTATIONS = {
+    'description': 'description',
+    'longDescription': 'long_description',
+    'link': 'link',
+    'enumDescriptions': 'enum_descriptions',
+    'enumLongDescriptions': 'enum_long_descriptions',
+}
+
+
+class PropertyNode:
+    """One property of the annotation database
+
+    :ivar name: Interned property name.
+    :ivar kind: KIND_PRIMITIVE, KIND_ENUM, KIND_OBJECT, KIND_LINK (an object annotated with ``!link``) or
+        KIND_TYPEREF (an object of a type defined elsewhere in the schema).
+    :ivar json_type: JSON schema type name ("string", "integer", ...), "array", or None for mockups.
+    :ivar value: Sample value from the mockup; for arrays the first member.
+    :ivar is_array: True if the property is a collection.
+    :ivar item_types: Member types of a collection, in first-seen order.
+    :ivar enum: Enum member names, None unless kind is KIND_ENUM.
+    :ivar children: Ordered dictionary of child PropertyNodes, None unless the property is an object.
+    :ivar annotations: Annotations without a typed field, None if there are none.
+    :ivar type_name: Name of the type a KIND_TYPEREF node refers to.
+    """
+    __slots__ = ('name', 'kind', 'json_type', 'value', 'is_array', 'item_types', 'enum', 'enum_descriptions', 'enum_long_descriptions',
+                 'description', 'long_description', 'required', 'read_write', 'link', 'children', 'annotations', 'type_name')
+
+    def __init__(self, name):
+        self.name = sys.intern(name)
+        self.kind = KIND_PRIMITIVE
+        self.json_type = None
+        self.value = None
+        self.is_array = False
+        self.item_types = None
+        self.enum = None
+        self.enum_descriptions = None
+        self.enum_long_descriptions = None
+        self.description = None
+        self.long_description = None
+        self.required = False
+        self.read_write = False
+        self.link = None
+        self.children = None
+        self.annotations = None
+        self.type_name = None
+
+    def __repr__(self):
+        return '<PropertyNode {} ({})>'.format(self.name, self.kind)
+
+    def set_annotation(self, annotation, value):
+        """Applies a ``property!annotation`` value from an annotated mockup"""
+        if annotation in NODE_ANNOTATIONS:
+            setattr(self, NODE_ANNOTATIONS[annotation], value)
+        elif annotation == 'readonly':
+            # Any readonly annotation marks the property R/W, see the README
+            self.read_write = True
+        elif annotation == 'required':
+            self.required = True
+        elif annotation == 'type':
+            self.json_type = value
+            self.is_array = value == 'array'
         else:
-            prop, annotation = key, None
-        # Skip all @ items
-        if '@' in key or prop in ['', None]:
+            if self.annotations is None:
+                self.annotations = {}
+            self.annotations[sys.intern(annotation)] = value
+
+    def finish(self):
+        """Sets the kind once the value and all annotations are known"""
+        if self.type_name is not None:
+            self.kind = KIND_TYPEREF
+        elif self.children is not None:
+            self.kind = KIND_LINK if self.link is not None else KIND_OBJECT
+        elif self.enum is not None:
+            self.kind = KIND_ENUM
+        else:
+            self.kind = KIND_PRIMITIVE
+
+
+def _fold(container, key, value, owned):
+    """Folds value into the shape at container[key], both dicts or both lists; returns True if the shape grew
+
+    A dict gains the members it lacks; a member that is None takes the first value that is not. A
+    list holds one representative per member type in first-seen order, with the members of each
+    type folded into it. Shapes still shared with the input are copied before they change, and
+    nested shapes are folded from an explicit stack.
+
+    :param owned: Set of the ids of the shapes already copied.
+    """
+    changed = False
+    stack = [(container, key, value)]
+    while stack:
+        container, key, value = stack.pop()
+        current = container[key]
+        if type(current) is dict:
+            if id(current) not in owned:
+                current = container[key] = dict(current)
+                owned.add(id(current))
+            for name, member in value.items():
+                existing = current.get(name)
+                if name not in current or (existing is None and member is not None):
+                    current[name] = member
+                    changed = True
+                elif type(existing) is type(member) and type(member) in (dict, list):
+                    stack.append((current, name, member))
             continue
-        data_base[prop] = {} if prop not in data_base else data_base[prop]
-        if annotation is None:
-            if isinstance(value, list):
-                data_base[prop]["items"] = {
-                    "type": list(set([type(x) for x in value]))
-                }
-                data_base[prop]["type"] = "array"
-                value = value[0]
-            if isinstance(value, dict):
-                sub_csv = {k.split('/', 1)[1]: s for k, s in csv.items() if prop in k and '/' in k}
-                data_base[prop]["properties"] = database_builder(value, sub_csv)
-            elif isinstance(value, str) and '|' in value:
-                #For enum values
-                value = [val.strip() for val in value.split('|') if val]
-                data_base[prop]["enum"] = value
-            data_base[prop]["value"] = value
+        members = value
+        if id(current) not in owned:
+            members = itertools.chain(current, value)
+            current = container[key] = []
+            owned.add(id(current))
+        for member in members:
+            for index, item in enumerate(current):
+                if type(item) is type(member):
+                    break
+            else:
+                current.append(member)
+                changed = True
+                continue
+            if type(member) in (dict, list):
+                stack.append((current, index, member))
+    return changed
+
+
+def fold_items(values, sample=None, stable_after=None):
+    """Reduces the members of an array to one representative per member type, in first-seen order
+
+    The members are folded in a single pass: a representative object holds every property seen in
+    any member, merged the same way at every level, so its size depends on the shape of the
+    members and not on their number.
+
+    :param values: Members of the array.
+    :type values: list
+    :param sample: Fold at most about this many members, evenly spaced; None folds every member.
+    :type sample: int
+    :param stable_after: Stop once this many members in a row added nothing to the shape; None reads on.
+    :type stable_after: int
+    """
+    holder = [[]]
+    owned = {id(holder[0])}
+    step = max(1, len(values) // sample) if sample else 1
+    unchanged = 0
+    for value in itertools.islice(values, 0, None, step):
+        if _fold(holder, 0, (value,), owned):
+            unchanged = 0
+        else:
+            unchanged += 1
+            if stable_after and unchanged >= stable_after:
+                break
+    return holder[0]
+
+
+def database_builder(annotated_json, csv=None, sample=None, stable_after=None):
+    """Transforms annotated json into a database of PropertyNodes
+
+    Nested objects are visited with an explicit stack rather than recursion, so the nesting depth
+    of a mockup is not limited by the interpreter's recursion limit.
+    
+    :param annotated_json: Annotated json to turn into a database.
+    :type annotated_json: dict
+    :param csv: Description rows, either a dictionary keyed by property path or a CsvIndex.
+    :type csv: dict or CsvIndex
+    :param sample: Number of members of each array to fold into its item shape, see fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see fold_items.
+    :type stable_after: int
+    :returns: Ordered dictionary of property name to PropertyNode.
+    """
+    if not isinstance(csv, CsvIndex):
+        csv = CsvIndex(csv)
+    root = {}
+    # One frame per open object: the iterator over its members, its CSV index and its database
+    stack = [(iter(annotated_json.items()), csv, root)]
+    while stack:
+        items, csv, data_base = stack[-1]
+        for key, value in items:
+            # Use ! to delineate Schema Annotation
+            if '!' in key:
+                prop, annotation = tuple(key.split('!', 1))
+            else:
+                prop, annotation = key, None
+            # Skip all @ items
+            if '@' in key or prop in ['', None]:
+                continue
+            node = data_base.get(prop)
+            if node is None:
+                node = data_base[prop] = PropertyNode(prop)
+            if annotation is None:
+                if isinstance(value, list):
+                    members = fold_items(value, sample, stable_after)
+                    node.item_types = [type(member) for member in members]
+                    node.json_type = "array"
+                    node.is_array = True
+                    value = members[0] if members else None
+                if isinstance(value, dict):
+                    node.value = value
+                    node.children = {}
+                    # Descend; the members after this one are picked up when the child is finished
+                    stack.append((iter(value.items()), csv.child(prop), node.children))
+                    break
+                elif isinstance(value, str) and '|' in value:
+                    #For enum values
+                    value = [val.strip() for val in value.split('|') if val]
+                    node.enum = value
+                node.value = value
+            else:
+                node.set_annotation(annotation, value)
         else:
-            data_base[prop][annotation] = value
-    for prop in data_base:
-        if prop in csv:
-            print(prop)
-            data_base[prop]['description'] = csv[prop][0]
-            data_base[prop]['longDescription'] = csv[prop][1]
-            if data_base[prop].get("enum"):
-                csv_enum = csv[prop][2:]
-                print(csv_enum, prop)
-                if data_base[prop].get("enumDescriptions") is None:
-                    data_base[prop]["enumDescriptions"] = {}
-                data_base[prop]["enumDescriptions"].update({e: d for e, d in zip(data_base[prop]["value"], csv_enum)})
+            stack.pop()
+            _finish_nodes(data_base, csv)
+
+    return root
+
 
+def _finish_nodes(data_base, csv):
+    """Applies the CSV rows to the nodes of one object and sets their kinds"""
+    for prop, node in data_base.items():
+        row = csv.child(prop).row
+        if row is not None:
+            _debug("CSV description found for %s", prop)
+            node.description = row[0]
+            node.long_description = row[1]
+            if node.enum:
+                csv_enum = row[2:]
+                _debug("CSV enum descriptions for %s: %s", prop, csv_enum)
+                node.enum_descriptions = dict(node.enum_descriptions or {})
+                node.enum_descriptions.update({e: d for e, d in zip(node.enum, csv_enum)})
+        node.finish()
 
+
+def _schema_type(descriptors):
+    json_type = descriptors.get("type")
+    if isinstance(json_type, list):
+        # e.g. ["string", "null"]
+        json_type = next((t for t in json_type if t != "null"), None)
+    return json_type
+
+
+def schema_database(properties, required=(), resolver=None, base=None, _expanding=None):
+    """Transforms the properties of a JSON schema into a database of PropertyNodes
+
+    :param properties: The "properties" object of a JSON schema definition.
+    :type properties: dict
+    :param required: Names listed in the "required" array of the definition.
+    :type required: list
+    :param resolver: Resolver for $ref values; without one references stay unresolved (type TBD).
+    :type resolver: csdl_refs.SchemaResolver
+    :param base: Name of the document properties belongs to, for references local to it.
+    :type base: str
+    :returns: Ordered dictionary of property name to PropertyNode.
+    """
+    # Definitions being expanded, mapped to the property whose type they become, and the
+    # definitions whose database refers to such an outer type, which therefore cannot be reused
+    expanding, cyclic = ({}, set()) if _expanding is None else _expanding
+    data_base = {}
+    for prop, descriptors in properties.items():
+        if '@' in prop or not isinstance(descriptors, dict):
+            continue
+        node = data_base[prop] = PropertyNode(prop)
+        node_base, key = base, None
+        if resolver is not None:
+            descriptors, node_base, key = resolver.resolve(descriptors, base)
+        node.description = descriptors.get("description")
+        node.long_description = descriptors.get("longDescription")
+        node.read_write = descriptors.get("readonly") is False
+        node.required = prop in required
+        json_type = _schema_type(descriptors)
+        node.json_type = json_type
+        if json_type == "array":
+            node.is_array = True
+            descriptors = descriptors.get("items", {})
+            if resolver is not None:
+                descriptors, node_base, key = resolver.resolve(descriptors, node_base)
+            item_type = _schema_type(descriptors)
+            node.item_types = [item_type] if item_type else []
+        if "properties" in descriptors:
+            if key in expanding:
+                # The definition contains itself; refer to the type being built instead of expanding it again
+                node.type_name = expanding[key]
+                keys = list(expanding)
+                cyclic.update(keys[keys.index(key):])
+            elif key is not None and key in resolver.databases:
+                node.children = resolver.databases[key]
+            else:
+                if key is not None:
+                    expanding[key] = prop
+                node.children = schema_database(descriptors["properties"], descriptors.get("required", ()), resolver, node_base, (expanding, cyclic))
+                if key is not None:
+                    del expanding[key]
+                    if key not in cyclic:
+                        resolver.databases[key] = node.children
+        elif "enum" in descriptors:
+            node.enum = [e for e in descriptors["enum"] if e is not None]
+            node.enum_descriptions = descriptors.get("enumDescriptions")
+            node.enum_long_descriptions = descriptors.get("enumLongDescriptions")
+        node.finish()
     return data_base
 
 
-def create_navigation(property_name, schema_name="TBD", description=None, longDescription=None, collection=False, **kwargs):
-    """Creates a navigation entry to add to the CSDL schema."""
+def _prototype(term, **attrib):
+    """Creates a shared Annotation element; see ANNOTATION_PROTOTYPES"""
+    attrib["Term"] = term
+    return etree.Element("Annotation", attrib)
+
+
+# Annotations whose attributes never vary are built once and appended to every element that
+# needs them (an ElementTree element can be the child of several parents). They are shared,
+# so they must never be modified; replace them instead.
+ANNOTATION_PROTOTYPES = {
+    "Read": _prototype("OData.Permissions", EnumMember="OData.Permission/Read"),
+    "ReadWrite": _prototype("OData.Permissions", EnumMember="OData.Permission/ReadWrite"),
+    "Required": _prototype("Redfish.Required"),
+    "AdditionalProperties": _prototype("OData.AdditionalProperties", Bool="false"),
+    "AutoExpandReferences": _prototype("OData.AutoExpandReferences"),
+    "DescriptionTBD": _prototype("OData.Description", String="TBD"),
+    "LongDescriptionTBD": _prototype("OData.LongDescription", String="TBD"),
+}
+
+
+def _description(text):
+    """Returns an OData.Description annotation, the shared one for the TBD default"""
+    if not text or text == "TBD":
+        return ANNOTATION_PROTOTYPES["DescriptionTBD"]
+    return etree.Element("Annotation", {"Term": "OData.Description", "String": text})
+
+
+def _long_description(text):
+    """Returns an OData.LongDescription annotation, the shared one for the TBD default"""
+    if not text or text == "TBD":
+        return ANNOTATION_PROTOTYPES["LongDescriptionTBD"]
+    return etree.Element("Annotation", {"Term": "OData.LongDescription", "String": text})
+
+
+def _navigation_descriptions(property_name, description=None, longDescription=None):
+    """Returns the descriptions of a navigation property, defaulted from its name"""
     description = description if description else "A link to {}".format(property_name)
     longDescription = longDescription if longDescription else "This property shall be a link to a resource collection of type {}.".format(property_name)
+    return description, longDescription
+
+
+def create_navigation(property_name, schema_name="TBD", description=None, longDescription=None, collection=False, **kwargs):
+    """Creates a navigation entry to add to the CSDL schema."""
+    description, longDescription = _navigation_descriptions(property_name, description, longDescription)
 
     if collection:
         navegation_entry = etree.Element("NavigationProperty",\
@@ -96,44 +418,35 @@ def create_navigation(property_name, schema_name="TBD", description=None, longDe
         navegation_entry = etree.Element("NavigationProperty",\
             attrib={"Name": property_name, "Type": "{}.{}".format(schema_name, schema_name), "Nullable": "false"})
 
-    etree.SubElement(navegation_entry, "Annotation", 
-        attrib={"Term":"OData.Permissions", "EnumMember": "OData.Permission/Read"} )
-    etree.SubElement(navegation_entry, "Annotation", attrib={"Term": "OData.Description", "String": description})
-    etree.SubElement(navegation_entry, "Annotation", attrib={"Term": "OData.LongDescription", "String": longDescription})
+    navegation_entry.append(ANNOTATION_PROTOTYPES["Read"])
+    navegation_entry.append(_description(description))
+    navegation_entry.append(_long_description(longDescription))
     if collection:
-        etree.SubElement(navegation_entry, "Annotation", {'Term':'OData.AutoExpandReferences'})
+        navegation_entry.append(ANNOTATION_PROTOTYPES["AutoExpandReferences"])
 
     return navegation_entry
 
 
 def create_property(property_name, property_type, readonly=True, required=False, type=None, description=None, longDescription=None, items=None):
     """Creates a base property to build from"""
-    description = description if description else "TBD"
-    longDescription = longDescription if longDescription else "TBD"
-    readonly = "OData.Permission/Read" if readonly else "OData.Permission/ReadWrite"
-
-    property_string = "ComplexType" if complex else "Property"
-
     added_property = etree.Element("Property", attrib={"Name": property_name, "Type": property_type, "Nullable": "false"})
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.Permissions", "EnumMember": readonly})
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.Description", "String": description})
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.LongDescription", "String": longDescription})
+    added_property.append(ANNOTATION_PROTOTYPES["Read" if readonly else "ReadWrite"])
+    added_property.append(_description(description))
+    added_property.append(_long_description(longDescription))
     if required:
-        etree.SubElement(added_property, "Annotation", attrib={"Term": "Redfish.Required"})
+        added_property.append(ANNOTATION_PROTOTYPES["Required"])
 
     return added_property
 
     
 def create_complex_property(property_name, base_type=None, description=None, longDescription=None, readonly=True, type=None, **kwargs):
     """Create a complex property type"""
-    description = description if description else "TBD"
-    longDescription = longDescription if longDescription else "TBD"
     added_property = etree.Element("ComplexType", attrib={"Name": property_name, "Nullable": "false"})
     if base_type:
         added_property.attrib["BaseType"] = base_type
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.Description", "String": description})
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.LongDescription", "String": longDescription})
-    etree.SubElement(added_property, "Annotation", attrib={"Term": "OData.AdditionalProperties", "Bool": "false"})
+    added_property.append(_description(description))
+    added_property.append(_long_description(longDescription))
+    added_property.append(ANNOTATION_PROTOTYPES["AdditionalProperties"])
 
     return added_property
 
@@ -144,9 +457,10 @@ def create_enum_property(property_name, enum_values, enum_description=None, enum
 
     for value in enum_values:
         value_entry = etree.SubElement(enum_property_entry, "Member", attrib={"Name": value})
-        description = enum_description.get(value) if enum_description else "TBD"
-        longDescripton = enum_longDescription.get(value) if enum_longDescription else "TBD"
-        etree.SubElement(value_entry, "Annotation", attrib={"Term": "OData.Description", "String": description})
+        if enum_description:
+            value_entry.append(etree.Element("Annotation", {"Term": "OData.Description", "String": enum_description.get(value)}))
+        else:
+            value_entry.append(ANNOTATION_PROTOTYPES["DescriptionTBD"])
 
     return enum_property_entry
     
@@ -161,6 +475,24 @@ type_conversion = {
     "integer": "Edm.Int64",
 }
 
+# JSON Schema type of each CSDL primitive type in type_conversion
+json_type_conversion = {
+    "Edm.String": "string",
+    "Edm.Decimal": "number",
+    "Edm.Boolean": "boolean",
+    "Edm.Int64": "integer",
+}
+
+JSON_SCHEMA_URI = "http://redfish.dmtf.org/schemas/v1/"
+
+def primitive_type(node):
+    """Returns the CSDL type of a primitive PropertyNode, a Collection for arrays"""
+    if node.is_array:
+        item_type = node.item_types[0] if node.item_types else None
+        return "Collection({})".format(type_conversion.get(item_type, 'TBD'))
+    return type_conversion.get(node.json_type if node.json_type is not None else type(node.value), 'TBD')
+
+
 def create_property_w_type(property_name, value=None, my_type=None, **kwargs):
     """Creates a base property using create_property based on the type value is"""
     entry = None
@@ -176,27 +508,157 @@ def create_property_w_type(property_name, value=None, my_type=None, **kwargs):
     return entry
     
 
+def _is_resource_type(key, resource_types=None):
+    """Returns True if the property key is emitted with a type of the Resource schema"""
+    if resource_types is None:
+        return key in RESOURCE_TYPES
+    return resource_types.lookup("Resource", key) is not None
+
+
+def _member_signature(key, node, signatures, memo, resource_types=None):
+    """Returns what the Property or NavigationProperty emitted for node contributes to the structure of its type"""
+    if _is_resource_type(key, resource_types):
+        return (key,)
+    signature = (key, node.kind, node.is_array, node.required, node.read_write, node.description, node.long_description)
+    if node.kind == KIND_LINK:
+        return signature + (node.link,)
+    if node.kind == KIND_TYPEREF:
+        return signature + (node.type_name,)
+    if node.kind in (KIND_OBJECT, KIND_ENUM):
+        return signature + (type_signature(node, signatures, memo, resource_types),)
+    return signature + (primitive_type(node),)
+
+
+def type_signature(node, signatures, memo, resource_types=None):
+    """Returns a number identifying the structure of the ComplexType or EnumType emitted for node
+
+    Two nodes get the same number when their types would be identical apart from the type
+    name: same member names, types and annotations. Structures are numbered as they are first
+    seen, so comparing a type only costs a lookup of a tuple of its member signatures. Nested
+    types are numbered first, children before parents, from an explicit stack.
+
+    :param node: PropertyNode of kind KIND_OBJECT or KIND_ENUM.
+    :param signatures: Dictionary of structure to number shared by every node of a document.
+    :param memo: Dictionary of id(node) to number, so each subtree is visited once.
+    :param resource_types: Type index deciding which members are Resource types, RESOURCE_TYPES without one.
+    """
+    stack = [node]
+    while stack:
+        current = stack[-1]
+        if id(current) in memo:
+            stack.pop()
+            continue
+        if current.kind == KIND_OBJECT:
+            pending = [child for key, child in current.children.items()
+                       if child.kind in (KIND_OBJECT, KIND_ENUM) and id(child) not in memo and not _is_resource_type(key, resource_types)]
+            if pending:
+                stack.extend(reversed(pending))
+                continue
+        stack.pop()
+        if current.kind == KIND_ENUM:
+            descriptions = current.enum_descriptions or {}
+            long_descriptions = current.enum_long_descriptions or {}
+            structure = (KIND_ENUM, tuple(current.enum), tuple(descriptions.get(e) for e in current.enum), tuple(long_descriptions.get(e) for e in current.enum))
+        else:
+            structure = (KIND_OBJECT, current.description, current.long_description,
+                         tuple(_member_signature(key, child, signatures, memo, resource_types) for key, child in current.children.items()))
+        memo[id(current)] = signatures.setdefault(structure, len(signatures))
+    return memo[id(node)]
+
+
+def split_pointer(pointer):
+    """Returns the unescaped member names of a JSON pointer"""
+    if not pointer.startswith('/'):
+        raise ValueError("Not a JSON pointer: {!r}".format(pointer))
+    return [segment.replace('~1', '/').replace('~0', '~') for segment in pointer[1:].split('/')]
+
+
+def simple_name(odata_type):
+    """Returns the simple version of an @odata.type, e.g. Thingy.v1_0_0 for #Thingy.v1_0_0.Thingy"""
+    match = re.match(REGEX_TYPE, odata_type)
+    return match.group(1) if match else odata_type
+
+
+def get_schema_name(json_data):
+    """Returns the name CsdlFile gives the schema of json_data, without building anything"""
+    return simple_name(json_data['title'] if "$schema" in json_data else json_data['@odata.type'])
+
+
 class CsdlFile:
-    """CSDL file that is created from the passed JSON"""
-    def __init__(self, annotated_json, inherited_prop_list=[], csv=None):
+    """CSDL file that is created from the passed JSON
+
+    :param resolver: Resolver for the $ref values of a JSON schema input; by default only
+        references within the input document are resolved.
+    :type resolver: csdl_refs.SchemaResolver
+    :param type_index: Index of a published CSDL bundle resolving Resource types, link targets and
+        the namespaces to include; by default RESOURCE_TYPES and the conventional file names are used.
+    :type type_index: csdl_type_index.TypeIndex
+    :param sample: Number of members of each mockup array to fold into its item shape, see fold_items.
+    :type sample: int
+    :param stable_after: Stop folding a mockup array once its item shape is stable, see fold_items.
+    :type stable_after: int
+    :ivar elements: Index of the built elements, see find_elements; None when built with dedupe,
+        since types are then shared between properties.
+    """
+    def __init__(self, annotated_json, inherited_prop_list=(), csv=None, resolver=None, type_index=None, sample=None, stable_after=None):
         self.csdl = None
         self.main_csdl = None
+        self.json_schema = None
+        self.collapsed = []
+        self._type_names = None
+        self._signatures = None
+        self._signature_memo = None
+        self._references = {}
+        self._base_references = ()
+        self._link_counts = {}
+        self._links_built = 0
+        self.type_index = type_index
+        self._inherited = list(inherited_prop_list)
+        self.elements = None
+        self._csv = None
         self.annotated_json = annotated_json
         # if the JSON input file is not a json-schema, build a database from the mockup
         if "$schema" in self.annotated_json:
-           self._annotation_database = self.annotated_json["properties"]
+           self._annotation_database = self.schema_properties(resolver)
            self._name = annotated_json['title']
-
-           for key in list(self._annotation_database):
-               if "@" in key:
-                   del self._annotation_database[key]
         else:
-           self._annotation_database = database_builder(self.annotated_json, csv)
+           self._csv = csv if isinstance(csv, CsvIndex) else CsvIndex(csv)
+           self._annotation_database = database_builder(self.annotated_json, self._csv, sample, stable_after)
            self._name = annotated_json['@odata.type']
 
         for item in inherited_prop_list:
-            if item in self._annotation_database:
-                del self._annotation_database[item]
+            self._annotation_database.pop(item, None)
+
+    def schema_properties(self, resolver=None):
+        """Returns the database of a JSON schema input, from its properties or else the definition its $ref names"""
+        import csdl_refs
+        resolver = resolver if resolver is not None else csdl_refs.SchemaResolver()
+        base = resolver.add_document(self.annotated_json)
+        definition = self.annotated_json
+        if "properties" not in definition and "$ref" in definition:
+            definition, base, _key = resolver.resolve({"$ref": definition["$ref"]}, base)
+        return schema_database(definition.get("properties", {}), definition.get("required", ()), resolver, base)
+
+    @classmethod
+    def from_database(cls, odata_type, database, inherited_prop_list=()):
+        """Creates a CsdlFile from an already built database of PropertyNodes"""
+        csdl = cls({'@odata.type': odata_type})
+        csdl._inherited = list(inherited_prop_list)
+        csdl._annotation_database = dict(database)
+        for item in inherited_prop_list:
+            csdl._annotation_database.pop(item, None)
+        return csdl
+
+    def release(self):
+        """Drops the input document and the annotation database once the schema is built
+
+        The built elements and the JSON Schema are kept; build_csdl and patch cannot be called again.
+        """
+        self.annotated_json = None
+        self._annotation_database = None
+        self._csv = None
+        self._signatures = None
+        self._signature_memo = None
 
     def __str__(self):
         return str(self.csdl)
@@ -204,8 +666,7 @@ class CsdlFile:
     @property
     def name(self):
         """Returns the simple version of the @odata.type"""
-        match = re.match(REGEX_TYPE, self._name)
-        return match.group(1) if match else self._name
+        return simple_name(self._name)
 
     @name.setter
     def name(self, name):
@@ -216,148 +677,694 @@ class CsdlFile:
         """Builds the header and the root of th CSDL file."""
         # self.csdl = etree.Element("Edmx", nsmap={"edmx":"http://docs.oasis-open.org/odata/ns/edmx"}, attrib={"Version": "4.0"})#etree.XML(CSDL_HEADER_TEMPLATE.format(self.name))
         self.main_csdl, self.csdl, _services = xml_convenience.create_xml_base(self.name.split('.')[0])
+        self._references = xml_convenience.index_references(self.main_csdl)
+        self._base_references = frozenset(self._references)
         self.entity = etree.Element('EntityType', {
             'Name': self.name.split('.')[0],
             'BaseType': '.'.join([self.name.split('.')[0]]*2)
         })
         self.csdl.append(self.entity)
 
-    def build_csdl(self):
+    def build_csdl(self, json_schema=False, dedupe=False):
+        """Builds the schema from the annotation database
+
+        :param json_schema: Also build the JSON Schema of the resource into self.json_schema, in the same pass.
+        :type json_schema: bool
+        :param dedupe: Emit structurally identical ComplexTypes and EnumTypes once and reference the
+            first one everywhere; self.collapsed lists the (property, type) pairs that were redirected.
+        :type dedupe: bool
+        """
+        if dedupe:
+            self._type_names = {}
+            self._signatures = {}
+            self._signature_memo = {}
+        self.elements = None if dedupe else {}
+        definition = self.init_json_schema() if json_schema else None
         for key, descriptors in self._annotation_database.items():
-            self.build_csdl_node(self.entity, key, descriptors)
-    
-    def build_csdl_node(self, entry, key, descriptors):
-        """Builds the csdl file from the annotated json database"""
-        kwargs = {}
-        if "description" in descriptors:
-            kwargs["description"] = descriptors["description"]
-        if "longDescription" in descriptors:
-            kwargs["longDescription"] = descriptors["longDescription"]
-        if key in RESOURCE_TYPES:
-            entry.append(create_property(key, "Resource.{}".format(key)))
-            return
-        if "required" in descriptors:
-            kwargs["required"] = True
-        if "readonly" in descriptors:
-            kwargs["readonly"] = False
-        if "type" in descriptors:
-            # JSON schema file
-            kwargs["type"] = descriptors["type"]
-        if "items" in descriptors:
-            # JSON schema file
-            kwargs["items"] = descriptors["items"]
-        value = descriptors.get("value", None)
-        if isinstance(value, dict) or "properties" in descriptors:
-                # kwargs["base_name"] = "Resource.%s" % key
-            if "$ref" in descriptors:
-                # for jsonschema
-                pass
-            if "link" in descriptors:
-                kwargs = {}
-                kwargs['schema_name'] = descriptors['link']
-                if 'description' in descriptors:
-                    kwargs['description'] = descriptors['description']
-                if 'longDescription' in descriptors:
-                    kwargs['longDescription'] = descriptors['longDescription']
-                if not any([descriptors['link'] in x.attrib.get('Uri', '').split('/')[-1] for x in self.main_csdl]):
-                    my_node = xml_convenience.add_reference(None, None, descriptors['link'])
-                    self.main_csdl.insert(3, my_node)
-                if descriptors.get("type") == "array":
-                    kwargs['collection'] = True
-                entry.append(create_navigation(key, **kwargs))
+            self.build_csdl_node(self.entity, key, descriptors, definition, self.elements)
+
+    def find_elements(self, pointer):
+        """Returns the elements built for the property at a JSON pointer, e.g. /ThingContainer/ThingButton/ButtonColor
+
+        :returns: Tuple of the Property or NavigationProperty element and the ComplexType or EnumType
+            element built for it, None if there is none; None if no property was built at pointer.
+        """
+        if self.elements is None:
+            return None
+        index, found = self.elements, None
+        for segment in split_pointer(pointer):
+            if index is None or segment not in index:
+                return None
+            found = index[segment]
+            index = found[2]
+        return found[:2]
+
+    def patch(self, pointer, value, annotations=None):
+        """Replaces or adds the property at a JSON pointer and rebuilds only its elements, in place
+
+        The property is built from value as database_builder builds a member of a mockup, with the
+        description rows of its path. Its Property, ComplexTypes and EnumTypes, and their JSON Schema
+        definitions when one was built, take the place of the previous ones, so the document is the
+        one the edited mockup would build. Link references still in use stay; those no longer used
+        are removed, and when links change the references are put in the order a build gives them.
+
+        :param pointer: JSON pointer of the property, e.g. /ThingContainer/ThingButton/ButtonColor.
+        :type pointer: str
+        :param value: Mockup value of the property.
+        :param annotations: Dictionary of the mockup annotations of the property, named as in a
+            ``property!annotation`` key, e.g. {'readonly': False} to make it read-write.
+        :type annotations: dict
+        :returns: The Property or NavigationProperty element built.
+        """
+        levels, parent_elem, definition = self._patch_target(pointer)
+        database, index, key = levels[-1]
+        csv = self._csv
+        for _database, _index, segment in levels[:-1]:
+            csv = csv.child(segment)
+        fragment = {key: value}
+        for annotation, annotation_value in (annotations or {}).items():
+            fragment['{}!{}'.format(key, annotation)] = annotation_value
+        node = database_builder(fragment, csv)[key]
+
+        position = None
+        if key in index:
+            position = next(position for position, member in enumerate(parent_elem) if member is index[key][0])
+        required = definition.get("required", []) if definition is not None else []
+        required_position = required.index(key) if key in required else None
+        if required_position is not None:
+            required.pop(required_position)
+        dropped = self._discard(index, key, database[key]) if key in database else []
+        database[key] = node
+
+        holder = etree.Element('Holder')
+        emitted = len(self.csdl)
+        links_built = self._links_built
+        self.build_csdl_node(holder, key, node, definition, index)
+        # The replaced links are only dropped now, so references the new subtree still uses survive
+        for schema_name in dropped:
+            self.drop_link_reference(schema_name)
+        if dropped or self._links_built != links_built:
+            self._order_link_references()
+        if position is None:
+            parent_elem.append(holder[0])
+        else:
+            parent_elem[position] = holder[0]
+        types = self.csdl[emitted:]
+        if types:
+            del self.csdl[emitted:]
+            start = self._subtree_start(levels)
+            self.csdl[start:start] = types
+            if self.json_schema is not None:
+                self._order_json_definitions()
+        if required_position is not None and key in required:
+            required.remove(key)
+            required.insert(required_position, key)
+        return index[key][0]
+
+    def remove(self, pointer):
+        """Removes the property at a JSON pointer with its elements, see patch"""
+        levels, parent_elem, definition = self._patch_target(pointer)
+        database, index, key = levels[-1]
+        if key not in database:
+            raise KeyError(pointer)
+        if key in index:
+            parent_elem.remove(index[key][0])
+        if definition is not None:
+            definition["properties"].pop(key, None)
+            if key in definition.get("required", ()):
+                definition["required"].remove(key)
+        dropped = self._discard(index, key, database.pop(key))
+        for schema_name in dropped:
+            self.drop_link_reference(schema_name)
+        if dropped:
+            self._order_link_references()
+
+    def _patch_target(self, pointer):
+        """Returns the (database, element index, name) of every level of pointer from the root, and
+        the element and JSON Schema definition of the object holding the property"""
+        if self.elements is None:
+            raise ValueError("Patching needs a schema built without dedupe")
+        if self._annotation_database is None or self._csv is None:
+            raise ValueError("Patching needs the database of a mockup input, before release")
+        segments = split_pointer(pointer)
+        if len(segments) == 1 and segments[0] in self._inherited:
+            raise ValueError("{} is defined by the Resource schema".format(pointer))
+        levels = []
+        database, index, parent_elem = self._annotation_database, self.elements, self.entity
+        for depth, segment in enumerate(segments):
+            levels.append((database, index, segment))
+            if depth == len(segments) - 1:
+                break
+            found = index.get(segment)
+            if found is None or found[2] is None:
+                raise ValueError("{} is not an object property".format('/'.join(pointer.split('/')[:depth + 2])))
+            database, index, parent_elem = database[segment].children, found[2], found[1]
+        definition = None
+        if self.json_schema is not None:
+            definition = self.json_schema["definitions"][parent_elem.get('Name')]
+        return levels, parent_elem, definition
+
+    def _discard(self, index, key, node):
+        """Drops the index entries of a property and its members and removes their types
+
+        :returns: List of the link targets of the dropped NavigationProperties, whose references
+            the caller releases with drop_link_reference.
+        """
+        dropped = []
+        stack = [(index.pop(key, None), node)]
+        while stack:
+            found, node = stack.pop()
+            if found is None:
+                continue
+            member, type_elem, children = found
+            if member.tag == 'NavigationProperty':
+                dropped.append(node.link)
+            if type_elem is not None:
+                self.csdl.remove(type_elem)
+                if self.json_schema is not None:
+                    self.json_schema["definitions"].pop(type_elem.get('Name'), None)
+            if children is not None:
+                stack.extend((child, node.children[child_key]) for child_key, child in children.items())
+        return dropped
+
+    def _order_link_references(self):
+        """Puts the link references in build order: add_reference inserts each new one ahead of the
+        others, so they are listed by the first NavigationProperty targeting them, last first"""
+        targets = {}
+        stack = [(iter(self._annotation_database.items()), self.elements)]
+        while stack:
+            items, index = stack[-1]
+            for key, node in items:
+                found = index.get(key)
+                if found is None:
+                    continue
+                if found[0].tag == 'NavigationProperty':
+                    targets.setdefault(node.link)
+                if found[2] is not None:
+                    stack.append((iter(node.children.items()), found[2]))
+                    break
+            else:
+                stack.pop()
+        references = {}
+        for schema_name in targets:
+            key = xml_convenience.reference_key(self.reference_uri(schema_name))
+            if key not in self._base_references and key in self._references:
+                references.setdefault(key, self._references[key])
+        for reference in references.values():
+            self.main_csdl.remove(reference)
+        self.main_csdl[3:3] = list(references.values())[::-1]
+
+    def _order_json_definitions(self):
+        """Puts the JSON Schema definitions in build order: the entity first, then each type as the
+        property it is built for is reached, a ComplexType before the types of its members"""
+        definitions = self.json_schema["definitions"]
+        names = [self.name.split('.')[0]]
+        stack = [(iter(self._annotation_database.items()), self.elements)]
+        while stack:
+            items, index = stack[-1]
+            for key, node in items:
+                found = index.get(key)
+                if found is None:
+                    continue
+                if found[1] is not None:
+                    names.append(found[1].get('Name'))
+                if found[2] is not None:
+                    stack.append((iter(node.children.items()), found[2]))
+                    break
             else:
-                complex_prop = create_complex_property(key, **kwargs)
-                if descriptors.get("type") == "array":
-                    entry.append(create_property(key, "Collection(%s.%s)" % (self.name, key), **kwargs))
-                else:
-                    entry.append(create_property(key, "%s.%s" % (self.name, key), **kwargs))
-                for key, descriptors in descriptors["properties"].items():
-                    self.build_csdl_node(complex_prop, key, descriptors)
+                stack.pop()
+        ordered = {name: definitions.pop(name) for name in names if name in definitions}
+        ordered.update(definitions)
+        self.json_schema["definitions"] = ordered
+
+    def _subtree_start(self, levels):
+        """Returns the position in the schema where the types of the property levels lead to belong
+
+        A property's types follow those of the properties built before it; the last of those is
+        the type of the closest earlier sibling that has one, else the search moves to the parent.
+        """
+        anchor = self.entity
+        for database, index, key in reversed(levels):
+            earlier = list(itertools.takewhile(lambda sibling: sibling != key, database))
+            found = next((index[sibling][1] for sibling in reversed(earlier) if sibling in index and index[sibling][1] is not None), None)
+            if found is not None:
+                anchor = found
+                break
+        return next(position for position, elem in enumerate(self.csdl) if elem is anchor) + 1
+
+    def build_csdl_node(self, entry, key, node, definition=None, index=None):
+        """Builds the csdl file from the annotated json database
+
+        Nested ComplexTypes are built from an explicit stack rather than recursion; each is
+        appended to the schema once all of its members are built, as before.
+
+        :param definition: JSON Schema definition of the type being built, None when no JSON Schema is built.
+        :type definition: dict
+        :param index: Level of self.elements receiving the elements of the property, see build_property.
+        :type index: dict
+        """
+        pending = self.build_property(entry, key, node, definition, index)
+        stack = [(pending, index[key][2] if index is not None else None)] if pending is not None else []
+        while stack:
+            (complex_prop, children, child_definition), child_index = stack[-1]
+            for child_key, child in children:
+                pending = self.build_property(complex_prop, child_key, child, child_definition, child_index)
+                if pending is not None:
+                    stack.append((pending, child_index[child_key][2] if child_index is not None else None))
+                    break
+            else:
+                stack.pop()
                 self.csdl.append(complex_prop)
-        elif "enum" in descriptors:
-            if descriptors.get("type") == "array":
-                entry.append(create_property(key, "Collection(%s.%s)" % (self.name, key), **kwargs))
+
+    def build_property(self, entry, key, node, definition=None, index=None):
+        """Adds the element for one node to entry and emits its EnumType
+
+        With index, records index[key] as a tuple of the element, the ComplexType or EnumType built
+        for it (or None) and, for a ComplexType, the dictionary indexing its members the same way.
+
+        :returns: For a ComplexType still to be built, a tuple of its element, an iterator over the
+            members to build into it and its JSON Schema definition; None otherwise.
+        """
+        emitted = len(self.csdl)
+        pending = self._build_property(entry, key, node, definition)
+        if index is not None:
+            if pending is not None:
+                index[key] = (entry[-1], pending[0], {})
             else:
-                entry.append(create_property(key, "%s.%s" % (self.name, key), **kwargs))
-            self.csdl.append(create_enum_property(key, descriptors.get("enum"), descriptors.get("enumDescriptions", None), descriptors.get("enumLongDescriptions", None)))
+                # An EnumType is the only element appended to the schema right away
+                index[key] = (entry[-1], self.csdl[-1] if len(self.csdl) > emitted else None, None)
+        return pending
+
+    def _build_property(self, entry, key, node, definition=None):
+        kwargs = {}
+        if node.description is not None:
+            kwargs["description"] = node.description
+        if node.long_description is not None:
+            kwargs["longDescription"] = node.long_description
+        resource_type = self.resource_type(key)
+        if resource_type is not None:
+            entry.append(create_property(key, resource_type))
+            if definition is not None:
+                self.add_json_property(definition, key, resource_type)
+            return None
+        if node.required:
+            kwargs["required"] = True
+        if node.read_write:
+            kwargs["readonly"] = False
+        kind = node.kind
+        if kind == KIND_LINK:
+            kwargs.pop("required", None)
+            kwargs.pop("readonly", None)
+            kwargs['schema_name'] = node.link
+            self.add_link_reference(node.link)
+            if node.is_array:
+                kwargs['collection'] = True
+            entry.append(create_navigation(key, **kwargs))
+            if definition is not None:
+                kwargs["description"], kwargs["longDescription"] = _navigation_descriptions(key, kwargs.get("description"), kwargs.get("longDescription"))
+                link_type = "{0}.{0}".format(node.link)
+                self.add_json_property(definition, key, "Collection({})".format(link_type) if node.is_array else link_type, **kwargs)
+        elif kind == KIND_OBJECT:
+            type_name, emit = self.shared_type(key, node)
+            entry.append(create_property(key, self.qualified_type(type_name, node.is_array), **kwargs))
+            if definition is not None:
+                self.add_json_property(definition, key, self.qualified_type(type_name, node.is_array), **kwargs)
+            if not emit:
+                return None
+            complex_prop = create_complex_property(key, **kwargs)
+            child_definition = None
+            if definition is not None:
+                child_definition = self.add_json_definition(key, "object", **kwargs)
+            return complex_prop, iter(node.children.items()), child_definition
+        elif kind == KIND_TYPEREF:
+            entry.append(create_property(key, self.qualified_type(node.type_name, node.is_array), **kwargs))
+            if definition is not None:
+                self.add_json_property(definition, key, self.qualified_type(node.type_name, node.is_array), **kwargs)
+        elif kind == KIND_ENUM:
+            type_name, emit = self.shared_type(key, node)
+            entry.append(create_property(key, self.qualified_type(type_name, node.is_array), **kwargs))
+            if definition is not None:
+                self.add_json_property(definition, key, self.qualified_type(type_name, node.is_array), **kwargs)
+            if not emit:
+                return None
+            self.csdl.append(create_enum_property(key, node.enum, node.enum_descriptions, node.enum_long_descriptions))
+            if definition is not None:
+                enum_definition = self.add_json_definition(key, "string")
+                enum_definition["enum"] = list(node.enum)
+                if node.enum_descriptions:
+                    enum_definition["enumDescriptions"] = {e: node.enum_descriptions[e] for e in node.enum if node.enum_descriptions.get(e)}
+                if node.enum_long_descriptions:
+                    enum_definition["enumLongDescriptions"] = {e: node.enum_long_descriptions[e] for e in node.enum if node.enum_long_descriptions.get(e)}
+        else:
+            entry.append(create_property(key, primitive_type(node), **kwargs))
+            if definition is not None:
+                self.add_json_property(definition, key, primitive_type(node), **kwargs)
+
+    def init_json_schema(self):
+        """Starts the JSON Schema document of the resource; returns the definition of its entity"""
+        entity_name = self.name.split('.')[0]
+        self.json_schema = {
+            "$id": "{}{}.json".format(JSON_SCHEMA_URI, self.name),
+            "$ref": "#/definitions/{}".format(entity_name),
+            "$schema": "{}redfish-schema-v1.json".format(JSON_SCHEMA_URI),
+            "definitions": {},
+            "title": "#{}.{}".format(self.name, entity_name),
+        }
+        definition = self.add_json_definition(entity_name, "object")
+        for odata_property in ("@odata.id", "@odata.type"):
+            definition["properties"][odata_property] = {"$ref": "{}odata-v4.json#/definitions/{}".format(JSON_SCHEMA_URI, odata_property[len("@odata."):]), "readonly": True}
+            definition.setdefault("required", []).append(odata_property)
+        for key in self._inherited:
+            self.add_json_property(definition, key, "Resource.{}".format(key), required=key in ("Id", "Name"))
+        return definition
+
+    def add_json_definition(self, type_name, json_type, description=None, longDescription=None, **kwargs):
+        """Adds the JSON Schema definition of a type defined in this schema and returns it"""
+        definition = {"type": json_type}
+        if json_type == "object":
+            definition.update({"additionalProperties": False, "properties": {}})
+        if description is not None or json_type == "object":
+            definition["description"] = description or "TBD"
+            definition["longDescription"] = longDescription or "TBD"
+        self.json_schema["definitions"][type_name] = definition
+        return definition
+
+    def add_json_property(self, definition, key, property_type, readonly=True, required=False, description=None, longDescription=None, **kwargs):
+        """Adds the JSON Schema counterpart of a property created with property_type to a definition"""
+        collection = property_type.startswith("Collection(")
+        item_type = property_type[len("Collection("):-1] if collection else property_type
+        if item_type in json_type_conversion:
+            schema = {"type": json_type_conversion[item_type]}
+        elif item_type.startswith(self.name + "."):
+            schema = {"$ref": "#/definitions/{}".format(item_type[len(self.name) + 1:])}
+        elif '.' in item_type:
+            namespace, type_name = item_type.rsplit('.', 1)
+            schema = {"$ref": "{}{}.json#/definitions/{}".format(JSON_SCHEMA_URI, namespace, type_name)}
         else:
-            entry.append(create_property_w_type(key, value, **kwargs))
+            schema = {}
+        if collection:
+            schema = {"items": schema, "type": "array"}
+        if description is not None or not item_type.startswith("Resource."):
+            schema["description"] = description or "TBD"
+            schema["longDescription"] = longDescription or "TBD"
+        schema["readonly"] = readonly
+        definition["properties"][key] = schema
+        if required:
+            definition.setdefault("required", []).append(key)
+
+    def shared_type(self, key, node):
+        """Returns the name of the type to use for the property key and whether that type still has to be emitted"""
+        if self._type_names is None:
+            return key, True
+        signature = type_signature(node, self._signatures, self._signature_memo, self.type_index)
+        type_name = self._type_names.get(signature)
+        if type_name is None:
+            self._type_names[signature] = key
+            return key, True
+        self.collapsed.append((key, type_name))
+        return type_name, False
+
+    def qualified_type(self, type_name, collection=False):
+        """Returns the namespace qualified name of a type defined in this schema"""
+        qualified = "%s.%s" % (self.name, type_name)
+        return "Collection(%s)" % qualified if collection else qualified
+
+    def resource_type(self, key):
+        """Returns the qualified type of a property defined by the Resource schema, None for any other property"""
+        if self.type_index is None:
+            return "Resource.{}".format(key) if key in RESOURCE_TYPES else None
+        found = self.type_index.lookup("Resource", key)
+        if found is None:
+            return None
+        qualified, namespace = found
+        self.add_reference("Resource", namespace)
+        return qualified
+
+    def add_link_reference(self, schema_name):
+        """Adds the edmx:Reference for the target of a NavigationProperty"""
+        if self.type_index is not None and self.type_index.lookup(schema_name, schema_name) is None:
+            _debug("Link target %s is not defined in the CSDL bundle", schema_name)
+        self._link_counts[schema_name] = self._link_counts.get(schema_name, 0) + 1
+        self._links_built += 1
+        self.add_reference(schema_name)
+
+    def drop_link_reference(self, schema_name):
+        """Undoes add_link_reference, removing the edmx:Reference once no NavigationProperty targets the schema"""
+        count = self._link_counts.pop(schema_name, 0) - 1
+        if count > 0:
+            self._link_counts[schema_name] = count
+            return
+        key = xml_convenience.reference_key(self.reference_uri(schema_name))
+        if key not in self._base_references and key in self._references:
+            self.main_csdl.remove(self._references.pop(key))
+
+    def reference_uri(self, schema_name):
+        """Returns the URI of the file defining a schema, e.g. Thermal"""
+        uri = None
+        if self.type_index is not None:
+            uri = self.type_index.file_uri(schema_name)
+        return uri or xml_convenience.schema_uri(schema_name)
+
+    def add_reference(self, schema_name, namespace=None):
+        """Adds the edmx:Reference for a schema unless the document already references it
+
+        :param schema_name: Unversioned namespace of the schema, e.g. Thermal.
+        :param namespace: Namespace to include, by default schema_name; added to an existing reference that lacks it.
+        """
+        namespace = namespace or schema_name
+        uri = self.reference_uri(schema_name)
+        reference = self._references.get(xml_convenience.reference_key(uri))
+        if reference is None:
+            my_node = xml_convenience.add_reference(None, uri, namespace, ref_index=self._references)
+            self.main_csdl.insert(3, my_node)
+        elif all(include.get('Namespace') != namespace for include in reference):
+            etree.SubElement(reference, 'edmx:Include', {'Namespace': namespace})
 
     def add_schema_link(self):
         #TODO: Add schema link to CSDL
         pass
 
 
+def load_csv(file_name):
+    """Reads a pipe delimited description file into a dictionary of path to row values
+
+    :param file_name: Path of the CSV file.
+    :type file_name: str
+    """
+    import csv
+    csv_dict = {}
+    with open(file_name) as f:
+        csv_reader = csv.reader(f, delimiter='|')
+        for line in csv_reader:
+            csv_dict[line[0]] = line[1:]
+    return csv_dict
+
+
+def serialize_csdl(csdl):
+    """Returns the formatted CSDL document text for a built CsdlFile, header included"""
+    return csdl_serializer.csdl_to_string(csdl.main_csdl, csdl.name)
+
+
+def build_csdl_file(json_data, csv_dict=None, json_schema=False, dedupe=False, resolver=None, type_index=None, sample=None, stable_after=None):
+    """Creates and builds the CsdlFile for one annotated JSON document
+
+    :param json_data: Annotated JSON mockup or JSON schema.
+    :type json_data: dict
+    :param csv_dict: Optional description rows keyed by property path, or a CsvIndex of them.
+    :type csv_dict: dict or CsvIndex
+    :param json_schema: Also build the JSON Schema of the resource, see CsdlFile.build_csdl.
+    :type json_schema: bool
+    :param dedupe: Emit structurally identical types once, see CsdlFile.build_csdl.
+    :type dedupe: bool
+    :param resolver: Resolver for the $ref values of a JSON schema input.
+    :type resolver: csdl_refs.SchemaResolver
+    :param type_index: Index of a published CSDL bundle, see CsdlFile.
+    :type type_index: csdl_type_index.TypeIndex
+    :param sample: Number of members of each array to fold into its item shape, see fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see fold_items.
+    :type stable_after: int
+    """
+    csdl = CsdlFile(json_data, RESOURCE_PROPERTIES, csv=csv_dict if csv_dict is not None else {}, resolver=resolver, type_index=type_index,
+                    sample=sample, stable_after=stable_after)
+    csdl.init_csdl()
+    csdl.build_csdl(json_schema, dedupe)
+    return csdl
+
+
+def generate_csdl(json_data, csv_dict=None):
+    """Builds the CSDL for one annotated JSON document
+
+    :param json_data: Annotated JSON mockup or JSON schema.
+    :type json_data: dict
+    :param csv_dict: Optional description rows keyed by property path, or a CsvIndex of them.
+    :type csv_dict: dict or CsvIndex
+    :returns: Tuple of the schema name and the CSDL document text.
+    """
+    csdl = build_csdl_file(json_data, csv_dict)
+    return csdl.name, serialize_csdl(csdl)
+
+
+class SchemaGenerator:
+    """Reusable in-process generator for services embedding the tool
+
+    The configuration and its indexes are built once and shared by every call: the description
+    rows are indexed on construction, and the resolver and type index keep what they have parsed.
+    generate neither reads nor writes files nor prints, and may be called concurrently from any
+    number of threads; each call builds its own CsdlFile.
+
+    :param csv: Default description rows keyed by property path, or a CsvIndex of them.
+    :type csv: dict or CsvIndex
+    :param dedupe: Emit structurally identical types once, see CsdlFile.build_csdl.
+    :type dedupe: bool
+    :param resolver: Resolver for the $ref values of JSON schema inputs.
+    :type resolver: csdl_refs.SchemaResolver
+    :param type_index: Index of a published CSDL bundle, see CsdlFile.
+    :type type_index: csdl_type_index.TypeIndex
+    :param sample: Number of members of each array to fold into its item shape, see fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see fold_items.
+    :type stable_after: int
+    """
+    def __init__(self, csv=None, dedupe=False, resolver=None, type_index=None, sample=None, stable_after=None):
+        import threading
+        self.csv_index = csv if isinstance(csv, CsvIndex) else CsvIndex(csv)
+        self.dedupe = dedupe
+        self.resolver = resolver
+        self.type_index = type_index
+        self.sample = sample
+        self.stable_after = stable_after
+        # The resolver memoizes into shared dictionaries while it expands a document
+        self._resolver_lock = threading.Lock()
+
+    def build(self, json_obj, csv=None):
+        """Returns the built CsdlFile for one annotated JSON document
+
+        :param json_obj: Annotated JSON mockup or JSON schema; it is not modified.
+        :type json_obj: dict
+        :param csv: Description rows for this document instead of the default ones.
+        :type csv: dict or CsvIndex
+        """
+        csv_index = self.csv_index if csv is None else csv
+        if "$schema" in json_obj:
+            with self._resolver_lock:
+                csdl = CsdlFile(json_obj, RESOURCE_PROPERTIES, csv=csv_index, resolver=self.resolver, type_index=self.type_index)
+        else:
+            csdl = CsdlFile(json_obj, RESOURCE_PROPERTIES, csv=csv_index, type_index=self.type_index, sample=self.sample,
+                            stable_after=self.stable_after)
+        csdl.init_csdl()
+        csdl.build_csdl(dedupe=self.dedupe)
+        return csdl
+
+    def generate(self, json_obj, csv=None):
+        """Returns the CSDL document for one annotated JSON document as UTF-8 bytes, header included
+
+        :param json_obj: Annotated JSON mockup or JSON schema; it is not modified.
+        :type json_obj: dict
+        :param csv: Description rows for this document instead of the default ones.
+        :type csv: dict or CsvIndex
+        """
+        return serialize_csdl(self.build(json_obj, csv)).encode()
+
+
 def main():
     """ Main function """
+    import json
+    import logging
+    import argparse
     argget = argparse.ArgumentParser(description='Builds a mostly complete CSDL file from an annotated JSON file and an optional CSV file.')
 
     # Create Tool Arguments
     argget.add_argument('json', type=str, help='file to process')
     argget.add_argument('--desc', type=str, default='No desc', help='sysdescription for identifying logs')
     argget.add_argument('--csv', type=str, help='csv file of helpful definitions for this file')
+    argget.add_argument('--descriptions', type=str, metavar='CATALOGUE', help='description catalogue compiled with csdl_descriptions.py, used instead of --csv')
     argget.add_argument('--toggle', action='store_true', help='print a csv report at the end of the log')
+    argget.add_argument('--report', type=str, help='write the --toggle report to this file instead (JSON if it ends in .json, CSV otherwise)')
+    argget.add_argument('--verbose', action='store_true', help='log debug information')
+    argget.add_argument('--cache-dir', type=str, default=None, help='directory of the generated schema cache (default: ~/.cache/redfish-schema-creator)')
+    argget.add_argument('--no-cache', action='store_true', help='always build the schema instead of reusing a cached copy')
+    argget.add_argument('--json-schema', action='store_true', help='also write the JSON Schema of the resource')
+    argget.add_argument('--schema-dir', type=str, help='directory of JSON schemas (e.g. an unpacked DSP8010 bundle) to resolve the $ref values of a JSON schema input against')
+    argget.add_argument('--csdl-dir', type=str, help='directory of published CSDL files (e.g. an unpacked DSP8010 bundle) to resolve Resource types, link targets and included namespaces against')
+    argget.add_argument('--bump', type=str, metavar='CSDL_FILE', help='add the next version of the schema to this published CSDL file, holding only the added or changed properties')
+    argget.add_argument('--dedupe', action='store_true', help='emit structurally identical complex and enum types once and report how many were collapsed')
+    argget.add_argument('--memory', action='store_true', help='trace memory with tracemalloc and add the peak and retained bytes of each stage to the --toggle report')
+    argget.add_argument('--sample', type=int, default=None, help='fold at most about this many evenly spaced members of each array into its item type (default: all)')
+    argget.add_argument('--stable-after', type=int, default=None, help='stop reading an array once this many members in a row added nothing to its item type')
 
     args = argget.parse_args()
 
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, format='%(levelname)s {}: %(message)s'.format(args.desc))
+
+    import csdl_cache
+    import csdl_report
+    report = csdl_report.StageReport(trace_memory=args.memory) if args.toggle or args.report or args.dedupe or args.memory else None
+    if args.memory:
+        import tracemalloc
+        tracemalloc.start()
+
     # Get File
     file_name = args.json
-    try:
-        with open(file_name) as fle:
-            file_data = fle.read()
-            json_data = json.loads(file_data)
-    except json.JSONDecodeError:
-        sys.stderr.write("Unable to parse JSON file supplied.")
-        return 1
-    except Exception:
-        sys.stderr.write("Problem getting file provided")
-        return 1
-    
-    csv_dict = {}
+    with (report or csdl_report.NULL_REPORT).stage('load'):
+        try:
+            with open(file_name) as fle:
+                json_data = json.load(fle)
+        except json.JSONDecodeError:
+            sys.stderr.write("Unable to parse JSON file supplied.")
+            return 1
+        except Exception:
+            sys.stderr.write("Problem getting file provided")
+            return 1
 
-    if args.csv:
-        with open(args.csv) as f:
-            csv_reader = csv.reader(f, delimiter='|')
-            for line in csv_reader:
-                csv_dict[line[0]] = line[1:]
-        print(csv_dict)
+        csv_dict = load_csv(args.csv) if args.csv else {}
+        if args.csv:
+            _debug("Loaded %d CSV rows from %s", len(csv_dict), args.csv)
+        elif args.descriptions:
+            import csdl_descriptions
+            csv_dict = csdl_descriptions.schema_descriptions(csdl_descriptions.DescriptionCatalogue(args.descriptions), json_data)
 
+    cache = None if args.no_cache else csdl_cache.CsdlCache(args.cache_dir)
+    resolver = None
+    if args.schema_dir:
+        import csdl_refs
+        resolver = csdl_refs.SchemaResolver(args.schema_dir)
+    type_index = None
+    if args.csdl_dir:
+        import csdl_type_index
+        with (report or csdl_report.NULL_REPORT).stage('type_index'):
+            type_index = csdl_type_index.TypeIndex.load(args.csdl_dir, args.cache_dir)
 
-    csdl = CsdlFile(json_data, RESOURCE_PROPERTIES, csv=csv_dict)
-    csdl.init_csdl()
-    csdl.build_csdl()
-    output_xml = csdl.name+'.xml'
-
-    with open(output_xml, 'w') as output:
-        xml_string = etree.tostring(csdl.main_csdl, encoding="unicode", method="xml")
-        xml_obj = xml.dom.minidom.parseString(xml_string)
-        xml_string = xml_obj.toprettyxml()
-
-        pretty_xml_as_string = xml_string
-        pretty_xml_as_string_new = ''
-
-        # input(pretty_xml_as_string)
-        # post process Annotations
-        priority_tags = ["xmlns", "xmlns:edmx", "Name", "Term", "Property", "Type", "Namespace", "EnumMember", "String", "Bool"]
-        for line in pretty_xml_as_string.split('\n'):
-            priority_tag_dict = {}
-            other_tags = []
-            allresults = re.findall('[a-zA-Z:]+?=".+?"', line)
-            tokened_line = re.sub('[a-zA-Z:]+?=".+?"', 'xxToken', line)
-            for tag in allresults:
-                tag_name, tag_content = tuple(tag.split('=', 1))
-                if tag_name not in priority_tags:
-                    other_tags.append(tag_name)
-                priority_tag_dict[tag_name] = tag
-
-            for tag_name in priority_tags + other_tags:
-                if tag_name in priority_tag_dict:
-                    tokened_line = tokened_line.replace('xxToken', priority_tag_dict[tag_name], 1)
-
-            tokened_line = tokened_line.replace('&quot;', '"')
-            pretty_xml_as_string_new += tokened_line + '\n'
-        output.write(CSDL_HEADER_TEMPLATE.format(csdl.name) + pretty_xml_as_string_new)
-    #csdl.csdl.getroottree().write(output_xml, xml_declaration=True, encoding="UTF-8", pretty_print=True)
+    if args.bump:
+        import csdl_version
+        namespace, changes = csdl_version.bump_version(json_data, args.bump, csv_dict, resolver=resolver, type_index=type_index)
+        if namespace is None:
+            print("No changes added to {}".format(args.bump))
+        else:
+            print("Added {} to {}".format(namespace, args.bump))
+        incompatible = []
+        for type_name, member, change in changes:
+            name = type_name if member is None else '{}.{}'.format(type_name, member)
+            if change == 'incompatible':
+                incompatible.append(name)
+            else:
+                print("  {} {}".format(change, name))
+        for name in incompatible:
+            sys.stderr.write("{}: changed type or permissions cannot be added to a new version\n".format(name))
+        return 1 if incompatible else 0
+
+    output_xml, cached = csdl_cache.write_schema(json_data, csv_dict, cache=cache, report=report, json_schema=args.json_schema, dedupe=args.dedupe,
+                                                 resolver=resolver, type_index=type_index, sample=args.sample, stable_after=args.stable_after)
+    _debug("Wrote %s%s", output_xml, " from the cache" if cached else "")
+
+    if args.dedupe and not cached:
+        print("Collapsed {} duplicate types".format(len(report.collapsed)))
+        for key, type_name in report.collapsed:
+            print("  {} -> {}".format(key, type_name))
+
+    if args.toggle or args.report or args.memory:
+        report.cached = cached
+        report.write(args.report)
 
     return 0
 
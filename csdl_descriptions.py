@@ -0,0 +1,147 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import csv
+import json
+import sqlite3
+import argparse
+import threading
+import csdl_creator
+
+SCHEMA = '''
+CREATE TABLE descriptions (
+    schema TEXT NOT NULL,
+    path TEXT NOT NULL,
+    description TEXT,
+    long_description TEXT,
+    enum_descriptions TEXT,
+    PRIMARY KEY (schema, path)
+) WITHOUT ROWID
+'''
+
+
+def compile_catalogue(db_file, csv_files):
+    """Compiles pipe delimited description files into a SQLite catalogue
+
+    The rows of each file are stored under the schema named by the file, e.g. Chassis for
+    Chassis.csv. The catalogue is built next to db_file and then replaces it, so readers of an
+    older catalogue are not disturbed.
+
+    :param db_file: Catalogue file to write.
+    :type db_file: str
+    :param csv_files: Description files to compile.
+    :type csv_files: list
+    :returns: Number of rows stored.
+    """
+    tmp_file = '{}.{}.tmp'.format(db_file, os.getpid())
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    count = 0
+    connection = sqlite3.connect(tmp_file)
+    try:
+        connection.execute(SCHEMA)
+        for csv_file in csv_files:
+            schema = os.path.splitext(os.path.basename(csv_file))[0]
+            with open(csv_file) as fle:
+                rows = [(schema, line[0], line[1] if len(line) > 1 else None, line[2] if len(line) > 2 else None, json.dumps(line[3:]))
+                        for line in csv.reader(fle, delimiter='|') if line]
+            connection.executemany('INSERT OR REPLACE INTO descriptions VALUES (?, ?, ?, ?, ?)', rows)
+            count += len(rows)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_file, db_file)
+    return count
+
+
+class DescriptionCatalogue:
+    """Read-only view of a compiled description catalogue
+
+    Rows are looked up one path at a time as database_builder asks for them, so memory does not
+    grow with the size of the catalogue. The connection is opened read-only; any number of
+    processes can read the same file, and one catalogue may be shared by threads.
+
+    :param db_file: Catalogue written by compile_catalogue.
+    :type db_file: str
+    """
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._connection = sqlite3.connect('file:{}?mode=ro'.format(db_file), uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._connection.close()
+
+    def index(self, schema):
+        """Returns the description index of one schema, e.g. Chassis, for database_builder"""
+        return DescriptionIndex(self, schema, '')
+
+    def row(self, schema, path):
+        """Returns the description row of a property path in the CSV layout, None if there is none"""
+        with self._lock:
+            found = self._connection.execute('SELECT description, long_description, enum_descriptions FROM descriptions WHERE schema = ? AND path = ?',
+                                             (schema, path)).fetchone()
+        if found is None:
+            return None
+        description, long_description, enum_descriptions = found
+        return [description, long_description] + json.loads(enum_descriptions)
+
+    def has_children(self, schema, path):
+        """Returns True if the catalogue has rows below a property path"""
+        if not path:
+            query, parameters = 'SELECT 1 FROM descriptions WHERE schema = ? LIMIT 1', (schema,)
+        else:
+            # '0' follows '/', so the range holds exactly the paths starting with path + '/'
+            query, parameters = 'SELECT 1 FROM descriptions WHERE schema = ? AND path > ? AND path < ? LIMIT 1', (schema, path + '/', path + '0')
+        with self._lock:
+            found = self._connection.execute(query, parameters).fetchone()
+        return found is not None
+
+
+class DescriptionIndex(csdl_creator.CsvIndex):
+    """CsvIndex over a DescriptionCatalogue; each node queries its row only when asked for it"""
+    __slots__ = ('catalogue', 'schema', 'path', '_row')
+
+    def __init__(self, catalogue, schema, path):
+        self.catalogue = catalogue
+        self.schema = schema
+        self.path = path
+        self._row = False
+
+    @property
+    def row(self):
+        if self._row is False:
+            self._row = self.catalogue.row(self.schema, self.path) if self.path else None
+        return self._row
+
+    @property
+    def children(self):
+        return self.catalogue.has_children(self.schema, self.path)
+
+    def child(self, segment):
+        return DescriptionIndex(self.catalogue, self.schema, '{}/{}'.format(self.path, segment) if self.path else segment)
+
+
+def schema_descriptions(catalogue, json_data):
+    """Returns the description index of the schema json_data describes"""
+    return catalogue.index(csdl_creator.get_schema_name(json_data).split('.')[0])
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Compiles CSV description files into a SQLite catalogue; each file holds the descriptions of the schema it is named after.')
+
+    argget.add_argument('catalogue', type=str, help='catalogue file to write')
+    argget.add_argument('csv', type=str, nargs='+', help='csv files of descriptions, e.g. Chassis.csv')
+
+    args = argget.parse_args()
+
+    count = compile_catalogue(args.catalogue, args.csv)
+    print("Compiled {} descriptions from {} files into {}".format(count, len(args.csv), args.catalogue))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,374 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import ssl
+import json
+import base64
+import asyncio
+import argparse
+import urllib.parse
+
+# Concurrent requests across the whole crawl, i.e. the total number of open connections
+DEFAULT_CONNECTIONS = 16
+
+# Concurrent requests, and open connections, per host
+DEFAULT_PER_HOST = 8
+
+# Seconds allowed for one request once it has a connection, connecting included
+DEFAULT_TIMEOUT = 30.0
+
+SERVICE_ROOT = '/redfish/v1'
+
+
+class HarvestError(Exception):
+    """Raised for a resource that could not be fetched or parsed"""
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise asyncio.IncompleteReadError(b''.join(chunks), None)
+        size = int(size_line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # Trailer section, ended by an empty line
+    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+        pass
+    return b''.join(chunks)
+
+
+async def read_response(reader):
+    """Reads one HTTP/1.1 response
+
+    :returns: Tuple of the status code, a dictionary of lower case header names to values, the
+        body and whether the connection can be reused.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by the server")
+    parts = status_line.decode('latin-1').split(None, 2)
+    version, status = parts[0], int(parts[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _sep, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+    if status in (204, 304) or 100 <= status < 200:
+        body = b''
+    elif 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = await _read_chunked(reader)
+    elif 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    else:
+        # Delimited by the end of the connection
+        body = await reader.read()
+        keep_alive = False
+    return status, headers, body, keep_alive
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one host, with at most limit requests (and connections) at a time
+
+    :param host: Host name or address.
+    :param port: TCP port.
+    :param ssl_context: SSL context for HTTPS, None for plain HTTP.
+    :param limit: Maximum number of concurrent requests to the host.
+    :param headers: Extra request headers, e.g. Authorization.
+    """
+    def __init__(self, host, port, ssl_context=None, limit=DEFAULT_PER_HOST, headers=None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.headers = dict(headers or {})
+        self.opened = 0
+        self._idle = []
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def _open(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+
+    def _request_bytes(self, path):
+        host = self.host if self.port in (80, 443) else '{}:{}'.format(self.host, self.port)
+        lines = ['GET {} HTTP/1.1'.format(path), 'Host: {}'.format(host), 'Accept: application/json', 'Connection: keep-alive']
+        lines += ['{}: {}'.format(name, value) for name, value in self.headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def get(self, path, timeout=None):
+        """Sends a GET for path and returns the status, headers and body of the response
+
+        A request on a reused connection that the server closed while idle is retried once on a
+        new connection. The timeout starts once the request has a connection slot.
+        """
+        async with self._semaphore:
+            return await asyncio.wait_for(self._get(path), timeout)
+
+    async def _get(self, path):
+        for attempt in range(2):
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._open()
+            try:
+                writer.write(self._request_bytes(path))
+                await writer.drain()
+                status, headers, body, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, headers, body
+
+    async def close(self):
+        while self._idle:
+            _reader, writer = self._idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+
+def find_links(payload, links=None):
+    """Returns the @odata.id values of every object nested in payload, in document order"""
+    links = [] if links is None else links
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            if key == '@odata.id' and isinstance(value, str):
+                links.append(value)
+            elif isinstance(value, (dict, list)):
+                find_links(value, links)
+    elif isinstance(payload, list):
+        for value in payload:
+            find_links(value, links)
+    return links
+
+
+class Harvester:
+    """Crawls a Redfish service by following @odata.id links from the service root
+
+    :param url: Base URL of the service, e.g. https://bmc.example.com; a path other than the
+        service root starts the crawl there.
+    :param connections: Maximum number of concurrent requests in total.
+    :param per_host: Maximum number of concurrent requests to one host.
+    :param username: User name for HTTP basic authentication.
+    :param password: Password for HTTP basic authentication.
+    :param ssl_context: SSL context for HTTPS; None uses the default verifying context.
+    :param timeout: Seconds allowed for one request.
+    :param max_resources: Stop following links after this many resources; None crawls everything.
+    """
+    def __init__(self, url, connections=DEFAULT_CONNECTIONS, per_host=DEFAULT_PER_HOST, username=None, password=None,
+                 ssl_context=None, timeout=DEFAULT_TIMEOUT, max_resources=None):
+        parts = urllib.parse.urlsplit(url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.root = parts.path.rstrip('/') or SERVICE_ROOT
+        self.connections = connections
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_resources = max_resources
+        self.ssl_context = ssl_context if ssl_context is not None or self.scheme != 'https' else ssl.create_default_context()
+        self.headers = {}
+        if username is not None:
+            credentials = base64.b64encode('{}:{}'.format(username, password or '').encode()).decode()
+            self.headers['Authorization'] = 'Basic ' + credentials
+        self.pools = {}
+        self.payloads = {}
+        self.errors = []
+
+    def normalize(self, link):
+        """Returns the path of a link to this service without fragment or trailing slash, None for other links"""
+        parts = urllib.parse.urlsplit(link)
+        if parts.fragment or (parts.hostname and (parts.hostname, parts.port or self.port) != (self.host, self.port)):
+            return None
+        path = parts.path.rstrip('/')
+        if not path.startswith(SERVICE_ROOT):
+            return None
+        return path
+
+    def pool(self):
+        key = (self.host, self.port)
+        if key not in self.pools:
+            self.pools[key] = ConnectionPool(self.host, self.port, self.ssl_context if self.scheme == 'https' else None, self.per_host, self.headers)
+        return self.pools[key]
+
+    async def fetch(self, path):
+        """Returns the JSON payload of the resource at path"""
+        status, _headers, body = await self.pool().get(path, self.timeout)
+        if status != 200:
+            raise HarvestError("HTTP status {}".format(status))
+        try:
+            payload = json.loads(body)
+        except ValueError as err:
+            raise HarvestError("Unable to parse JSON: {}".format(err))
+        if not isinstance(payload, dict):
+            raise HarvestError("Payload is not a JSON object")
+        return payload
+
+    async def _worker(self, queue, seen):
+        while True:
+            path = await queue.get()
+            try:
+                payload = await self.fetch(path)
+                self.payloads[path] = payload
+                for link in find_links(payload):
+                    link = self.normalize(link)
+                    if link is not None and link not in seen and (self.max_resources is None or len(seen) < self.max_resources):
+                        seen.add(link)
+                        queue.put_nowait(link)
+            except Exception as err:
+                self.errors.append((path, "{}: {}".format(type(err).__name__, err)))
+            finally:
+                queue.task_done()
+
+    async def run(self):
+        """Crawls the service
+
+        :returns: Tuple of a dictionary of resource path to payload and a list of (path, error) pairs.
+        """
+        queue = asyncio.Queue()
+        seen = {self.root}
+        queue.put_nowait(self.root)
+        workers = [asyncio.ensure_future(self._worker(queue, seen)) for _worker in range(self.connections)]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for pool in self.pools.values():
+                await pool.close()
+        return self.payloads, self.errors
+
+
+def schema_link(odata_type):
+    """Returns the schema name used in !link annotations for an @odata.type, e.g. Chassis for #Chassis.v1_14_0.Chassis"""
+    return odata_type.rsplit('.', 1)[-1]
+
+
+def _link_target(value, types):
+    """Returns the schema name of the resource a link object points to, None if value is not a link object"""
+    if isinstance(value, dict) and '@odata.id' in value and all(key.startswith('@') for key in value):
+        return types.get(urllib.parse.urlsplit(value['@odata.id']).path.rstrip('/'))
+    return None
+
+
+def annotate_links(payload, types):
+    """Returns a copy of payload with a ``!link`` annotation for every link to a harvested resource
+
+    :param types: Dictionary of resource path to its schema name.
+    """
+    annotated = {}
+    for key, value in payload.items():
+        if isinstance(value, list):
+            target = next((t for t in (_link_target(v, types) for v in value) if t), None)
+            value = [annotate_links(v, types) if isinstance(v, dict) and not _link_target(v, types) else v for v in value]
+        else:
+            target = _link_target(value, types)
+            if isinstance(value, dict) and target is None:
+                value = annotate_links(value, types)
+        annotated[key] = value
+        if target is not None and '!' not in key and '@' not in key and key + '!link' not in payload:
+            annotated[key + '!link'] = target
+    return annotated
+
+
+def build_mockups(payloads):
+    """Returns one annotated mockup per @odata.type, from the resource with the lowest path
+
+    :param payloads: Dictionary of resource path to payload, as returned by Harvester.run.
+    :returns: Dictionary of @odata.type to mockup, sorted by type.
+    """
+    types = {}
+    chosen = {}
+    for path in sorted(payloads):
+        odata_type = payloads[path].get('@odata.type')
+        if not isinstance(odata_type, str):
+            continue
+        types[path] = schema_link(odata_type)
+        chosen.setdefault(odata_type, path)
+    return {odata_type: annotate_links(payloads[chosen[odata_type]], types) for odata_type in sorted(chosen)}
+
+
+def mockup_file_name(odata_type):
+    """Returns the file a mockup is written to, e.g. Chassis.v1_14_0.json for #Chassis.v1_14_0.Chassis"""
+    return odata_type.lstrip('#').rsplit('.', 1)[0] + '.json'
+
+
+def harvest(url, **kwargs):
+    """Crawls a Redfish service and returns one mockup per @odata.type; see Harvester for the options
+
+    :returns: Tuple of a dictionary of @odata.type to mockup and a list of (path, error) pairs.
+    """
+    payloads, errors = asyncio.run(Harvester(url, **kwargs).run())
+    return build_mockups(payloads), errors
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Crawls a Redfish service and writes one annotated JSON mockup, or CSDL file, per resource type.')
+
+    argget.add_argument('url', type=str, help='URL of the service, e.g. https://192.168.1.100')
+    argget.add_argument('--output', type=str, default='.', help='directory to write the mockups or CSDL files to')
+    argget.add_argument('--user', type=str, help='user name for basic authentication')
+    argget.add_argument('--password', type=str, help='password for basic authentication')
+    argget.add_argument('--insecure', action='store_true', help='do not verify the certificate of an HTTPS service')
+    argget.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help='maximum number of concurrent requests')
+    argget.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST, help='maximum number of concurrent requests to one host')
+    argget.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds allowed for one request')
+    argget.add_argument('--max-resources', type=int, default=None, help='stop following links after this many resources')
+    argget.add_argument('--generate', action='store_true', help='write CSDL files generated from the mockups instead of the mockups')
+    argget.add_argument('--csv', type=str, help='csv file of helpful definitions used with --generate')
+
+    args = argget.parse_args()
+
+    ssl_context = None
+    if args.insecure:
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+
+    mockups, errors = harvest(args.url, connections=args.connections, per_host=args.per_host, username=args.user, password=args.password,
+                              ssl_context=ssl_context, timeout=args.timeout, max_resources=args.max_resources)
+    for path, error in errors:
+        sys.stderr.write("{}: {}\n".format(path, error))
+
+    os.makedirs(args.output, exist_ok=True)
+    if args.generate:
+        import csdl_cache
+        import csdl_creator
+        csv_index = csdl_creator.CsvIndex(csdl_creator.load_csv(args.csv) if args.csv else {})
+        for odata_type, mockup in mockups.items():
+            try:
+                csdl_cache.write_schema(mockup, csv_index, args.output)
+            except Exception as err:
+                errors.append((odata_type, err))
+                sys.stderr.write("{}: {}: {}\n".format(odata_type, type(err).__name__, err))
+    else:
+        for odata_type, mockup in mockups.items():
+            with open(os.path.join(args.output, mockup_file_name(odata_type)), 'w') as output:
+                json.dump(mockup, output, indent=4)
+
+    print("Harvested {} resource types into {}".format(len(mockups), args.output))
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import json
+import hashlib
+import urllib.parse
+
+# Name under which a document without an $id is registered, followed by its title
+INPUT_DOCUMENT = '<input>'
+
+
+def document_name(uri):
+    """Returns the file name a schema URI refers to, e.g. Resource.json for http://redfish.dmtf.org/schemas/v1/Resource.json"""
+    return os.path.basename(urllib.parse.urlsplit(uri).path)
+
+
+class SchemaResolver:
+    """Resolves JSON schema $ref values against a local directory of schemas, e.g. an unpacked DSP8010 bundle
+
+    One resolver is meant to be shared by every file of a run: each referenced document is parsed
+    once, each definition is resolved once, and schema_database keeps the property database of
+    every expanded definition in self.databases.
+
+    :param schema_dir: Directory searched (recursively) for referenced files by file name; None
+        resolves references within the input document only.
+    :type schema_dir: str
+    """
+    def __init__(self, schema_dir=None):
+        self.schema_dir = schema_dir
+        self.documents = {}
+        # Content digest of every document registered with add_document
+        self._digests = {}
+        self.parsed = []
+        self.databases = {}
+        self._resolved = {}
+        self._resolving = set()
+        self._files = None
+        self._fingerprint = None
+
+    def _index(self):
+        if self._files is None:
+            self._files = {}
+            if self.schema_dir:
+                for root, _dirs, files in os.walk(self.schema_dir):
+                    for file_name in files:
+                        if file_name.endswith('.json'):
+                            self._files.setdefault(file_name, os.path.join(root, file_name))
+        return self._files
+
+    def fingerprint(self):
+        """Returns a digest of the names, sizes and modification times of the schema files"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for file_name, path in sorted(self._index().items()):
+                stat = os.stat(path)
+                digest.update('{}:{}:{}\n'.format(file_name, stat.st_size, stat.st_mtime_ns).encode())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def add_document(self, document):
+        """Registers an already parsed document, normally the input, and returns its name
+
+        The document always replaces one registered earlier under the same name, e.g. an edited
+        input; when its content differs, the definitions and databases resolved so far are dropped,
+        as they may refer to the old content.
+        """
+        if isinstance(document.get('$id'), str):
+            name = document_name(document['$id'])
+        else:
+            name = '{}{}'.format(INPUT_DOCUMENT, document.get('title', len(self.documents)))
+        digest = hashlib.sha256(json.dumps(document, sort_keys=True, default=str).encode()).hexdigest()
+        if name in self.documents:
+            # A file parsed from the bundle has no digest; it changed if its content differs
+            changed = self._digests[name] != digest if name in self._digests else self.documents[name] != document
+            if changed:
+                self._resolved.clear()
+                self.databases.clear()
+        self.documents[name] = document
+        self._digests[name] = digest
+        return name
+
+    def document(self, name):
+        """Returns the parsed document of a file name, None if the bundle does not have it"""
+        if name not in self.documents:
+            path = self._index().get(name)
+            document = None
+            if path is not None:
+                with open(path) as fle:
+                    document = json.load(fle)
+                self.parsed.append(name)
+            self.documents[name] = document
+        return self.documents[name]
+
+    def resolve_ref(self, name, pointer):
+        """Returns the definition at pointer in document name with every $ref and anyOf followed
+
+        :returns: Tuple of the definition, the document it belongs to and its (document, pointer)
+            key, or None if the reference cannot be resolved.
+        """
+        key = (name, pointer)
+        if key in self._resolved:
+            return self._resolved[key]
+        if key in self._resolving:
+            # A reference chain that leads back to itself without defining anything
+            return None
+        target = self.document(name)
+        for segment in pointer.strip('/').split('/') if pointer.strip('/') else ():
+            segment = urllib.parse.unquote(segment).replace('~1', '/').replace('~0', '~')
+            target = target.get(segment) if isinstance(target, dict) else None
+        result = None
+        if isinstance(target, dict):
+            self._resolving.add(key)
+            try:
+                descriptors, base, resolved_key = self.resolve(target, name)
+            finally:
+                self._resolving.discard(key)
+            result = (descriptors, base, resolved_key or key)
+        self._resolved[key] = result
+        return result
+
+    def resolve(self, descriptors, base):
+        """Follows the $ref or anyOf of a property descriptor
+
+        Members next to a $ref or anyOf (description, readonly, ...) override those of the
+        referenced definition. Of an anyOf, the last member that is not null is used; in Redfish
+        schemas that is the newest version of the type.
+
+        :param descriptors: Property descriptor.
+        :param base: Name of the document the descriptor belongs to.
+        :returns: Tuple of the resolved descriptor, its document and its (document, pointer) key,
+            None for a descriptor that is not a reference.
+        """
+        if isinstance(descriptors.get("$ref"), str):
+            uri, _sep, pointer = descriptors["$ref"].partition('#')
+            resolved = self.resolve_ref(document_name(uri) if uri else base, pointer)
+        elif isinstance(descriptors.get("anyOf"), list):
+            members = [m for m in descriptors["anyOf"] if isinstance(m, dict) and m.get("type") != "null"]
+            resolved = self.resolve(members[-1], base) if members else None
+        else:
+            return descriptors, base, None
+        if resolved is None:
+            return descriptors, base, None
+        target, target_base, key = resolved
+        merged = dict(target)
+        merged.update((k, v) for k, v in descriptors.items() if k not in ("$ref", "anyOf"))
+        return merged, target_base, key
@@ -0,0 +1,135 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import sys
+import json
+import time
+import contextlib
+import tracemalloc
+
+# Element tags counted in the report, by report name
+COUNTED_ELEMENTS = {
+    'Property': 'Property',
+    'ComplexType': 'ComplexType',
+    'EnumType': 'EnumType',
+    'NavigationProperty': 'NavigationProperty',
+    'Reference': 'edmx:Reference',
+}
+
+
+class StageReport:
+    """Wall time and allocation counts per generation stage, plus counts of the emitted elements
+
+    Allocation counts are the change in the number of memory blocks held by the interpreter
+    (sys.getallocatedblocks) across a stage, i.e. what the stage left allocated.
+
+    With trace_memory, and while tracemalloc is tracing, each stage also records its peak bytes
+    (the highest traced memory during the stage above what was traced when it started) and its
+    retained bytes (what it left traced), and top_sites > 0 records the source lines that retained
+    the most, from snapshots taken around the stage.
+
+    :param trace_memory: Record peak and retained bytes per stage.
+    :type trace_memory: bool
+    :param top_sites: Number of retaining source lines to record per stage.
+    :type top_sites: int
+    """
+    def __init__(self, trace_memory=False, top_sites=0):
+        self.trace_memory = trace_memory
+        self.top_sites = top_sites
+        # Stage name to a list of (file:line, retained bytes) pairs
+        self.sites = {}
+        self.stages = []
+        self.counts = {}
+        self.cached = False
+        # (property, type) pairs redirected to an identical type emitted earlier, see CsdlFile.build_csdl
+        self.collapsed = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager recording one stage"""
+        traced = self.trace_memory and tracemalloc.is_tracing()
+        snapshot = None
+        if traced:
+            if self.top_sites:
+                snapshot = tracemalloc.take_snapshot()
+            traced_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            blocks = sys.getallocatedblocks() - blocks
+            peak = retained = None
+            if traced:
+                current, peak = tracemalloc.get_traced_memory()
+                peak, retained = peak - traced_bytes, current - traced_bytes
+                if snapshot is not None:
+                    differences = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+                    self.sites[name] = [('{}:{}'.format(diff.traceback[0].filename, diff.traceback[0].lineno), diff.size_diff)
+                                        for diff in differences[:self.top_sites]]
+            self.stages.append((name, seconds, blocks, peak, retained))
+
+    def count_elements(self, root):
+        """Counts the emitted CSDL elements of a built document"""
+        by_tag = {}
+        for elem in root.iter():
+            by_tag[elem.tag] = by_tag.get(elem.tag, 0) + 1
+        for name, tag in COUNTED_ELEMENTS.items():
+            self.counts[name] = by_tag.get(tag, 0)
+
+    def stage_peaks(self):
+        """Returns a dictionary of stage name to its peak traced bytes, for stages traced with trace_memory"""
+        return {stage[0]: stage[3] for stage in self.stages if stage[3] is not None}
+
+    def as_dict(self):
+        stages = []
+        for name, seconds, blocks, peak, retained in self.stages:
+            stage = {"name": name, "seconds": seconds, "allocated_blocks": blocks}
+            if self.trace_memory:
+                stage.update({"peak_bytes": peak, "retained_bytes": retained})
+                if name in self.sites:
+                    stage["retained_by"] = [{"site": site, "bytes": size} for site, size in self.sites[name]]
+            stages.append(stage)
+        return {"cached": self.cached, "stages": stages, "counts": dict(self.counts)}
+
+    def write_csv(self, out):
+        import csv
+        writer = csv.writer(out, lineterminator='\n')
+        memory = ['peak_bytes', 'retained_bytes'] if self.trace_memory else []
+        writer.writerow(['name', 'seconds', 'allocated_blocks', 'count'] + memory)
+        for name, seconds, blocks, peak, retained in self.stages:
+            writer.writerow([name, '{:.6f}'.format(seconds), blocks, ''] + ([peak, retained] if memory else []))
+        for name, count in self.counts.items():
+            writer.writerow([name, '', '', count] + ['' for _column in memory])
+
+    def write_json(self, out):
+        json.dump(self.as_dict(), out, indent=4)
+        out.write('\n')
+
+    def write(self, file_name=None):
+        """Writes the report to file_name (JSON if it ends in .json, CSV otherwise) or as CSV to stdout"""
+        if file_name is None:
+            self.write_csv(sys.stdout)
+            return
+        with open(file_name, 'w', newline='') as out:
+            if file_name.endswith('.json'):
+                self.write_json(out)
+            else:
+                self.write_csv(out)
+
+
+class _NullReport:
+    """Stand-in used when no report is requested"""
+    cached = False
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def count_elements(self, root):
+        pass
+
+
+NULL_REPORT = _NullReport()
@@ -0,0 +1,144 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import io
+import re
+
+CSDL_HEADER_TEMPLATE = """<!---->
+<!--################################################################################       -->
+<!--# Redfish Schema:  {}                                          -->
+<!--#                                                                                      -->
+<!--# For a detailed change log, see the README file contained in the DSP8010 bundle,      -->
+<!--# available at http://www.dmtf.org/standards/redfish                                   -->
+<!--# Copyright 2020 DMTF.                                                                 -->
+<!--# For the full DMTF copyright policy, see http://www.dmtf.org/about/policies/copyright -->
+<!--################################################################################       -->
+<!---->
+"""
+
+# Attributes written first, in this order; all others follow in document order
+PRIORITY_ATTRIBUTES = ["xmlns", "xmlns:edmx", "Name", "Term", "Property", "Type", "Namespace", "EnumMember", "String", "Bool"]
+
+XML_DECLARATION = '<?xml version="1.0" ?>\n'
+
+# Attribute names and values the single pass writer reproduces exactly; anything else goes through legacy_serialize
+_PLAIN_ATTRIBUTE_NAME = re.compile('[a-zA-Z:]+')
+_CONTROL_CHARACTERS = re.compile('[\x00-\x1f]')
+
+_attribute_orders = {}
+
+
+def _attribute_order(names):
+    """Returns the attribute names of one element in canonical order, cached per distinct name tuple"""
+    order = _attribute_orders.get(names)
+    if order is None:
+        order = tuple([n for n in PRIORITY_ATTRIBUTES if n in names] + [n for n in names if n not in PRIORITY_ATTRIBUTES])
+        _attribute_orders[names] = order
+    return order
+
+
+def _escape(value):
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    return value
+
+
+def _format_attributes(attrib):
+    if not attrib:
+        return ''
+    return ' ' + ' '.join(['{}="{}"'.format(n, _escape(attrib[n])) for n in _attribute_order(tuple(attrib))])
+
+
+def _needs_legacy(root):
+    """Checks for content (text, comments, unusual attributes) that only the legacy pipeline formats faithfully"""
+    for elem in root.iter():
+        if not isinstance(elem.tag, str) or elem.text or elem.tail or 'xxToken' in elem.tag:
+            return True
+        for key, value in elem.attrib.items():
+            if not isinstance(value, str) or not value or 'xxToken' in value or\
+                    not _PLAIN_ATTRIBUTE_NAME.fullmatch(key) or _CONTROL_CHARACTERS.search(value):
+                return True
+    return False
+
+
+def legacy_serialize(root):
+    """Formats a tree with the original tostring, minidom and regex reordering pipeline
+
+    Kept as the reference implementation of the output format and as the fallback for trees
+    the single pass writer does not handle.
+    """
+    import xml.dom.minidom
+    import xml.etree.ElementTree as etree
+
+    xml_string = etree.tostring(root, encoding="unicode", method="xml")
+    pretty_xml_as_string = xml.dom.minidom.parseString(xml_string).toprettyxml()
+
+    lines = []
+    for line in pretty_xml_as_string.split('\n'):
+        priority_tag_dict = {}
+        other_tags = []
+        allresults = re.findall('[a-zA-Z:]+?=".+?"', line)
+        tokened_line = re.sub('[a-zA-Z:]+?=".+?"', 'xxToken', line)
+        for tag in allresults:
+            tag_name, tag_content = tuple(tag.split('=', 1))
+            if tag_name not in PRIORITY_ATTRIBUTES:
+                other_tags.append(tag_name)
+            priority_tag_dict[tag_name] = tag
+
+        for tag_name in PRIORITY_ATTRIBUTES + other_tags:
+            if tag_name in priority_tag_dict:
+                tokened_line = tokened_line.replace('xxToken', priority_tag_dict[tag_name], 1)
+
+        lines.append(tokened_line.replace('&quot;', '"'))
+    return '\n'.join(lines) + '\n'
+
+
+def write_csdl(root, name, out):
+    """Writes the formatted CSDL document, header included, to a text stream in a single pass
+
+    :param root: The edmx:Edmx element of the document.
+    :type root: xml.etree.ElementTree.Element
+    :param name: Schema name placed in the header comment.
+    :type name: str
+    :param out: Text stream receiving the document.
+    """
+    if _needs_legacy(root):
+        out.write(CSDL_HEADER_TEMPLATE.format(name) + legacy_serialize(root))
+        return
+
+    out.write(CSDL_HEADER_TEMPLATE.format(name))
+    out.write(XML_DECLARATION)
+    write_element(root, out)
+    out.write('\n')
+
+
+def write_element(root, out, indent=''):
+    """Writes one element and its children in the format of write_csdl, starting at the given indent"""
+    write = out.write
+    # Closing tags are pushed as plain strings between an element and its children
+    stack = [(root, indent)]
+    while stack:
+        elem, indent = stack.pop()
+        if isinstance(elem, str):
+            write(elem)
+            continue
+        line = indent + '<' + elem.tag + _format_attributes(elem.attrib)
+        if len(elem):
+            write(line + '>\n')
+            stack.append((indent + '</' + elem.tag + '>\n', None))
+            child_indent = indent + '\t'
+            stack.extend([(child, child_indent) for child in reversed(elem)])
+        else:
+            write(line + '/>\n')
+
+
+def csdl_to_string(root, name):
+    """Returns the formatted CSDL document, header included, as a string"""
+    buffer = io.StringIO()
+    write_csdl(root, name, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,266 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import csv
+import json
+import time
+import bisect
+import hashlib
+import argparse
+import threading
+import collections
+import concurrent.futures
+import http.server
+import csdl_creator
+
+DEFAULT_CACHE_ENTRIES = 1024
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+
+class GenerationError(Exception):
+    """Raised for a request body that does not describe a schema"""
+
+
+def parse_request(body):
+    """Returns the annotated JSON and description rows of a request body
+
+    The body is either the annotated JSON itself or an object ``{"mockup": ..., "csv": ...}``
+    whose csv member holds the text of a pipe delimited description file.
+    """
+    try:
+        json_data = json.loads(body)
+    except ValueError as err:
+        raise GenerationError("Unable to parse JSON body: {}".format(err))
+    if not isinstance(json_data, dict):
+        raise GenerationError("JSON body is not an object")
+    csv_dict = {}
+    if 'mockup' in json_data and '@odata.type' not in json_data and '$schema' not in json_data:
+        csv_text = json_data.get('csv') or ''
+        for line in csv.reader(csv_text.splitlines(), delimiter='|'):
+            if line:
+                csv_dict[line[0]] = line[1:]
+        json_data = json_data['mockup']
+        if not isinstance(json_data, dict):
+            raise GenerationError("mockup is not an object")
+    return json_data, csv_dict
+
+
+def generate(body):
+    """Worker task; returns the schema name and encoded CSDL document generated for a request body"""
+    json_data, csv_dict = parse_request(body)
+    try:
+        name, text = csdl_creator.generate_csdl(json_data, csv_dict)
+    except Exception as err:
+        raise GenerationError("{}: {}".format(type(err).__name__, err))
+    return name, text.encode()
+
+
+def _warm_worker():
+    """Process pool initializer; imports and exercises the generator once so the first request is not cold"""
+    generate(b'{"@odata.type": "#Warm.v1_0_0.Warm", "Name": "Warm", "Status": {"State": "Enabled | Disabled"}}')
+
+
+class ResultCache:
+    """Bounded LRU of generated schemas keyed by the hash of the request body"""
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Metrics:
+    """Request counters and latency histogram, rendered in the Prometheus text format"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = collections.Counter()
+        self.hits = 0
+        self.misses = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def observe(self, status, seconds, hit=None):
+        with self._lock:
+            self.requests[status] += 1
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            self.latency_sum += seconds
+            if hit is True:
+                self.hits += 1
+            elif hit is False:
+                self.misses += 1
+
+    def render(self, cache_entries=0):
+        with self._lock:
+            lines = ['# TYPE csdl_requests_total counter']
+            lines += ['csdl_requests_total{{status="{}"}} {}'.format(status, count) for status, count in sorted(self.requests.items())]
+            lines.append('# TYPE csdl_request_seconds histogram')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), self.buckets):
+                cumulative += count
+                lines.append('csdl_request_seconds_bucket{{le="{}"}} {}'.format(bound, cumulative))
+            lines.append('csdl_request_seconds_sum {:.6f}'.format(self.latency_sum))
+            lines.append('csdl_request_seconds_count {}'.format(cumulative))
+            lookups = self.hits + self.misses
+            lines += [
+                '# TYPE csdl_cache_hits_total counter', 'csdl_cache_hits_total {}'.format(self.hits),
+                '# TYPE csdl_cache_misses_total counter', 'csdl_cache_misses_total {}'.format(self.misses),
+                '# TYPE csdl_cache_hit_ratio gauge', 'csdl_cache_hit_ratio {:.6f}'.format(self.hits / lookups if lookups else 0.0),
+                '# TYPE csdl_cache_entries gauge', 'csdl_cache_entries {}'.format(cache_entries),
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+class GenerationHandler(http.server.BaseHTTPRequestHandler):
+    """Serves ``POST /generate`` and ``GET /metrics``"""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle the body waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=None):
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, self.server.metrics.render(len(self.server.cache)), 'text/plain; version=0.0.4')
+        else:
+            self._send(404, 'Not found\n', 'text/plain')
+
+    def do_POST(self):
+        start = time.perf_counter()
+        if self.path != '/generate':
+            self._send(404, 'Not found\n', 'text/plain')
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The end of the body is unknown, so the connection cannot be reused
+            self.close_connection = True
+            self._send(400, 'Invalid Content-Length\n', 'text/plain')
+            self.server.metrics.observe(400, time.perf_counter() - start)
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413, 'Request body too large\n', 'text/plain')
+            self.server.metrics.observe(413, time.perf_counter() - start)
+            return
+        body = self.rfile.read(length)
+
+        key = hashlib.sha256(body).hexdigest()
+        result = self.server.cache.get(key)
+        hit = result is not None
+        try:
+            if not hit:
+                result = self.server.submit(body)
+                self.server.cache.put(key, result)
+        except GenerationError as err:
+            self._send(400, '{}\n'.format(err), 'text/plain')
+            self.server.metrics.observe(400, time.perf_counter() - start, hit)
+            return
+        except Exception as err:
+            # e.g. BrokenProcessPool when a worker died
+            self.log_error("Generation failed: %s: %s", type(err).__name__, err)
+            self._send(500, 'Generation failed: {}\n'.format(type(err).__name__), 'text/plain')
+            self.server.metrics.observe(500, time.perf_counter() - start, hit)
+            return
+        name, text = result
+        self._send(200, text, 'application/xml', {'X-Schema-Name': name, 'X-Cache': 'hit' if hit else 'miss'})
+        self.server.metrics.observe(200, time.perf_counter() - start, hit)
+
+
+class GenerationServer(http.server.ThreadingHTTPServer):
+    """HTTP server generating CSDL on a pool of warm worker processes
+
+    :param address: Tuple of host and port; port 0 picks a free port.
+    :param workers: Number of worker processes; defaults to the CPU count, 1 generates in the request threads.
+    :param cache_entries: Number of generated schemas kept for identical requests.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, cache_entries=DEFAULT_CACHE_ENTRIES, verbose=False):
+        super().__init__(address, GenerationHandler)
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = ResultCache(cache_entries)
+        self.metrics = Metrics()
+        self.verbose = verbose
+        self.pool = None
+        if self.workers > 1:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker)
+            # Start every worker now instead of on the first requests
+            concurrent.futures.wait([self.pool.submit(os.getpid) for _worker in range(self.workers)])
+        else:
+            _warm_worker()
+
+    def submit(self, body):
+        if self.pool is None:
+            return generate(body)
+        return self.pool.submit(generate, body).result()
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def main():
+    """ Main function """
+    argget = argparse.ArgumentParser(description='Serves CSDL generation over HTTP: POST an annotated JSON file to /generate, read metrics from /metrics.')
+
+    argget.add_argument('--host', type=str, default='127.0.0.1', help='address to listen on')
+    argget.add_argument('--port', type=int, default=8080, help='port to listen on')
+    argget.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    argget.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES, help='number of generated schemas kept for identical requests')
+    argget.add_argument('--verbose', action='store_true', help='log every request')
+
+    args = argget.parse_args()
+
+    server = GenerationServer((args.host, args.port), args.workers, args.cache_entries, args.verbose)
+    print("Serving on http://{}:{}/generate".format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
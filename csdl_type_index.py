@@ -0,0 +1,133 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import re
+import marshal
+import hashlib
+import xml.etree.ElementTree as etree
+
+# Bumped whenever the layout of the persisted index changes
+INDEX_FORMAT = 2
+
+SCHEMA_BASE_URI = 'http://redfish.dmtf.org/schemas/v1/'
+
+INDEXED_ELEMENTS = ('EntityType', 'ComplexType', 'EnumType', 'TypeDefinition')
+
+REGEX_VERSION = re.compile(r'^(.*)\.v(\d+)_(\d+)_(\d+)$')
+
+
+def split_namespace(namespace):
+    """Returns the unversioned namespace and the version tuple of a namespace, () for an unversioned one"""
+    match = REGEX_VERSION.match(namespace)
+    if match is None:
+        return namespace, ()
+    return match.group(1), tuple(int(part) for part in match.group(2, 3, 4))
+
+
+def _bundle_files(csdl_dir):
+    files = []
+    for root, _dirs, names in os.walk(csdl_dir):
+        files.extend(os.path.join(root, name) for name in names if name.endswith('.xml'))
+    return sorted(files)
+
+
+def bundle_fingerprint(csdl_dir):
+    """Returns a digest of the names, sizes and modification times of the CSDL files of a bundle"""
+    digest = hashlib.sha256(str(INDEX_FORMAT).encode())
+    for path in _bundle_files(csdl_dir):
+        stat = os.stat(path)
+        digest.update('{}:{}:{}\n'.format(os.path.relpath(path, csdl_dir), stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def scan_bundle(csdl_dir):
+    """Indexes every namespace and type of a directory of CSDL files with iterparse
+
+    :returns: Dictionary of plain values, see TypeIndex.
+    """
+    files = {}
+    types = {}
+    for path in _bundle_files(csdl_dir):
+        file_name = os.path.basename(path)
+        namespace = None
+        for event, elem in etree.iterparse(path, events=('start', 'end')):
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if tag == 'Schema':
+                    namespace = elem.get('Namespace')
+                    if namespace:
+                        files.setdefault(namespace, file_name)
+                elif tag in INDEXED_ELEMENTS and namespace and elem.get('Name'):
+                    family, version = split_namespace(namespace)
+                    key = '{}.{}'.format(family, elem.get('Name'))
+                    # An unversioned definition wins; otherwise the latest version defining the type
+                    known = types.get(key)
+                    if known is None or (known[2] and (not version or version > tuple(known[2]))):
+                        types[key] = (namespace, tag, version)
+            else:
+                if tag == 'Schema':
+                    namespace = None
+                elem.clear()
+    return {
+        'format': INDEX_FORMAT,
+        'files': files,
+        'types': {key: (namespace, kind) for key, (namespace, kind, _version) in types.items()},
+    }
+
+
+class TypeIndex:
+    """Namespaces and types of a bundle of published CSDL files
+
+    :ivar files: Dictionary of every namespace to the file defining it.
+    :ivar types: Dictionary of unversioned qualified type name (e.g. Resource.Status) to a tuple
+        of the namespace to reference it in and the kind of its definition (EntityType, ...).
+    :ivar fingerprint: Fingerprint of the bundle version the index was built from.
+    """
+    def __init__(self, data, fingerprint=None):
+        self.files = data['files']
+        self.types = data['types']
+        self.fingerprint = fingerprint
+        self.loaded_from_cache = False
+
+    @classmethod
+    def load(cls, csdl_dir, cache_dir=None):
+        """Returns the index of a bundle, scanning it only if no index of this bundle version is persisted
+
+        :param csdl_dir: Directory of CSDL files, e.g. the csdl directory of an unpacked DSP8010 bundle.
+        :param cache_dir: Directory keeping the persisted indexes; defaults to the schema cache directory.
+        """
+        if cache_dir is None:
+            import csdl_cache
+            cache_dir = csdl_cache.DEFAULT_CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        fingerprint = bundle_fingerprint(csdl_dir)
+        index_file = os.path.join(cache_dir, 'type-index-{}.marshal'.format(fingerprint))
+        try:
+            with open(index_file, 'rb') as fle:
+                data = marshal.load(fle)
+            if data.get('format') == INDEX_FORMAT:
+                index = cls(data, fingerprint)
+                index.loaded_from_cache = True
+                return index
+        except (OSError, EOFError, ValueError, TypeError, AttributeError):
+            pass
+        data = scan_bundle(csdl_dir)
+        tmp_file = '{}.{}.tmp'.format(index_file, os.getpid())
+        with open(tmp_file, 'wb') as fle:
+            marshal.dump(data, fle)
+        os.replace(tmp_file, index_file)
+        return cls(data, fingerprint)
+
+    def lookup(self, namespace, type_name):
+        """Returns the namespace qualified name of a type and the namespace defining it, None if the bundle does not define it"""
+        entry = self.types.get('{}.{}'.format(namespace, type_name))
+        if entry is None:
+            return None
+        return '{}.{}'.format(entry[0], type_name), entry[0]
+
+    def file_uri(self, namespace):
+        """Returns the published URI of the file defining namespace, None if the bundle does not have it"""
+        file_name = self.files.get(namespace)
+        return SCHEMA_BASE_URI + file_name if file_name else None
@@ -0,0 +1,280 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import io
+import os
+import re
+import xml.etree.ElementTree as etree
+import csdl_creator
+import csdl_serializer
+
+REGEX_VERSION = re.compile(r'^v(\d+)_(\d+)_(\d+)$')
+
+DEFINITIONS = ('EntityType', 'ComplexType', 'EnumType')
+
+MEMBERS = ('Property', 'NavigationProperty', 'Member')
+
+# Characters handed to the pull parser at a time
+CHUNK_SIZE = 64 * 1024
+
+
+def _item_type(type_string):
+    return type_string[len('Collection('):-1] if type_string.startswith('Collection(') else type_string
+
+
+def local_type(type_string, family):
+    """Returns a member type with the namespace of family stripped, e.g. Collection(Status) for Collection(Thingy.v1_0_0.Status)
+
+    Types of other schemas keep their namespace, so a name without a dot is always a type of family.
+    """
+    collection = type_string.startswith('Collection(')
+    inner = _item_type(type_string)
+    namespace, _sep, type_name = inner.rpartition('.')
+    if namespace == family or (namespace.startswith(family + '.') and REGEX_VERSION.match(namespace[len(family) + 1:])):
+        inner = type_name
+    return 'Collection({})'.format(inner) if collection else inner
+
+
+class SchemaIndex:
+    """Types and members a published CSDL file already defines for one schema
+
+    :ivar types: Dictionary of type name to the namespace of its latest definition and its kind.
+    :ivar members: Dictionary of type name to a dictionary of member name to its signature, over every version.
+    :ivar version: Latest version tuple of the schema, () if it only has the unversioned namespace.
+    :ivar references: Dictionary of referenced URI to the set of namespaces included from it.
+    """
+    def __init__(self, family):
+        self.family = family
+        self.types = {}
+        self.members = {}
+        self.version = ()
+        self.references = {}
+        self._state = (None, None, None, None, None)
+
+    def _version(self, namespace):
+        """Returns the version tuple of a namespace of the schema, None for a namespace of another schema"""
+        if namespace == self.family:
+            return ()
+        if namespace.startswith(self.family + '.'):
+            match = REGEX_VERSION.match(namespace[len(self.family) + 1:])
+            if match:
+                return tuple(int(part) for part in match.groups())
+        return None
+
+    @classmethod
+    def parse(cls, text, family):
+        """Streams the text of a CSDL file through a pull parser into the index of the schema family
+
+        The text may start with the comment header the generator writes ahead of the XML declaration.
+        """
+        index = cls(family)
+        if not text.startswith('<?xml'):
+            text = re.sub(r'<\?xml[^>]*\?>', '', text, count=1)
+        parser = etree.XMLPullParser(events=('start', 'end'))
+        for offset in range(0, len(text), CHUNK_SIZE):
+            parser.feed(text[offset:offset + CHUNK_SIZE])
+            index._consume(parser.read_events())
+        parser.close()
+        index._consume(parser.read_events())
+        return index
+
+    def _consume(self, events):
+        namespace, version, definition, member, reference = self._state
+        for event, elem in events:
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'end':
+                if tag in DEFINITIONS:
+                    definition = None
+                elif tag in MEMBERS:
+                    member = None
+                elif tag == 'Schema':
+                    namespace = version = None
+                elif tag == 'Reference':
+                    reference = None
+                elem.clear()
+            elif tag == 'Reference':
+                reference = self.references.setdefault(elem.get('Uri'), set())
+            elif tag == 'Include' and reference is not None:
+                reference.add(elem.get('Namespace'))
+            elif tag == 'Schema':
+                namespace = elem.get('Namespace', '')
+                version = self._version(namespace)
+                if version is not None and version > self.version:
+                    self.version = version
+            elif tag in DEFINITIONS and version is not None:
+                definition = self.members.setdefault(elem.get('Name'), {})
+                known = self.types.get(elem.get('Name'))
+                if known is None or version >= self._version(known[0]):
+                    self.types[elem.get('Name')] = (namespace, tag)
+            elif tag in MEMBERS and definition is not None:
+                member = elem.get('Name')
+                definition[member] = (local_type(elem.get('Type', ''), self.family), None)
+            elif tag == 'Annotation' and member is not None and elem.get('Term') == 'OData.Permissions':
+                definition[member] = (definition[member][0], elem.get('EnumMember'))
+        self._state = namespace, version, definition, member, reference
+
+    def next_namespace(self):
+        """Returns the namespace of the next minor version of the schema"""
+        major, minor, _errata = self.version or (1, -1, 0)
+        return '{}.v{}_{}_0'.format(self.family, major, minor + 1)
+
+
+def member_signature(elem, family):
+    """Returns the signature SchemaIndex records for a Property, NavigationProperty or Member element"""
+    permissions = None
+    for annotation in elem:
+        if annotation.get('Term') == 'OData.Permissions':
+            permissions = annotation.get('EnumMember')
+    return local_type(elem.get('Type', ''), family), permissions
+
+
+def delta_schema(csdl, index):
+    """Returns what csdl adds to the schema index describes, split into the Schema element of the next version and the enum members to add in place
+
+    An EntityType or ComplexType that gains members is derived from its latest definition and
+    lists only those members; a type the index does not know is emitted as built. The resource
+    EntityType is always derived, so the next version defines it. A member whose type or
+    permissions changed cannot be redeclared, as CSDL requires member names to be unique across a
+    type and its base types; it is reported as 'incompatible' and left out. Members an EnumType
+    gains are added to its existing definition, so the properties already using it pick them up.
+
+    :param csdl: CsdlFile built from the new mockup.
+    :param index: SchemaIndex of the published file.
+    :returns: Tuple of the Schema element (None when nothing is added), a dictionary of the namespace
+        of an EnumType to a dictionary of its name to the Member elements to add, and a list of
+        (type, member, 'added' or 'incompatible') tuples.
+    """
+    family = index.family
+    own_prefix = csdl.name + '.'
+    namespace = index.next_namespace()
+    emitted = []
+    changes = []
+    enum_members = {}
+    for elem in csdl.csdl:
+        kind = elem.tag
+        if kind not in DEFINITIONS:
+            continue
+        type_name = elem.get('Name')
+        known = index.types.get(type_name)
+        if known is None:
+            emitted.append(elem)
+            changes.append((type_name, None, 'added'))
+            continue
+        existing = index.members.get(type_name, {})
+        delta = []
+        for member in elem:
+            if member.tag not in MEMBERS:
+                continue
+            name = member.get('Name')
+            if name not in existing:
+                delta.append(member)
+                changes.append((type_name, name, 'added'))
+            elif kind != 'EnumType' and existing[name] != member_signature(member, family):
+                changes.append((type_name, name, 'incompatible'))
+        if kind == 'EnumType':
+            if delta:
+                enum_members.setdefault(known[0], {})[type_name] = delta
+        elif delta or elem is csdl.entity:
+            derived = etree.Element(kind, {'Name': type_name, 'BaseType': '{}.{}'.format(known[0], type_name)})
+            derived.extend(annotation for annotation in elem if annotation.tag == 'Annotation')
+            derived.extend(delta)
+            emitted.append(derived)
+    if not any(change != 'incompatible' for _type, _member, change in changes):
+        return None, {}, changes
+
+    emitted_names = {elem.get('Name') for elem in emitted}
+
+    def qualify(type_string):
+        collection = type_string.startswith('Collection(')
+        inner = _item_type(type_string)
+        if inner.startswith(own_prefix):
+            type_name = inner[len(own_prefix):]
+            target = namespace if type_name in emitted_names else index.types[type_name][0]
+            inner = '{}.{}'.format(target, type_name)
+        return 'Collection({})'.format(inner) if collection else inner
+
+    schema = etree.Element('Schema', {'Namespace': namespace, 'xmlns': 'http://docs.oasis-open.org/odata/ns/edm'})
+    schema.extend(annotation for annotation in csdl.csdl if annotation.tag == 'Annotation')
+    for elem in emitted:
+        for member in elem:
+            if member.get('Type'):
+                member.set('Type', qualify(member.get('Type')))
+        schema.append(elem)
+    return schema, enum_members, changes
+
+
+def missing_references(csdl, index):
+    """Returns the edmx:Reference elements of csdl whose URI the published file does not reference
+    and, for those it does reference, the dictionary of URI to the namespaces it does not include"""
+    references = []
+    includes = {}
+    for reference in csdl.main_csdl:
+        if reference.tag != 'edmx:Reference':
+            continue
+        included = index.references.get(reference.get('Uri'))
+        if included is None:
+            references.append(reference)
+            continue
+        missing = [include.get('Namespace') for include in reference if include.get('Namespace') not in included]
+        if missing:
+            includes[reference.get('Uri')] = missing
+    return references, includes
+
+
+def _serialize(elem, indent):
+    buffer = io.StringIO()
+    csdl_serializer.write_element(elem, buffer, indent)
+    return buffer.getvalue()
+
+
+def splice(text, schema, references=(), includes=None, enum_members=None):
+    """Returns the text of a CSDL document with a Schema appended, references added and members
+    added to existing EnumTypes (see delta_schema), the rest untouched"""
+    end = text.rindex('\n', 0, text.rindex('</edmx:DataServices>')) + 1
+    text = text[:end] + _serialize(schema, '\t\t') + text[end:]
+    if references:
+        start = text.rindex('\n', 0, text.index('<edmx:DataServices>')) + 1
+        text = text[:start] + ''.join(_serialize(reference, '\t') for reference in references) + text[start:]
+    for uri, namespaces in (includes or {}).items():
+        start = text.index('>', text.index('Uri="{}"'.format(uri))) + 1
+        text = text[:start] + ''.join('\n\t\t<edmx:Include Namespace="{}"/>'.format(namespace) for namespace in namespaces) + text[start:]
+    for namespace, enums in (enum_members or {}).items():
+        schema_start = re.search(r'<Schema\b[^>]*\bNamespace="{}"'.format(re.escape(namespace)), text).start()
+        for type_name, members in enums.items():
+            enum_start = text.index('<EnumType Name="{}"'.format(type_name), schema_start)
+            end = text.rindex('\n', 0, text.index('</EnumType>', enum_start)) + 1
+            indent = text[end:text.index('<', end)] + '\t'
+            text = text[:end] + ''.join(_serialize(member, indent) for member in members) + text[end:]
+    return text
+
+
+def bump_version(json_data, csdl_file, csv_dict=None, output_file=None, resolver=None, type_index=None):
+    """Adds the next version of a schema to a published CSDL file, holding only what json_data adds or changes
+
+    :param json_data: Annotated JSON mockup or JSON schema of the new version.
+    :type json_data: dict
+    :param csdl_file: Published CSDL file of the schema.
+    :type csdl_file: str
+    :param csv_dict: Optional description rows keyed by property path, or a CsvIndex of them.
+    :param output_file: File receiving the result; by default csdl_file is updated in place.
+    :type output_file: str
+    :returns: Tuple of the new namespace and the list of changes, see delta_schema; the namespace
+        is None if nothing can be added, in which case no file is written and the changes only
+        list the incompatible ones.
+    """
+    csdl = csdl_creator.build_csdl_file(json_data, csv_dict, resolver=resolver, type_index=type_index)
+    with open(csdl_file) as fle:
+        text = fle.read()
+    index = SchemaIndex.parse(text, csdl.name.split('.')[0])
+    schema, enum_members, changes = delta_schema(csdl, index)
+    if schema is None:
+        return None, changes
+    references, includes = missing_references(csdl, index)
+    text = splice(text, schema, references, includes, enum_members)
+    output_file = output_file or csdl_file
+    tmp_file = '{}.{}.tmp'.format(output_file, os.getpid())
+    with open(tmp_file, 'w') as fle:
+        fle.write(text)
+    os.replace(tmp_file, output_file)
+    return schema.get('Namespace'), changes
@@ -0,0 +1,227 @@
+# Copyright Notice:
+# Copyright 2017-2020 DMTF. All rights reserved.
+# License: BSD 3-Clause License. For full text see link: https://github.com/DMTF/Redfish-Schema-Creator/blob/main/LICENSE.md
+
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import csdl_cache
+import csdl_creator
+
+# Name of the persisted file index, kept in the output directory by default
+INDEX_FILE = '.csdl_watch_index.json'
+
+# Seconds between two polls of the watched tree
+DEFAULT_INTERVAL = 0.05
+
+
+def _file_digest(path):
+    with open(path, 'rb') as fle:
+        return hashlib.sha256(fle.read()).hexdigest()
+
+
+class FileIndex:
+    """Persisted modification time, size and content hash of every watched file
+
+    A file whose modification time and size are unchanged is not read again; a file that was
+    touched but not edited is hashed once and found unchanged.
+    """
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        self.files = {}
+        self.outputs = {}
+        self.dirty = False
+        if index_file and os.path.exists(index_file):
+            try:
+                with open(index_file) as fle:
+                    data = json.load(fle)
+                self.files = data.get('files', {})
+                self.outputs = data.get('outputs', {})
+            except (OSError, ValueError, AttributeError):
+                self.files, self.outputs = {}, {}
+
+    def check(self, path, stat):
+        """Records the current state of path and returns True if its content changed since the last check"""
+        entry = self.files.get(path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return False
+        try:
+            digest = _file_digest(path)
+        except OSError:
+            return False
+        self.files[path] = [stat.st_mtime_ns, stat.st_size, digest]
+        self.dirty = True
+        return entry is None or entry[2] != digest
+
+    def forget(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+            self.outputs.pop(path, None)
+            self.dirty = True
+
+    def save(self):
+        if not self.index_file or not self.dirty:
+            return
+        tmp_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        with open(tmp_file, 'w') as fle:
+            json.dump({'files': self.files, 'outputs': self.outputs}, fle)
+        os.replace(tmp_file, self.index_file)
+        self.dirty = False
+
+
+def _scan(patterns, found):
+    """Adds the JSON files below the given directories or glob patterns to found, with their stat results"""
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            _scan_dir(pattern, found)
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                try:
+                    found[path] = os.stat(path)
+                except OSError:
+                    pass
+    return found
+
+
+def _scan_dir(directory, found):
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                _scan_dir(entry.path, found)
+            elif entry.name.endswith('.json'):
+                found[entry.path] = entry.stat()
+        except OSError:
+            pass
+
+
+class Watcher:
+    """Regenerates the CSDL of a mockup tree as its files change
+
+    Everything stays resident between polls: the description indexes, the schema cache and the
+    file index, so a poll that finds nothing to do only stats the tree.
+
+    :param inputs: Directories, files or glob patterns to watch.
+    :type inputs: list
+    :param output_dir: Directory receiving the generated files.
+    :type output_dir: str
+    :param csv_file: Description file shared by every mockup.
+    :type csv_file: str
+    :param cache: Optional schema cache.
+    :type cache: csdl_cache.CsdlCache
+    :param index_file: File persisting the file index between runs; defaults to INDEX_FILE in output_dir.
+    :type index_file: str
+    :param descriptions: Description catalogue compiled with csdl_descriptions.py, used instead of csv_file.
+    :type descriptions: str
+    :param resolver: Resolver for the $ref values of JSON schema inputs.
+    :type resolver: csdl_refs.SchemaResolver
+    :param type_index: Index of a published CSDL bundle, see csdl_creator.CsdlFile.
+    :type type_index: csdl_type_index.TypeIndex
+    :param sample: Number of members of each array to fold into its item shape, see csdl_creator.fold_items.
+    :type sample: int
+    :param stable_after: Stop folding an array once its item shape is stable, see csdl_creator.fold_items.
+    :type stable_after: int
+    """
+    def __init__(self, inputs, output_dir, csv_file=None, cache=None, index_file=None, descriptions=None, resolver=None, type_index=None,
+                 sample=None, stable_after=None):
+        self.inputs = list(inputs)
+        self.output_dir = output_dir
+        self.csv_file = csv_file
+        self.cache = cache
+        self.descriptions = descriptions
+        self.resolver = resolver
+        self.type_index = type_index
+        self.sample = sample
+        self.stable_after = stable_after
+        self._catalogue = None
+        os.makedirs(output_dir, exist_ok=True)
+        self.index = FileIndex(index_file if index_file is not None else os.path.join(output_dir, INDEX_FILE))
+        self._csv_index = None
+        self._started = False
+
+    def affected(self, files):
+        """Returns the mockups to regenerate after checking every file in files against the index"""
+        changed = {path for path, stat in files.items() if self.index.check(path, stat)}
+        removed = [path for path in self.index.files if path not in files]
+        self.index.forget(removed)
+        changed.update(removed)
+
+        mockups = [path for path in files if path.endswith('.json') and path not in (self.csv_file, self.descriptions)]
+        if self.csv_file in changed:
+            self._csv_index = None
+        if self.descriptions in changed and self._catalogue is not None:
+            self._catalogue.close()
+            self._catalogue = None
+        if self.csv_file in changed or self.descriptions in changed:
+            return sorted(mockups)
+        targets = {path for path in mockups if path in changed}
+        if not self._started:
+            # Outputs removed while nobody was watching
+            targets.update(path for path in mockups if not os.path.exists(self.index.outputs.get(path, '')))
+        return sorted(targets)
+
+    def generate(self, json_file):
+        """Generates the CSDL for one mockup
+
+        :returns: Tuple of the input file, the output file and an error message; either output or error is None.
+        """
+        try:
+            with open(json_file) as fle:
+                json_data = json.load(fle)
+            if self.descriptions:
+                import csdl_descriptions
+                if self._catalogue is None:
+                    self._catalogue = csdl_descriptions.DescriptionCatalogue(self.descriptions)
+                csv_index = csdl_descriptions.schema_descriptions(self._catalogue, json_data)
+            else:
+                if self._csv_index is None:
+                    self._csv_index = csdl_creator.CsvIndex(csdl_creator.load_csv(self.csv_file) if self.csv_file else {})
+                csv_index = self._csv_index
+            output_xml, _cached = csdl_cache.write_schema(json_data, csv_index, self.output_dir, self.cache, resolver=self.resolver,
+                                                         type_index=self.type_index, sample=self.sample, stable_after=self.stable_after)
+        except json.JSONDecodeError as err:
+            return json_file, None, "Unable to parse JSON file supplied: {}".format(err)
+        except Exception as err:
+            return json_file, None, "{}: {}".format(type(err).__name__, err)
+        self.index.outputs[json_file] = output_xml
+        self.index.dirty = True
+        return json_file, output_xml, None
+
+    def poll(self):
+        """Regenerates every mockup affected by the changes since the last poll
+
+        :returns: List of (input, output, error) tuples of the regenerated mockups.
+        """
+        files = _scan(self.inputs, {})
+        for shared_file in (self.csv_file, self.descriptions):
+            if shared_file:
+                _scan([shared_file], files)
+        files.pop(self.index.index_file, None)
+        targets = self.affected(files)
+        self._started = True
+        results = [self.generate(path) for path in targets]
+        self.index.save()
+        return results
+
+    def run(self, interval=DEFAULT_INTERVAL, out=sys.stdout):
+        """Polls until interrupted, writing one line per regenerated mockup to out"""
+        try:
+            while True:
+                start = time.perf_counter()
+                results = self.poll()
+                elapsed = (time.perf_counter() - start) * 1000
+                for json_file, output_xml, error in results:
+                    if error:
+                        sys.stderr.write("{}: {}\n".format(json_file, error))
+                    else:
+                        out.write("{} -> {} ({:.1f} ms)\n".format(json_file, output_xml, elapsed))
+                out.flush()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.index.save()
@@ -188,3 +188,773 @@ class TestCsdlFile:
         test_class.build_csdl()
 
         assert(test_class._annotation_database is not {})
+
+class TestBatch:
+    def test_run_batch_reports_failures(self, tmp_path):
+        import json
+        from csdl_batch import collect_inputs, run_batch
+        mockups = tmp_path / "mockups"
+        (mockups / "nested").mkdir(parents=True)
+        (mockups / "nested" / "thingy.json").write_text(json.dumps({"@odata.type": "#Thingy.v1_0_0.Thingy", "Knob": "Twist"}))
+        (mockups / "widget.json").write_text(json.dumps({"@odata.type": "#Widget.v1_0_0.Widget", "Count": 2}))
+        (mockups / "broken.json").write_text("{")
+
+        inputs = collect_inputs([str(mockups)])
+        results = run_batch(inputs, str(tmp_path / "out"), workers=2)
+
+        errors = {f.split('/')[-1]: e for f, _o, e in results}
+        assert(len(inputs) == 3 and errors["broken.json"] and not errors["thingy.json"] and not errors["widget.json"])
+        assert((tmp_path / "out" / "Thingy.v1_0_0.xml").exists() and (tmp_path / "out" / "Widget.v1_0_0.xml").exists())
+
+class TestSerializer:
+    """The single pass writer must match the legacy minidom pipeline byte for byte"""
+    def test_matches_legacy(self):
+        from csdl_creator import build_csdl_file
+        from csdl_serializer import csdl_to_string, legacy_serialize, CSDL_HEADER_TEMPLATE
+        csdl = build_csdl_file({"@odata.type": "#Thingy.v1_0_0.Thingy", "Knob": "Twist", "Knob!description": 'A "quoted" <b>&amp; description',
+                                "Mode": "A | B", "Holder": {"Inner": 1.5}, "Link": {"@odata.id": "/x"}, "Link!link": "Other"})
+        assert(csdl_to_string(csdl.main_csdl, csdl.name) == CSDL_HEADER_TEMPLATE.format(csdl.name) + legacy_serialize(csdl.main_csdl))
+
+    def test_falls_back_for_unusual_content(self):
+        import xml.etree.ElementTree as etree
+        from csdl_serializer import csdl_to_string, legacy_serialize, CSDL_HEADER_TEMPLATE
+        root = etree.Element("edmx:Edmx", {"xmlns:edmx": "urn:x", "Version": "4.0"})
+        etree.SubElement(root, "Annotation", {"Term": "T", "String": "line one\nline two", "Empty": ""})
+        assert(csdl_to_string(root, "X") == CSDL_HEADER_TEMPLATE.format("X") + legacy_serialize(root))
+
+class TestCsvIndex:
+    def test_exact_path_matching(self):
+        from csdl_creator import CsvIndex
+        csv = {"Power": ["PowerDesc", "PowerLong"], "Power2/Watts": ["WattsDesc", "WattsLong"], "Power/Watts": ["InnerDesc", "InnerLong"]}
+        database = database_builder({"Power": {"Watts": 5}, "Power2": {"Watts": 6}}, CsvIndex(csv))
+
+        assert(database["Power"].description == "PowerDesc" and database["Power2"].description is None and\
+               database["Power"].children["Watts"].description == "InnerDesc" and\
+               database["Power2"].children["Watts"].description == "WattsDesc")
+
+class TestReferences:
+    def test_link_references_deduplicated_by_exact_name(self):
+        test_class = CsdlFile({"@odata.type": "#Thingy.v1_0_0.Thingy",
+                               "PowerSubsystem": {"@odata.id": "/a"}, "PowerSubsystem!link": "PowerSubsystem",
+                               "Power": {"@odata.id": "/b"}, "Power!link": "Power",
+                               "OtherPower": {"@odata.id": "/c"}, "OtherPower!link": "Power"})
+        test_class.init_csdl()
+        test_class.build_csdl()
+        uris = [ref.get("Uri").split('/')[-1] for ref in test_class.main_csdl if 'Reference' in ref.tag]
+
+        assert(uris.count("Power_v1.xml") == 1 and uris.count("PowerSubsystem_v1.xml") == 1)
+
+    def test_add_import_uses_index(self):
+        import xml_convenience
+        root = xml_convenience.add_CSDL_Headers()
+        ref_index = xml_convenience.index_references(root)
+        first = xml_convenience.add_import(root, "Thermal", None, ref_index=ref_index)
+        second = xml_convenience.add_import(root, "Thermal", None, ref_index=ref_index)
+
+        assert(first is not None and second is None and ref_index["Thermal"] is first and "Org.OData.Core.V1" in ref_index)
+
+class TestCache:
+    MOCKUP = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Knob": "Twist", "Holder": {"Inner": 1}}
+
+    def test_hit_after_miss(self, tmp_path):
+        from csdl_cache import CsdlCache, write_schema
+        from csdl_creator import CsvIndex
+        cache = CsdlCache(str(tmp_path / "cache"))
+        first, first_cached = write_schema(self.MOCKUP, CsvIndex(), str(tmp_path), cache)
+        text = open(first).read()
+        second, second_cached = write_schema(self.MOCKUP, CsvIndex(), str(tmp_path), cache)
+
+        assert(not first_cached and second_cached and open(second).read() == text)
+
+    def test_key_tracks_used_csv_rows(self):
+        from csdl_cache import cache_key
+        base = cache_key(self.MOCKUP, {"Holder/Inner": ["A", "B"]})
+
+        assert(cache_key(self.MOCKUP, {"Holder/Inner": ["A", "B"], "Unused": ["C", "D"]}) == base and\
+               cache_key(self.MOCKUP, {"Holder/Inner": ["A", "Changed"]}) != base)
+
+    def test_lru_eviction(self, tmp_path):
+        import os
+        from csdl_cache import CsdlCache
+        cache = CsdlCache(str(tmp_path), max_bytes=350)
+        for index in range(3):
+            cache.put("entry{}".format(index), "x" * 100)
+            os.utime(os.path.join(str(tmp_path), "entry{}.xml".format(index)), (index, index))
+        cache.get("entry0")
+        cache.put("entry3", "x" * 100)
+
+        assert(cache.get("entry0") is not None and cache.get("entry1") is None and\
+               cache.get("entry2") is not None and cache.get("entry3") is not None)
+
+class TestBenchmark:
+    def test_generate_mockup_is_deterministic(self):
+        from csdl_benchmark import generate_mockup
+        mockup, csv_dict = generate_mockup(properties=300, depth=2, csv_rows=400, seed=3)
+
+        assert((mockup, csv_dict) == generate_mockup(properties=300, depth=2, csv_rows=400, seed=3) and\
+               mockup != generate_mockup(properties=300, depth=2, seed=4)[0] and len(csv_dict) == 400)
+
+    def test_run_suite(self):
+        import json
+        from csdl_benchmark import run_suite
+        results = run_suite(properties=50, csv_rows=50)
+
+        assert(set(results["stages"]) == {"database_builder", "build_csdl", "serialize"} and\
+               all(stage["seconds"] >= 0 and stage["peak_bytes"] > 0 for stage in results["stages"].values()) and\
+               json.loads(json.dumps(results)) == results)
+
+class TestReport:
+    def test_stage_report(self, tmp_path):
+        import io, json
+        from csdl_cache import write_schema
+        from csdl_report import StageReport
+        report = StageReport()
+        write_schema(TestCache.MOCKUP, {}, str(tmp_path), report=report)
+        csv_out = io.StringIO()
+        report.write_csv(csv_out)
+        report.write(str(tmp_path / "report.json"))
+
+        assert([stage[0] for stage in report.stages] == ["database_builder", "build_csdl", "serialize", "write"] and\
+               report.counts["Property"] == 3 and report.counts["ComplexType"] == 1 and report.counts["EnumType"] == 0 and\
+               csv_out.getvalue().startswith("name,seconds,allocated_blocks,count\n") and\
+               json.loads((tmp_path / "report.json").read_text())["counts"] == report.counts)
+
+class TestPropertyNode:
+    def test_mockup_kinds(self):
+        from csdl_creator import KIND_PRIMITIVE, KIND_ENUM, KIND_OBJECT, KIND_LINK
+        database = database_builder({"Knob!readonly": False, "Knob": "Twist", "Mode": "A | B", "Holder": {"Inner": 1},
+                                     "Slots": [{"@odata.id": "/a"}], "Slots!link": "PCIeDevice", "Custom!unit": "Cel", "Custom": 2})
+
+        assert(database["Knob"].kind == KIND_PRIMITIVE and database["Knob"].read_write and\
+               database["Mode"].kind == KIND_ENUM and database["Mode"].enum == ["A", "B"] and\
+               database["Holder"].kind == KIND_OBJECT and database["Holder"].children["Inner"].value == 1 and\
+               database["Slots"].kind == KIND_LINK and database["Slots"].is_array and database["Slots"].link == "PCIeDevice" and\
+               database["Custom"].annotations == {"unit": "Cel"} and list(database) == ["Knob", "Mode", "Holder", "Slots", "Custom"])
+
+    def test_json_schema_input(self):
+        test_class = CsdlFile({"$schema": "http://json-schema.org/draft-07/schema#", "title": "#Widget.v1_0_0.Widget", "required": ["Count"],
+                               "properties": {"@odata.id": {"type": "string"}, "Count": {"type": "integer", "readonly": False},
+                                              "Mode": {"type": "string", "enum": ["On", "Off"]},
+                                              "Tags": {"type": "array", "items": {"type": "string"}},
+                                              "Holder": {"type": "object", "properties": {"Inner": {"type": ["number", "null"]}}}}})
+        test_class.init_csdl()
+        test_class.build_csdl()
+        types = {prop.get("Name"): prop.get("Type") for prop in test_class.csdl.iter("Property")}
+
+        assert(types == {"Count": "Edm.Int64", "Mode": "Widget.v1_0_0.Mode", "Tags": "Collection(Edm.String)",
+                         "Holder": "Widget.v1_0_0.Holder", "Inner": "Edm.Decimal"})
+
+class TestAnnotationPrototypes:
+    def test_fixed_annotations_are_shared(self):
+        from csdl_creator import ANNOTATION_PROTOTYPES
+        first = create_property("First", "Edm.String", required=True)
+        second = create_property("Second", "Edm.String", readonly=False, description="Second property.")
+
+        assert(first[0] is ANNOTATION_PROTOTYPES["Read"] and second[0] is ANNOTATION_PROTOTYPES["ReadWrite"] and\
+               first[1] is ANNOTATION_PROTOTYPES["DescriptionTBD"] and second[1].get("String") == "Second property." and\
+               first[3] is ANNOTATION_PROTOTYPES["Required"] and len(second) == 3)
+
+class TestCorpus:
+    def test_infer_corpus(self, tmp_path):
+        import json
+        from csdl_corpus import infer_corpus
+        from csdl_creator import KIND_ENUM, KIND_OBJECT
+        for index in range(6):
+            payload = {"@odata.type": "#Chassis.v1_14_0.Chassis", "Id": str(index), "SerialNumber": "SN{}".format(index),
+                       "ChassisType": ["Rack", "Blade"][index % 2], "Weight": [1, 2.5][index % 2], "Holder": {"Inner": index}}
+            if index % 2:
+                payload["AssetTag"] = "Tag"
+                payload["Holder"]["Extra"] = True
+            (tmp_path / "chassis{}.json".format(index)).write_text(json.dumps(payload))
+        (tmp_path / "power.json").write_text(json.dumps({"@odata.type": "#Power.v1_0_0.Power", "Watts": 5}))
+        files = sorted(str(f) for f in tmp_path.iterdir())
+
+        databases, errors = infer_corpus(files, workers=2)
+        chassis = databases["#Chassis.v1_14_0.Chassis"]
+
+        assert(not errors and set(databases) == {"#Chassis.v1_14_0.Chassis", "#Power.v1_0_0.Power"} and\
+               chassis["ChassisType"].kind == KIND_ENUM and chassis["ChassisType"].enum == ["Rack", "Blade"] and\
+               chassis["SerialNumber"].json_type == "string" and chassis["Weight"].json_type == "number" and\
+               chassis["SerialNumber"].required and not chassis["AssetTag"].required and\
+               chassis["Holder"].kind == KIND_OBJECT and chassis["Holder"].children["Inner"].required and\
+               not chassis["Holder"].children["Extra"].required)
+
+class TestWatch:
+    def test_poll_regenerates_changed_files(self, tmp_path):
+        import os
+        import json
+        from csdl_watch import Watcher
+        tree = tmp_path / "tree"
+        tree.mkdir()
+        for name in ("Alpha", "Beta"):
+            (tree / (name + ".json")).write_text(json.dumps({"@odata.type": "#{0}.v1_0_0.{0}".format(name), "Value": 1}))
+        csv_file = tmp_path / "descriptions.csv"
+        csv_file.write_text("Value|Old value.|Long.\n")
+        output = str(tmp_path / "out")
+
+        watcher = Watcher([str(tree)], output, csv_file=str(csv_file))
+        first = [os.path.basename(f) for f, out, error in watcher.poll()]
+        idle = watcher.poll()
+
+        os.utime(tree / "Alpha.json", ns=(1, 1))
+        touched = watcher.poll()
+        (tree / "Beta.json").write_text(json.dumps({"@odata.type": "#Beta.v1_0_0.Beta", "Value": 2}))
+        edited = [os.path.basename(f) for f, out, error in watcher.poll()]
+        csv_file.write_text("Value|New value.|Long.\n")
+        described = [os.path.basename(f) for f, out, error in watcher.poll()]
+        with open(os.path.join(output, "Beta.v1_0_0.xml")) as fle:
+            beta = fle.read()
+
+        restarted = Watcher([str(tree)], output, csv_file=str(csv_file)).poll()
+
+        assert(first == ["Alpha.json", "Beta.json"] and idle == [] and touched == [] and edited == ["Beta.json"] and\
+               described == ["Alpha.json", "Beta.json"] and "New value." in beta and restarted == [])
+
+    def test_watch_matches_batch_options(self, tmp_path, monkeypatch):
+        import sys
+        import json
+        import pytest
+        import csdl_batch
+        from csdl_watch import Watcher
+        from csdl_descriptions import compile_catalogue
+        tree = tmp_path / "tree"
+        tree.mkdir()
+        (tree / "Thingy.json").write_text(json.dumps({"@odata.type": "#Thingy.v1_0_0.Thingy", "Size": 3}))
+        (tmp_path / "Thingy.csv").write_text("Size|The size.|The size of the thingy.\n")
+        catalogue = str(tmp_path / "catalogue.db")
+        compile_catalogue(catalogue, [str(tmp_path / "Thingy.csv")])
+        batch = csdl_batch.run_batch([str(tree / "Thingy.json")], str(tmp_path / "batch"), workers=1, descriptions=catalogue)
+        watched = Watcher([str(tree)], str(tmp_path / "watch"), descriptions=catalogue).poll()
+        monkeypatch.setattr(sys, "argv", ["csdl_batch.py", str(tree), "--watch", "--workers", "2"])
+        with pytest.raises(SystemExit):
+            csdl_batch.main()
+
+        assert(open(batch[0][1]).read() == open(watched[0][1]).read() and 'String="The size."' in open(watched[0][1]).read())
+
+class TestServer:
+    def test_generate_and_metrics(self):
+        import json
+        import threading
+        import http.client
+        from csdl_server import GenerationServer
+        server = GenerationServer(('127.0.0.1', 0), workers=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        mockup = {"@odata.type": "#Widget.v1_0_0.Widget", "Color": "Red"}
+        body = json.dumps({"mockup": mockup, "csv": "Color|The widget color.|Long.\n"})
+        try:
+            connection = http.client.HTTPConnection(*server.server_address[:2])
+            responses = []
+            for request in (body, body, "not json"):
+                connection.request('POST', '/generate', request)
+                response = connection.getresponse()
+                responses.append((response.status, response.getheader('X-Cache'), response.read().decode()))
+            connection.request('GET', '/metrics')
+            metrics = connection.getresponse().read().decode()
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert(responses[0][:2] == (200, 'miss') and responses[1][:2] == (200, 'hit') and\
+               responses[0][2] == responses[1][2] and "The widget color." in responses[0][2] and responses[2][0] == 400 and\
+               'csdl_cache_hit_ratio 0.333333' in metrics and 'csdl_request_seconds_count 3' in metrics)
+
+    def test_bad_length_and_worker_failure(self):
+        import threading
+        import http.client
+        import concurrent.futures.process
+        from csdl_server import GenerationServer
+        server = GenerationServer(('127.0.0.1', 0), workers=1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def broken(body):
+            raise concurrent.futures.process.BrokenProcessPool("A worker died")
+        try:
+            statuses = []
+            for length in ("abc", "-5"):
+                connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+                connection.putrequest('POST', '/generate')
+                connection.putheader('Content-Length', length)
+                connection.endheaders()
+                statuses.append(connection.getresponse().status)
+                connection.close()
+            server.submit = broken
+            connection = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+            connection.request('POST', '/generate', '{"@odata.type": "#Widget.v1_0_0.Widget"}')
+            response = connection.getresponse()
+            response.read()
+            statuses.append(response.status)
+            # Requests on one connection are handled in turn, so the metrics include the failure
+            connection.request('GET', '/metrics')
+            metrics = connection.getresponse().read().decode()
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert(statuses == [400, 400, 500] and 'csdl_requests_total{status="500"} 1' in metrics)
+
+class TestJsonSchema:
+    def test_json_schema_from_build_pass(self):
+        from csdl_creator import build_csdl_file
+        mockup = {"@odata.type": "#Widget.v1_0_0.Widget", "Id": "1", "Color": "Red | Blue", "Color!required": True, "Size": 3, "Size!readonly": "rw",
+                  "Tags": ["a"], "Inner": {"X": 1.5}, "Peer": {"@odata.id": "/x"}, "Peer!link": "Peer"}
+        schema = build_csdl_file(mockup, {"Inner": ["Inner things.", "Long."]}, json_schema=True).json_schema
+        definitions = schema["definitions"]
+        widget = definitions["Widget"]["properties"]
+
+        assert(schema["title"] == "#Widget.v1_0_0.Widget" and schema["$ref"] == "#/definitions/Widget" and\
+               widget["Color"]["$ref"] == "#/definitions/Color" and definitions["Color"]["enum"] == ["Red", "Blue"] and\
+               "Color" in definitions["Widget"]["required"] and widget["Size"]["type"] == "integer" and widget["Size"]["readonly"] is False and\
+               widget["Tags"]["items"] == {"type": "string"} and definitions["Inner"]["description"] == "Inner things." and\
+               definitions["Inner"]["properties"]["X"]["type"] == "number" and widget["Peer"]["$ref"].endswith("Peer.json#/definitions/Peer") and\
+               widget["Id"]["$ref"].endswith("Resource.json#/definitions/Id"))
+
+class TestDedupe:
+    def test_identical_types_are_collapsed(self):
+        from csdl_creator import build_csdl_file
+        mockup = {"@odata.type": "#Sensors.v1_0_0.Sensors",
+                  "CpuTemp": {"Reading": 40.5, "Units": "Cel | Fahrenheit", "Thresholds": {"Upper": 90}},
+                  "GpuTemp": {"Reading": 60.5, "Units": "Cel | Fahrenheit", "Thresholds": {"Upper": 95}},
+                  "Fan": {"Reading": 4000, "Units": "RPM | Percent"}}
+        plain = build_csdl_file(mockup)
+        deduped = build_csdl_file(mockup, dedupe=True)
+
+        def types(csdl):
+            return [elem.get("Name") for elem in csdl.csdl if elem.tag in ("ComplexType", "EnumType")]
+
+        gpu = deduped.entity.find("Property[@Name='GpuTemp']")
+        assert(sorted(types(plain)) == ["CpuTemp", "Fan", "GpuTemp", "Thresholds", "Thresholds", "Units", "Units", "Units"] and\
+               sorted(types(deduped)) == ["CpuTemp", "Fan", "Thresholds", "Units", "Units"] and\
+               deduped.collapsed == [("GpuTemp", "CpuTemp")] and gpu.get("Type") == "Sensors.v1_0_0.CpuTemp" and plain.collapsed == [])
+
+class TestImportTime:
+    # Cumulative import time allowed for the library, in microseconds; about 4x a warm import on a laptop
+    BUDGET = 50000
+
+    def test_library_import_budget(self):
+        from csdl_benchmark import import_time
+        result = import_time('csdl_creator')
+        eager = {'argparse', 'csv', 'json', 'logging', 'xml.dom.minidom'} & set(result['modules'])
+        assert(not eager and result['microseconds'] < self.BUDGET)
+
+class TestHarvester:
+    TREE = {
+        "/redfish/v1": {"@odata.id": "/redfish/v1", "@odata.type": "#ServiceRoot.v1_5_0.ServiceRoot", "Chassis": {"@odata.id": "/redfish/v1/Chassis"}},
+        "/redfish/v1/Chassis": {"@odata.id": "/redfish/v1/Chassis", "@odata.type": "#ChassisCollection.ChassisCollection",
+                                "Members": [{"@odata.id": "/redfish/v1/Chassis/1"}, {"@odata.id": "/redfish/v1/Chassis/2"}]},
+        "/redfish/v1/Chassis/1": {"@odata.id": "/redfish/v1/Chassis/1", "@odata.type": "#Chassis.v1_14_0.Chassis", "ChassisType": "Rack",
+                                  "Thermal": {"@odata.id": "/redfish/v1/Chassis/1/Thermal"}},
+        "/redfish/v1/Chassis/2": {"@odata.id": "/redfish/v1/Chassis/2", "@odata.type": "#Chassis.v1_14_0.Chassis", "ChassisType": "Blade",
+                                  "Thermal": {"@odata.id": "/redfish/v1/Chassis/2/Thermal"}},
+        "/redfish/v1/Chassis/1/Thermal": {"@odata.id": "/redfish/v1/Chassis/1/Thermal", "@odata.type": "#Thermal.v1_0_0.Thermal", "Fans": [{"Reading": 10}]},
+    }
+
+    def serve(self):
+        import json
+        import threading
+        import http.server
+        tree = self.TREE
+        connections = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                connections.append(self.client_address)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path not in tree:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(tree[self.path]).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if self.path.endswith('Thermal'):
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for start in range(0, len(body), 16):
+                        chunk = body[start:start + 16]
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                    self.wfile.write(b'0\r\n\r\n')
+                else:
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, connections
+
+    def test_harvest_local_service(self):
+        from csdl_harvester import harvest
+        from csdl_creator import generate_csdl
+        server, connections = self.serve()
+        try:
+            mockups, errors = harvest("http://127.0.0.1:{}".format(server.server_address[1]), connections=4, per_host=2)
+        finally:
+            server.shutdown()
+            server.server_close()
+        chassis = mockups["#Chassis.v1_14_0.Chassis"]
+        name, text = generate_csdl(chassis)
+
+        assert(sorted(mockups) == ["#Chassis.v1_14_0.Chassis", "#ChassisCollection.ChassisCollection", "#ServiceRoot.v1_5_0.ServiceRoot", "#Thermal.v1_0_0.Thermal"] and\
+               chassis["@odata.id"] == "/redfish/v1/Chassis/1" and chassis["Thermal!link"] == "Thermal" and\
+               mockups["#ChassisCollection.ChassisCollection"]["Members!link"] == "Chassis" and\
+               mockups["#Thermal.v1_0_0.Thermal"]["Fans"] == [{"Reading": 10}] and\
+               errors == [("/redfish/v1/Chassis/2/Thermal", "HarvestError: HTTP status 404")] and\
+               len(connections) <= 2 and name == "Chassis.v1_14_0" and 'NavigationProperty Name="Thermal" Type="Thermal.Thermal"' in text)
+
+class TestSchemaRefs:
+    def test_resolve_against_bundle(self, tmp_path):
+        import json
+        from csdl_refs import SchemaResolver
+        from csdl_creator import build_csdl_file, KIND_OBJECT, KIND_TYPEREF, KIND_ENUM
+        (tmp_path / "Common.json").write_text(json.dumps({"$id": "http://redfish.dmtf.org/schemas/v1/Common.json", "definitions": {
+            "Condition": {"type": "object", "description": "A condition.", "properties": {"Level": {"$ref": "#/definitions/Level"}}},
+            "Level": {"type": "string", "enum": ["Low", "High"]}}}))
+        schemas = []
+        for name in ("Widget", "Gadget"):
+            schemas.append({"$schema": "http://redfish.dmtf.org/schemas/v1/redfish-schema-v1.json", "$ref": "#/definitions/" + name,
+                            "title": "#{0}.v1_0_0.{0}".format(name), "definitions": {
+                                name: {"type": "object", "properties": {
+                                    "Condition": {"anyOf": [{"$ref": "http://redfish.dmtf.org/schemas/v1/Common.json#/definitions/Condition"}, {"type": "null"}]},
+                                    "Tree": {"$ref": "#/definitions/Node"},
+                                    "Missing": {"$ref": "http://redfish.dmtf.org/schemas/v1/Nowhere.json#/definitions/Thing"}}},
+                                "Node": {"type": "object", "properties": {"Children": {"type": "array", "items": {"$ref": "#/definitions/Node"}}}}}})
+        resolver = SchemaResolver(str(tmp_path))
+        widget, gadget = [build_csdl_file(schema, resolver=resolver) for schema in schemas]
+        condition = widget._annotation_database["Condition"]
+        children = widget._annotation_database["Tree"].children["Children"]
+
+        assert(resolver.parsed == ["Common.json"] and condition.kind == KIND_OBJECT and condition.description == "A condition." and\
+               condition.children["Level"].kind == KIND_ENUM and gadget._annotation_database["Condition"].children is condition.children and\
+               children.kind == KIND_TYPEREF and children.type_name == "Tree" and\
+               widget.csdl.find("ComplexType[@Name='Tree']/Property").get("Type") == "Collection(Widget.v1_0_0.Tree)" and\
+               widget.entity.find("Property[@Name='Missing']").get("Type") == "TBD")
+
+    def test_edited_input_replaces_registered_copy(self):
+        import copy
+        from csdl_refs import SchemaResolver
+        from csdl_creator import build_csdl_file, serialize_csdl
+        schema = {"$schema": "http://redfish.dmtf.org/schemas/v1/redfish-schema-v1.json", "$ref": "#/definitions/Widget",
+                  "title": "#Widget.v1_0_0.Widget", "definitions": {"Widget": {"type": "object", "properties": {"First": {"type": "string"}}}}}
+        resolver = SchemaResolver()
+        first = serialize_csdl(build_csdl_file(schema, resolver=resolver))
+        edited = copy.deepcopy(schema)
+        edited["definitions"]["Widget"]["properties"] = {"Second": {"type": "string"}}
+        second = serialize_csdl(build_csdl_file(edited, resolver=resolver))
+        schema["definitions"]["Widget"]["properties"]["Third"] = {"type": "string"}
+        third = serialize_csdl(build_csdl_file(schema, resolver=resolver))
+
+        assert('Name="First"' in first and 'Name="Second"' in second and 'Name="First"' not in second and\
+               'Name="Third"' in third)
+
+    def test_referenced_file_converted_keeps_memos(self, tmp_path):
+        import json
+        from csdl_refs import SchemaResolver
+        from csdl_creator import build_csdl_file
+        common = {"$schema": "http://redfish.dmtf.org/schemas/v1/redfish-schema-v1.json", "$id": "http://redfish.dmtf.org/schemas/v1/Common.json",
+                  "title": "#Common.v1_0_0.Common", "$ref": "#/definitions/Common", "definitions": {
+                      "Common": {"type": "object", "properties": {"Condition": {"$ref": "#/definitions/Condition"}}},
+                      "Condition": {"type": "object", "properties": {"Level": {"type": "string", "enum": ["Low", "High"]}}}}}
+        (tmp_path / "Common.json").write_text(json.dumps(common))
+        widget = {"$schema": "http://redfish.dmtf.org/schemas/v1/redfish-schema-v1.json", "title": "#Widget.v1_0_0.Widget", "properties": {
+            "Condition": {"$ref": "http://redfish.dmtf.org/schemas/v1/Common.json#/definitions/Condition"}}}
+        resolver = SchemaResolver(str(tmp_path))
+        build_csdl_file(widget, resolver=resolver)
+        databases = dict(resolver.databases)
+        build_csdl_file(json.loads((tmp_path / "Common.json").read_text()), resolver=resolver)
+        kept = all(resolver.databases.get(key) is database for key, database in databases.items())
+        common["definitions"]["Condition"]["properties"]["Extra"] = {"type": "integer"}
+        edited = build_csdl_file(common, resolver=resolver)
+
+        assert(databases and kept and resolver.parsed == ["Common.json"] and\
+               edited.csdl.find("ComplexType[@Name='Condition']/Property[@Name='Extra']") is not None)
+
+class TestTypeIndex:
+    BUNDLE = {
+        "Resource_v1.xml": '<edmx:Edmx xmlns:edmx="http://docs.oasis-open.org/odata/ns/edmx" Version="4.0"><edmx:DataServices>'
+                           '<Schema xmlns="http://docs.oasis-open.org/odata/ns/edm" Namespace="Resource"><EnumType Name="PowerState"/><EntityType Name="Resource"/></Schema>'
+                           '<Schema xmlns="http://docs.oasis-open.org/odata/ns/edm" Namespace="Resource.v1_1_0"><ComplexType Name="Location"/></Schema>'
+                           '<Schema xmlns="http://docs.oasis-open.org/odata/ns/edm" Namespace="Resource.v1_10_0"><ComplexType Name="Location"/></Schema>'
+                           '</edmx:DataServices></edmx:Edmx>',
+        "ThermalMetrics_v1.xml": '<edmx:Edmx xmlns:edmx="http://docs.oasis-open.org/odata/ns/edmx" Version="4.0"><edmx:DataServices>'
+                                 '<Schema xmlns="http://docs.oasis-open.org/odata/ns/edm" Namespace="Thermal"><EntityType Name="Thermal"/></Schema>'
+                                 '<Schema xmlns="http://docs.oasis-open.org/odata/ns/edm" Namespace="Thermal.v1_2_0"><EntityType Name="Thermal"/></Schema>'
+                                 '</edmx:DataServices></edmx:Edmx>',
+    }
+
+    def test_index_bundle(self, tmp_path):
+        import marshal
+        from csdl_type_index import TypeIndex
+        from csdl_creator import build_csdl_file
+        csdl_dir = tmp_path / "csdl"
+        csdl_dir.mkdir()
+        for name, text in self.BUNDLE.items():
+            (csdl_dir / name).write_text(text)
+        scanned = TypeIndex.load(str(csdl_dir), str(tmp_path / "cache"))
+        index = TypeIndex.load(str(csdl_dir), str(tmp_path / "cache"))
+        cached, = (tmp_path / "cache").glob("type-index-*.marshal")
+        csdl = build_csdl_file({"@odata.type": "#Chassis.v1_0_0.Chassis", "PowerState": "On", "Location": {"Rack": "A"}, "Status": {"State": "Enabled"},
+                                "Thermal": {}, "Thermal!link": "Thermal"}, type_index=index)
+        references = {reference.get("Uri").rsplit("/", 1)[-1]: reference for reference in csdl.main_csdl if reference.tag == "edmx:Reference"}
+        resource, thermal = references["Resource_v1.xml"], references["ThermalMetrics_v1.xml"]
+
+        assert(not scanned.loaded_from_cache and index.loaded_from_cache and "latest" not in marshal.loads(cached.read_bytes()) and\
+               csdl.entity.find("Property[@Name='PowerState']").get("Type") == "Resource.PowerState" and\
+               csdl.entity.find("Property[@Name='Location']").get("Type") == "Resource.v1_10_0.Location" and\
+               csdl.entity.find("Property[@Name='Status']").get("Type") == "Chassis.v1_0_0.Status" and\
+               [include.get("Namespace") for include in resource] == ["Resource.v1_0_0", "Resource", "Resource.v1_10_0"] and\
+               [include.get("Namespace") for include in thermal] == ["Thermal"])
+
+class TestVersionBump:
+    def test_bump_version(self, tmp_path):
+        from csdl_creator import generate_csdl
+        from csdl_version import bump_version, SchemaIndex
+        mockup = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Size": 3, "Color": "Red | Blue", "Sub": {"A": 1}}
+        csdl_file = tmp_path / "Thingy_v1.xml"
+        csdl_file.write_text(generate_csdl(mockup)[1])
+        original = csdl_file.read_text()
+        mockup.update({"Color": "Red | Blue | Green", "Sub": {"A": 1, "B": True}, "Size": "Large", "Thermal": {}, "Thermal!link": "Thermal"})
+
+        namespace, changes = bump_version(mockup, str(csdl_file))
+        text = csdl_file.read_text()
+        index = SchemaIndex.parse(text, "Thingy")
+        unchanged = bump_version(mockup, str(csdl_file))
+
+        new_schema = text[text.index('Namespace="Thingy.v1_1_0"'):]
+        old_enum = text[text.index('<EnumType Name="Color"'):text.index('</EnumType>')]
+
+        assert(namespace == "Thingy.v1_1_0" and original[original.index('<edmx:DataServices>'):original.index('<EnumType Name="Color"')] in text and\
+               sorted(changes) == [("Color", "Green", "added"), ("Sub", "B", "added"), ("Thingy", "Size", "incompatible"), ("Thingy", "Thermal", "added")] and\
+               index.version == (1, 1, 0) and index.types["Sub"] == ("Thingy.v1_1_0", "ComplexType") and index.types["Thingy"] == ("Thingy.v1_1_0", "EntityType") and\
+               index.types["Color"] == ("Thingy.v1_0_0", "EnumType") and 'Member Name="Green"' in old_enum and\
+               index.members["Sub"] == {"A": ("Edm.Int64", "OData.Permission/Read"), "B": ("Edm.Boolean", "OData.Permission/Read")} and\
+               'ComplexType Name="Sub" BaseType="Thingy.v1_0_0.Sub"' in new_schema and 'Name="Size"' not in new_schema and\
+               'Name="Color"' not in new_schema and 'Uri="http://redfish.dmtf.org/schemas/v1/Thermal_v1.xml"' in text and\
+               unchanged == (None, [("Thingy", "Size", "incompatible")]))
+
+class TestDeepMockup:
+    DEPTH = 5000
+
+    def deep_mockup(self, depth):
+        mockup = {"@odata.type": "#Deep.v1_0_0.Deep"}
+        level = mockup
+        for value in range(depth):
+            level["Level"] = {"Value": value}
+            level = level["Level"]
+        return mockup
+
+    def build(self, depth):
+        import time
+        from csdl_creator import build_csdl_file, serialize_csdl
+        start = time.perf_counter()
+        csdl = build_csdl_file(self.deep_mockup(depth), json_schema=True, dedupe=True)
+        serialize_csdl(csdl)
+        return csdl, time.perf_counter() - start
+
+    def test_deep_mockup(self):
+        import sys
+        import tracemalloc
+        from csdl_cache import used_csv_rows
+        from csdl_creator import CsvIndex
+        _csdl, half = self.build(self.DEPTH // 2)
+        tracemalloc.start()
+        try:
+            csdl, full = self.build(self.DEPTH)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        _csdl, full = self.build(self.DEPTH)
+        types = csdl.csdl.findall("ComplexType")
+        rows = used_csv_rows(self.deep_mockup(self.DEPTH), CsvIndex({"/".join(["Level"] * self.DEPTH): ["Deepest.", "Deepest."]}))
+
+        assert(self.DEPTH > sys.getrecursionlimit() and len(types) == self.DEPTH and\
+               types[0].find("Property").get("Name") == "Value" and types[0].find("Property").get("Type") == "Edm.Int64" and\
+               types[-1].find("Property[@Name='Level']") is not None and len(csdl.json_schema["definitions"]) == 2 and\
+               full < half * 4 and peak < self.DEPTH * 16 * 1024 and len(rows) == 1)
+
+class TestDescriptionCatalogue:
+    def test_catalogue(self, tmp_path):
+        import concurrent.futures
+        from csdl_creator import generate_csdl, load_csv, CsvIndex
+        from csdl_cache import used_csv_rows
+        from csdl_descriptions import compile_catalogue, DescriptionCatalogue, schema_descriptions
+        mockup = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Color": "Red | Blue", "Sub": {"A": 1, "Deeper": {"B": 2}}, "Size": 3}
+        (tmp_path / "Thingy.csv").write_text("Color|The color.|The color of the thingy.|Red paint.|Blue paint.\nSub/Deeper/B|A B.|The B of the thingy.\nSize|The size.|The size of the thingy.\n")
+        (tmp_path / "Other.csv").write_text("".join("Prop{0}|Description {0}.|Long description {0}.\n".format(n) for n in range(5000)) + "Color|Other color.|Other color.\n")
+        count = compile_catalogue(str(tmp_path / "catalogue.db"), [str(tmp_path / "Thingy.csv"), str(tmp_path / "Other.csv")])
+        catalogue = DescriptionCatalogue(str(tmp_path / "catalogue.db"))
+        expected = generate_csdl(mockup, load_csv(str(tmp_path / "Thingy.csv")))
+        with concurrent.futures.ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda _n: generate_csdl(mockup, schema_descriptions(catalogue, mockup)), range(8)))
+        rows = used_csv_rows(mockup, schema_descriptions(catalogue, mockup))
+        catalogue.close()
+
+        assert(count == 5004 and results == [expected] * 8 and 'String="Red paint."' in expected[1] and\
+               rows == used_csv_rows(mockup, CsvIndex(load_csv(str(tmp_path / "Thingy.csv")))) and [path for path, _row in rows] == ["Color", "Sub/Deeper/B", "Size"])
+
+class TestArrayFolding:
+    def test_fold_items(self):
+        import tracemalloc
+        from csdl_creator import fold_items, database_builder, KIND_OBJECT
+        entries = [{"Id": str(n), "Severity": "OK", "Oem": {"Vendor": {"Code": n}}} for n in range(50000)]
+        entries[40000] = {"Id": "late", "Message": "Late member", "Oem": {"Vendor": {"Extra": True}, "Other": None}, "Args": [1, "x", {"A": 1}]}
+        entries[40001] = {"Args": [{"B": 2}], "Oem": {"Other": {"C": 3}}}
+        tracemalloc.start()
+        try:
+            items = fold_items(entries)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        database = database_builder({"Entries": entries, "Empty": [], "Mixed": [1, "a", 2.5, 3]})
+
+        assert(list(items[0]) == ["Id", "Severity", "Oem", "Message", "Args"] and items[0]["Oem"] == {"Vendor": {"Code": 0, "Extra": True}, "Other": {"C": 3}} and\
+               items[0]["Args"] == [1, "x", {"A": 1, "B": 2}] and entries[0] == {"Id": "0", "Severity": "OK", "Oem": {"Vendor": {"Code": 0}}} and\
+               peak < 64 * 1024 and list(fold_items(entries, stable_after=100)[0]) == ["Id", "Severity", "Oem"] and\
+               list(fold_items(entries, sample=3)[0]) == ["Id", "Severity", "Oem"] and\
+               database["Entries"].kind == KIND_OBJECT and list(database["Entries"].children) == ["Id", "Severity", "Oem", "Message", "Args"] and\
+               database["Empty"].is_array and database["Empty"].item_types == [] and database["Mixed"].item_types == [int, str, float])
+
+    def test_fold_options(self, tmp_path, monkeypatch):
+        import sys
+        import json
+        import csdl_batch
+        from csdl_cache import cache_key
+        from csdl_creator import SchemaGenerator, build_csdl_file, main
+        entries = [{"Id": str(n)} for n in range(1000)] + [{"Id": "late", "Message": "Late member"}]
+        mockup = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Entries": entries}
+        (tmp_path / "Thingy.json").write_text(json.dumps(mockup))
+        full = SchemaGenerator().generate(mockup)
+        stable = SchemaGenerator(stable_after=10).generate(mockup)
+        built = build_csdl_file(mockup, sample=7)
+        batch = csdl_batch.run_batch([str(tmp_path / "Thingy.json")], str(tmp_path / "batch"), workers=1, stable_after=10)
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(sys, "argv", ["csdl_creator.py", "Thingy.json", "--no-cache", "--stable-after", "10"])
+        status = main()
+
+        assert(b'Name="Message"' in full and b'Name="Message"' not in stable and "Message" not in built._annotation_database["Entries"].children and\
+               b'Name="Message"' not in open(batch[0][1], 'rb').read() and status == 0 and\
+               'Name="Message"' not in (tmp_path / "Thingy.v1_0_0.xml").read_text() and\
+               cache_key(mockup) != cache_key(mockup, stable_after=10) != cache_key(mockup, sample=10))
+
+class TestSchemaGenerator:
+    def test_concurrent_generate(self, tmp_path, monkeypatch, capsys):
+        import copy
+        import concurrent.futures
+        from csdl_creator import SchemaGenerator, generate_csdl
+        from csdl_benchmark import generate_mockup
+        monkeypatch.chdir(tmp_path)
+        mockups = [generate_mockup(properties=150, depth=3, seed=seed, csv_rows=40) for seed in range(6)]
+        originals = copy.deepcopy([mockup for mockup, _csv in mockups])
+        expected = [generate_csdl(mockup, csv_dict)[1].encode() for mockup, csv_dict in mockups]
+        generator = SchemaGenerator(mockups[0][1])
+        with concurrent.futures.ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda index: generator.generate(mockups[index % 6][0], None if index % 6 == 0 else mockups[index % 6][1]), range(96)))
+
+        assert(results == [expected[index % 6] for index in range(96)] and [mockup for mockup, _csv in mockups] == originals and\
+               list(tmp_path.iterdir()) == [] and capsys.readouterr() == ("", ""))
+
+class TestMemoryBudget:
+    PROPERTIES = 5000
+
+    def test_stage_budgets(self, tmp_path):
+        import gc
+        import io
+        import tracemalloc
+        from csdl_benchmark import generate_mockup
+        from csdl_cache import write_schema
+        from csdl_report import StageReport
+        mockup, csv_dict = generate_mockup(properties=self.PROPERTIES, depth=3, csv_rows=self.PROPERTIES, seed=1)
+        write_schema(mockup, csv_dict, str(tmp_path))
+        report = StageReport(trace_memory=True, top_sites=3)
+        tracemalloc.start()
+        try:
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            write_schema(mockup, csv_dict, str(tmp_path), report=report, json_schema=True)
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        peaks = report.stage_peaks()
+        stages = {stage[0]: stage for stage in report.stages}
+        csv_out = io.StringIO()
+        report.write_csv(csv_out)
+
+        assert(peaks["database_builder"] < self.PROPERTIES * 1024 and peaks["build_csdl"] < self.PROPERTIES * 4 * 1024 and\
+               peaks["serialize"] < self.PROPERTIES * 3 * 1024 and stages["write"][4] <= 0 and\
+               retained < 256 * 1024 and len(report.sites["build_csdl"]) == 3 and\
+               csv_out.getvalue().startswith("name,seconds,allocated_blocks,count,peak_bytes,retained_bytes\n"))
+
+class TestPatch:
+    MOCKUP = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Knob": "Twist|Turn",
+              "ThingContainer": {"ThingButton": {"ButtonColor": "Red|Blue", "Size": 3}, "Count": 1}, "Tail": {"Inner": True}}
+
+    def test_patch_matches_rebuild(self):
+        import copy
+        import json
+        import pytest
+        from csdl_creator import build_csdl_file, serialize_csdl
+        csdl = build_csdl_file(copy.deepcopy(self.MOCKUP), {"ThingContainer/ThingButton/Light": ["Light.", "Light of the button."]}, json_schema=True)
+        before = csdl.find_elements("/ThingContainer/ThingButton/ButtonColor")
+        csdl.patch("/ThingContainer/ThingButton/ButtonColor", {"Hue": "Red|Green", "Target": {"@odata.id": "/redfish/v1/Lamps/1"}},
+                   {"description": "Color of the button."})
+        csdl.patch("/ThingContainer/ThingButton/ButtonColor/Target", {"@odata.id": "/redfish/v1/Lamps/1"}, {"link": "Lamp"})
+        csdl.patch("/ThingContainer/ThingButton/Light", "On|Off")
+        csdl.remove("/Knob")
+        edited = copy.deepcopy(self.MOCKUP)
+        del edited["Knob"]
+        edited["ThingContainer"]["ThingButton"].update({"ButtonColor": {"Hue": "Red|Green", "Target": {"@odata.id": "/redfish/v1/Lamps/1"},
+                                                                        "Target!link": "Lamp"},
+                                                        "ButtonColor!description": "Color of the button.", "Light": "On|Off"})
+        rebuilt = build_csdl_file(edited, {"ThingContainer/ThingButton/Light": ["Light.", "Light of the button."]}, json_schema=True)
+        deduped = build_csdl_file(copy.deepcopy(self.MOCKUP), dedupe=True)
+        with pytest.raises(ValueError):
+            deduped.patch("/Knob", "On|Off")
+
+        assert(serialize_csdl(csdl) == serialize_csdl(rebuilt) and json.dumps(csdl.json_schema, indent=4) == json.dumps(rebuilt.json_schema, indent=4) and\
+               before[0] not in csdl.csdl.iter() and before[1] not in list(csdl.csdl) and\
+               csdl.find_elements("/ThingContainer/ThingButton/ButtonColor")[1].get("Name") == "ButtonColor" and\
+               csdl.find_elements("/ThingContainer/ThingButton/ButtonColor/Target")[0].tag == "NavigationProperty" and\
+               csdl.find_elements("/Knob") is None and deduped.find_elements("/Knob") is None)
+
+    def test_patch_permissions(self):
+        import copy
+        from csdl_creator import build_csdl_file, serialize_csdl
+        csdl = build_csdl_file(copy.deepcopy(self.MOCKUP))
+        csdl.patch("/ThingContainer/Count", 2, {"readonly": False})
+        edited = copy.deepcopy(self.MOCKUP)
+        edited["ThingContainer"].update({"Count": 2, "Count!readonly": False})
+        permissions = csdl.find_elements("/ThingContainer/Count")[0].find("Annotation[@Term='OData.Permissions']")
+
+        assert(permissions.get("EnumMember") == "OData.Permission/ReadWrite" and serialize_csdl(csdl) == serialize_csdl(build_csdl_file(edited)))
+
+    def test_patch_keeps_reference_order(self):
+        import copy
+        from csdl_creator import build_csdl_file, serialize_csdl
+        mockup = {"@odata.type": "#Thingy.v1_0_0.Thingy", "Lamp": {"@odata.id": "/redfish/v1/Lamps/1"}, "Lamp!link": "Lamp",
+                  "Holder": {"Inner": 1}, "Fan": {"@odata.id": "/redfish/v1/Fans/1"}, "Fan!link": "Fan"}
+        csdl = build_csdl_file(copy.deepcopy(mockup))
+        csdl.patch("/Lamp", {"@odata.id": "/redfish/v1/Lamps/2"}, {"link": "Lamp", "description": "The lamp."})
+        relinked = serialize_csdl(csdl)
+        csdl.patch("/Holder/Pump", {"@odata.id": "/redfish/v1/Pumps/1"}, {"link": "Pump"})
+        csdl.patch("/Lamp", 1)
+        edited = copy.deepcopy(mockup)
+        edited.update({"Lamp": {"@odata.id": "/redfish/v1/Lamps/2"}, "Lamp!description": "The lamp."})
+        rebuilt = serialize_csdl(build_csdl_file(copy.deepcopy(edited)))
+        edited["Holder"].update({"Pump": {"@odata.id": "/redfish/v1/Pumps/1"}, "Pump!link": "Pump"})
+        edited["Lamp"] = 1
+        del edited["Lamp!link"], edited["Lamp!description"]
+        text = serialize_csdl(csdl)
+
+        assert(relinked == rebuilt and text == serialize_csdl(build_csdl_file(edited)) and\
+               "Lamp_v1.xml" not in text and text.index("Fan_v1.xml") < text.index("Pump_v1.xml"))
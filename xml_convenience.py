@@ -15,34 +15,81 @@ def get_valid_csdl_identifier(name):
     # return '.'.join(dots).replace('_', '')
     return '.'.join(dots)
 
-def add_import(xml_node, import_value, alias, namespace=None):
+def schema_uri(schema_name):
+    """
+    Returns the published URI of a Redfish schema file.
+    :param schema_name: Unversioned schema name, e.g. Thermal
+    """
+    return 'http://redfish.dmtf.org/schemas/v1/' + schema_name + "_v1.xml"
+
+
+def reference_key(uri):
+    """
+    Returns the key a reference is indexed under: the file name of its URI without the
+    ".xml" extension and "_v<N>" suffix, e.g. Thermal for .../Thermal_v1.xml.
+    :param uri: URI of the referenced file
+    """
+    name = uri.rsplit('/', 1)[-1]
+    if name.endswith('.xml'):
+        name = name[:-4]
+    base, sep, major = name.rpartition('_v')
+    if sep and major.isdigit():
+        name = base
+    return name
+
+
+def index_references(xml_node):
+    """
+    Builds the reference index used by add_reference and add_import from the
+    "edmx:Reference" nodes already present under xml_node.
+    :param xml_node: Node holding the references, normally the edmx:Edmx root
+    """
+    ref_index = {}
+    for ref in xml_node:
+        if 'Reference' in str(ref.tag) and ref.get('Uri'):
+            ref_index.setdefault(reference_key(ref.get('Uri')), ref)
+    return ref_index
+
+
+def add_import(xml_node, import_value, alias, namespace=None, ref_index=None):
     """
     Add import stament node into XML.
     :param xml_node:Parent node to which 'import' node must be added.
     :param import_value: The name of the imported file
     :param alias: Optional alias for the imported file.
+    :param ref_index: Optional reference index from index_references; replaces the scan of xml_node
     """
-    uri = 'http://redfish.dmtf.org/schemas/v1/' + import_value + "_v1.xml"
-    for ref in xml_node:
-        if 'Reference' not in str(ref.tag):
-            continue
-        uri_old = ref.attrib.get('Uri')
-        if uri_old == uri:
+    uri = schema_uri(import_value)
+    if ref_index is not None:
+        if reference_key(uri) in ref_index:
             return None
+    else:
+        for ref in xml_node:
+            if 'Reference' not in str(ref.tag):
+                continue
+            uri_old = ref.attrib.get('Uri')
+            if uri_old == uri:
+                return None
     namespace = import_value if not namespace else namespace
-    return add_reference(xml_node, uri, namespace, alias)
+    return add_reference(xml_node, uri, namespace, alias, ref_index=ref_index)
 
 
-def add_reference(xml_node, uri, namespace, alias=None, version=None):
+def add_reference(xml_node, uri, namespace, alias=None, version=None, ref_index=None):
     """
     Add "edmx:Reference" node to XML.
     :param xml_node:Parent node to which reference  node must be added.
     :param uri: URI which will be added as the reference
     :param namespace: XML namespace or namespaces
     :param alias: Optional alias
+    :param ref_index: Optional reference index from index_references; if the URI is already
+    indexed the existing node is returned, otherwise the new node is recorded in it
     """
     if uri in ['', None]:
-        uri = 'http://redfish.dmtf.org/schemas/v1/' + namespace + "_v1.xml"
+        uri = schema_uri(namespace)
+    if ref_index is not None:
+        key = reference_key(uri)
+        if key in ref_index:
+            return ref_index[key]
     ref = Element('edmx:Reference')
     ref.set('Uri', uri)
     include = SubElement(ref, 'edmx:Include')
@@ -54,6 +101,8 @@ def add_reference(xml_node, uri, namespace, alias=None, version=None):
         include.set('Namespace', namespace)
     if xml_node is not None:
         xml_node.insert(0, ref)
+    if ref_index is not None:
+        ref_index[key] = ref
     return ref
 
 